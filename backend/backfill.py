@@ -0,0 +1,499 @@
+"""
+Re-score stored sensor readings after the health rules, anomaly detection or model change
+
+Recomputes sensor_readings.anomaly_score for every reading in range, and
+the health score and status of every equipment whose latest reading is in
+range (in equipment and equipment_latest_state). With --predictions it also
+writes a predictions row per reading from --model-version (default: the
+active version), stamped with the reading's time.
+
+Readings are streamed in id order, --chunk-size at a time, with keyset
+pagination. Anomaly baselines and rolling model features depend on every
+earlier reading of an equipment, so this process computes them in id
+order, starting cold at --since. The model scores each chunk in a pool of
+--workers processes, one slice per worker, while this process reads and
+prepares the next chunk. Each chunk is written in one transaction of bulk
+updates and inserts, together with the job's row in backfill_jobs.
+Rerunning a --job with the same arguments resumes after the last written
+reading. Every --state-interval seconds the baselines and rolling features
+are saved under --state-dir, named by the last reading they include; a
+resumed run restores the newest state the written readings cover and
+replays only the readings after it through the baselines, without scoring
+or writing, so it writes what an uninterrupted run would. --restart runs a
+job again from the start, deleting the predictions its earlier run wrote
+in the same transaction.
+
+API workers keep their own anomaly baselines and serve
+equipment_latest_state from memory for up to LATEST_STATE_MIRROR_TTL
+seconds.
+
+Run from the backend directory:
+    python backfill.py --job rescore-2026-10 --since 2026-01-01
+    python backfill.py --job rescore-v2.0 --predictions --model-version v2.0 --workers 8
+"""
+import logging
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+from sqlalchemy import bindparam, exists, insert, select, update
+
+from feature_store import FeatureStore
+from ml_service import SENSOR_FIELDS, AnomalyDetector, HealthScoreCalculator, PredictiveModel
+from models import (
+    BackfillJob,
+    Equipment,
+    EquipmentLatestState,
+    EquipmentStatus,
+    ModelRegistry,
+    Prediction,
+    SensorReading,
+)
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (SensorReading.id, SensorReading.equipment_id, SensorReading.timestamp) + tuple(
+    getattr(SensorReading, field) for field in SENSOR_FIELDS
+)
+
+# Model of each pool process, loaded once by _init_worker
+_worker_model: Optional[PredictiveModel] = None
+
+
+def _init_worker(model_version: str, model_path: str, engine: str):
+    global _worker_model
+    _worker_model = PredictiveModel(
+        model_version=model_version, engine=engine, model_path=model_path, train_if_missing=False
+    )
+
+
+def _predict(features: np.ndarray) -> np.ndarray:
+    """(failure_probability, rul_days, confidence_score) per row of model inputs, in a pool process"""
+    results = _worker_model.batch_predict(features)
+    return np.array([result[:3] for result in results], dtype=float).reshape(len(features), 3)
+
+
+def stream_readings(
+    db,
+    after_id: int,
+    since: Optional[datetime],
+    until: Optional[datetime],
+    chunk_size: int,
+    through_id: Optional[int] = None,
+) -> Iterator[list]:
+    """Yield chunks of readings (COLUMNS) with id > after_id in id order"""
+    while True:
+        query = select(*COLUMNS).where(SensorReading.id > after_id)
+        if through_id is not None:
+            query = query.where(SensorReading.id <= through_id)
+        if since is not None:
+            query = query.where(SensorReading.timestamp >= since)
+        if until is not None:
+            query = query.where(SensorReading.timestamp < until)
+        rows = db.execute(query.order_by(SensorReading.id).limit(chunk_size)).all()
+        if not rows:
+            return
+        after_id = rows[-1].id
+        yield rows
+
+
+class ChunkScorer:
+    """Sequential per-equipment state (anomaly baselines, rolling features) over readings in id order"""
+
+    def __init__(self, model: Optional[PredictiveModel], window: int, alpha: float, threshold: float, memory: int):
+        self.model = model
+        self.detector = AnomalyDetector(threshold=threshold, memory=memory)
+        self.health_calculator = HealthScoreCalculator()
+        rolling = [name for name in model.feature_names if name not in SENSOR_FIELDS] if model else []
+        self.feature_store = FeatureStore(window=window, alpha=alpha) if rolling else None
+
+    def save(self, directory: str):
+        """Write the baselines and rolling features to directory, replacing it"""
+        staging = f"{directory}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        self.detector.save(os.path.join(staging, "anomaly_baselines.npz"))
+        if self.feature_store is not None:
+            self.feature_store.save(os.path.join(staging, "features.npz"))
+        # A run that stopped before writing its last chunks may have saved this one already
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+
+    def restore(self, directory: str):
+        """Replace the state with the one saved in directory
+
+        Raises:
+            ValueError: if it was saved with other settings
+        """
+        self.detector.restore(os.path.join(directory, "anomaly_baselines.npz"))
+        if self.feature_store is not None:
+            self.feature_store.restore(os.path.join(directory, "features.npz"))
+
+    def replay(self, rows: list):
+        """Advance the state past rows without scoring them"""
+        self.score(rows, with_inputs=False)
+
+    def score(self, rows: list, with_inputs: bool = True) -> Dict:
+        ids, equipment_ids, timestamps, *columns = zip(*rows)
+        values = np.array(columns, dtype=float).T
+        anomaly_scores, _ = self.detector.detect_anomalies(values, list(equipment_ids))
+        rolling = None
+        if self.feature_store is not None:
+            rolling = self.feature_store.update(equipment_ids, timestamps, [row._mapping for row in rows])
+        if not with_inputs:
+            return {}
+
+        health_scores = self.health_calculator.calculate_health_scores(np.nan_to_num(values, nan=0.0))
+        chunk = {
+            "ids": ids,
+            "equipment_ids": equipment_ids,
+            "timestamps": timestamps,
+            "anomaly_scores": anomaly_scores,
+            "health_scores": health_scores,
+            "statuses": self.health_calculator.determine_statuses(health_scores),
+        }
+        if self.model is not None:
+            by_name = {field: values[:, i] for i, field in enumerate(SENSOR_FIELDS)}
+            for name in self.model.feature_names:
+                if name not in by_name:
+                    by_name[name] = np.array([f[name] if f else np.nan for f in rolling], dtype=float)
+            chunk["inputs"] = np.column_stack([by_name[name] for name in self.model.feature_names])
+        return chunk
+
+
+def write_chunk(
+    db, job: BackfillJob, chunk: Dict, predictions: Optional[np.ndarray], model: Optional[PredictiveModel]
+):
+    """Write a scored chunk and the job's progress in one transaction"""
+    readings = SensorReading.__table__
+    db.execute(
+        update(readings)
+        .where(readings.c.id == bindparam("b_id"), readings.c.timestamp == bindparam("b_timestamp"))
+        .values(anomaly_score=bindparam("b_anomaly_score")),
+        [
+            {"b_id": reading_id, "b_timestamp": timestamp, "b_anomaly_score": score}
+            for reading_id, timestamp, score in zip(
+                chunk["ids"], chunk["timestamps"], chunk["anomaly_scores"].tolist()
+            )
+        ],
+    )
+
+    # Equipment health follows its latest reading, so only readings the latest state points at update it
+    latest = {equipment_id: i for i, equipment_id in enumerate(chunk["equipment_ids"])}
+    params = [
+        {
+            "b_equipment_id": equipment_id,
+            "b_timestamp": chunk["timestamps"][i],
+            "b_health_score": float(chunk["health_scores"][i]),
+            "b_status": EquipmentStatus(chunk["statuses"][i]),
+            "b_anomaly_score": float(chunk["anomaly_scores"][i]),
+        }
+        for equipment_id, i in latest.items()
+    ]
+    state = EquipmentLatestState.__table__
+    is_latest = (state.c.equipment_id == bindparam("b_equipment_id")) & (
+        state.c.reading_timestamp == bindparam("b_timestamp")
+    )
+    db.execute(
+        update(state)
+        .where(is_latest)
+        .values(
+            health_score=bindparam("b_health_score"),
+            status=bindparam("b_status"),
+            anomaly_score=bindparam("b_anomaly_score"),
+        ),
+        params,
+    )
+    equipment = Equipment.__table__
+    db.execute(
+        update(equipment)
+        .where(equipment.c.equipment_id == bindparam("b_equipment_id"), exists().where(is_latest))
+        .values(health_score=bindparam("b_health_score"), status=bindparam("b_status")),
+        params,
+    )
+
+    if predictions is not None:
+        now = datetime.utcnow()
+        scored = np.flatnonzero(np.isfinite(chunk["inputs"]).all(axis=1))
+        rows = []
+        for i in scored.tolist():
+            failure_probability, rul_days, confidence = predictions[i].tolist()
+            rul_days = int(rul_days)
+            rows.append(
+                {
+                    "equipment_id": chunk["equipment_ids"][i],
+                    "failure_probability": failure_probability,
+                    "rul_days": rul_days,
+                    "expected_failure_date": chunk["timestamps"][i] + timedelta(days=rul_days),
+                    "confidence_score": confidence,
+                    "feature_importance": dict(model.feature_importance),
+                    "model_version": model.model_version,
+                    "prediction_timestamp": chunk["timestamps"][i],
+                    "created_at": now,
+                }
+            )
+        if rows:
+            db.execute(insert(Prediction.__table__), rows)
+
+    job.last_reading_id = chunk["ids"][-1]
+    job.rows_processed += len(chunk["ids"])
+    db.commit()
+
+
+def delete_predictions(db, job: BackfillJob) -> int:
+    """Delete the predictions a job's earlier run wrote, before it starts over
+
+    They are the job's model version's predictions created since the run
+    started and stamped with the time of a reading the run had written,
+    which predictions made by the API (stamped when scored) are not.
+
+    Returns:
+        number of predictions deleted
+    """
+    params = job.params or {}
+    if not params.get("predictions") or not job.last_reading_id:
+        return 0
+    predictions = Prediction.__table__
+    readings = SensorReading.__table__
+    written = exists().where(
+        readings.c.equipment_id == predictions.c.equipment_id,
+        readings.c.timestamp == predictions.c.prediction_timestamp,
+        readings.c.id <= job.last_reading_id,
+    )
+    query = predictions.delete().where(predictions.c.model_version == job.model_version, written)
+    if job.started_at is not None:
+        query = query.where(predictions.c.created_at >= job.started_at)
+    if params.get("since"):
+        query = query.where(predictions.c.prediction_timestamp >= datetime.fromisoformat(params["since"]))
+    if params.get("until"):
+        query = query.where(predictions.c.prediction_timestamp < datetime.fromisoformat(params["until"]))
+    return db.execute(query).rowcount
+
+
+def saved_states(directory: Optional[str]) -> List[int]:
+    """Last reading ids of the scorer states saved in directory, ascending"""
+    if directory is None or not os.path.isdir(directory):
+        return []
+    return sorted(int(name) for name in os.listdir(directory) if name.isdigit())
+
+
+def prune_states(directory: Optional[str], last_reading_id: int):
+    """Remove saved states superseded by a newer one the written readings cover"""
+    covered = [state for state in saved_states(directory) if state <= last_reading_id]
+    for state in covered[:-1]:
+        shutil.rmtree(os.path.join(directory, str(state)), ignore_errors=True)
+
+
+def load_model(db, model_version: Optional[str], engine: str) -> PredictiveModel:
+    """The registered model_version, or the active one
+
+    Raises:
+        ValueError: if the version is not registered or no version is active
+    """
+    query = select(ModelRegistry)
+    if model_version is None:
+        query = query.where(ModelRegistry.is_active.is_(True))
+    else:
+        query = query.where(ModelRegistry.model_version == model_version)
+    entry = db.scalar(query)
+    if entry is None:
+        raise ValueError(f"Model version {model_version} is not registered" if model_version else "No active model")
+    return PredictiveModel(
+        model_version=entry.model_version, engine=engine, model_path=entry.model_path, train_if_missing=False
+    )
+
+
+def backfill(
+    db,
+    job_name: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    predictions: bool = False,
+    model_version: Optional[str] = None,
+    engine: str = "flat",
+    chunk_size: int = 20000,
+    workers: int = 4,
+    restart: bool = False,
+    window: int = 64,
+    alpha: float = 0.2,
+    threshold: float = 2.0,
+    memory: int = 1000,
+    state_dir: Optional[str] = None,
+    state_interval: float = 300.0,
+) -> BackfillJob:
+    """Run or resume a backfill job
+
+    Returns:
+        the finished backfill_jobs row
+
+    Raises:
+        ValueError: if the job already finished or was started with other
+            arguments (without restart), or the model cannot be found
+    """
+    model = load_model(db, model_version, engine) if predictions else None
+    params = {
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+        "predictions": predictions,
+        "model_version": model.model_version if model else None,
+        "window": window,
+        "alpha": alpha,
+        "threshold": threshold,
+        "memory": memory,
+    }
+    job = db.get(BackfillJob, job_name)
+    if job is None:
+        job = BackfillJob(job=job_name)
+        db.add(job)
+        restart = True
+    elif not restart and job.finished_at is not None:
+        raise ValueError(f"Backfill {job_name} finished at {job.finished_at}; use --restart to run it again")
+    elif not restart and job.params != params:
+        raise ValueError(f"Backfill {job_name} was started with {job.params}; use --restart or another --job")
+    # Saved scorer states, one directory per last reading id; a job may be ahead of its commits by one chunk
+    states = os.path.join(state_dir, quote(job_name, safe="")) if state_dir else None
+    if restart:
+        if states is not None:
+            shutil.rmtree(states, ignore_errors=True)
+        # Committed with the reset, so an interrupted restart leaves neither duplicates nor gaps
+        deleted = delete_predictions(db, job)
+        if deleted:
+            logger.info(f"Deleted {deleted:,} predictions written by the previous run of {job_name}")
+        job.params = params
+        job.model_version = params["model_version"]
+        job.last_reading_id = 0
+        job.rows_processed = 0
+        job.started_at = datetime.utcnow()
+        job.finished_at = None
+    db.commit()
+
+    scorer = ChunkScorer(model, window, alpha, threshold, memory)
+    started = time.perf_counter()
+    if job.last_reading_id:
+        restored_id = 0
+        covered = [state for state in saved_states(states) if state <= job.last_reading_id]
+        if covered:
+            try:
+                scorer.restore(os.path.join(states, str(covered[-1])))
+                restored_id = covered[-1]
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not restore the state saved at reading {covered[-1]}: {str(e)}")
+                scorer = ChunkScorer(model, window, alpha, threshold, memory)
+        replayed = 0
+        for rows in stream_readings(db, restored_id, since, until, chunk_size, through_id=job.last_reading_id):
+            scorer.replay(rows)
+            replayed += len(rows)
+        logger.info(
+            f"Resuming {job_name} after reading {job.last_reading_id}: restored the state at reading "
+            f"{restored_id} and replayed {replayed:,} readings in {time.perf_counter() - started:.1f}s"
+        )
+
+    started = time.perf_counter()
+    rows_before = job.rows_processed
+    pool = (
+        ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(model.model_version, model.model_path, engine),
+        )
+        if model is not None
+        else None
+    )
+    # Chunks scored here and waiting for the pool; written in order, one behind the reader
+    pending: "deque[tuple[Dict, List[Future]]]" = deque()
+
+    def write_oldest():
+        chunk, futures = pending.popleft()
+        scores = np.vstack([future.result() for future in futures]) if futures else None
+        write_chunk(db, job, chunk, scores, model)
+        prune_states(states, job.last_reading_id)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"{job_name}: {job.rows_processed:,} readings through id {job.last_reading_id} "
+            f"({(job.rows_processed - rows_before) / elapsed:,.0f} readings/s)"
+        )
+
+    last_save = time.monotonic()
+    try:
+        for rows in stream_readings(db, job.last_reading_id, since, until, chunk_size):
+            chunk = scorer.score(rows)
+            if states is not None and time.monotonic() - last_save >= state_interval:
+                try:
+                    scorer.save(os.path.join(states, str(chunk["ids"][-1])))
+                except OSError as e:
+                    logger.error(f"Could not save the state at reading {chunk['ids'][-1]}: {str(e)}")
+                last_save = time.monotonic()
+            futures = []
+            if pool is not None:
+                parts = [part for part in np.array_split(chunk["inputs"], workers) if len(part)]
+                futures = [pool.submit(_predict, part) for part in parts]
+            pending.append((chunk, futures))
+            if len(pending) > 1:
+                write_oldest()
+        while pending:
+            write_oldest()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    job.finished_at = datetime.utcnow()
+    db.commit()
+    if states is not None:
+        shutil.rmtree(states, ignore_errors=True)
+    return job
+
+
+def main():
+    import argparse
+
+    from config import Config
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Re-score stored sensor readings")
+    parser.add_argument("--job", required=True, help="job name; rerunning it resumes where it stopped")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="first reading time (UTC) to re-score")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="re-score readings before this time (UTC)")
+    parser.add_argument("--predictions", action="store_true", help="also write a prediction per reading")
+    parser.add_argument("--model-version", help="registered version to predict with (default: active)")
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4, help="model scoring processes")
+    parser.add_argument("--restart", action="store_true", help="start the job over")
+    parser.add_argument("--state-dir", default="data/backfill", help="where baselines are saved for resuming")
+    parser.add_argument("--state-interval", type=float, default=300.0, help="seconds between saved baselines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        try:
+            job = backfill(
+                db,
+                args.job,
+                since=args.since,
+                until=args.until,
+                predictions=args.predictions,
+                model_version=args.model_version,
+                engine=Config.INFERENCE_ENGINE,
+                chunk_size=args.chunk_size,
+                workers=args.workers,
+                restart=args.restart,
+                window=Config.FEATURE_WINDOW,
+                alpha=Config.FEATURE_EWMA_ALPHA,
+                threshold=Config.ANOMALY_THRESHOLD,
+                memory=Config.ANOMALY_MEMORY,
+                state_dir=args.state_dir,
+                state_interval=args.state_interval,
+            )
+        except ValueError as e:
+            parser.exit(1, f"{str(e)}\n")
+        elapsed = time.perf_counter() - started
+        print(f"{job.job}: {job.rows_processed:,} readings re-scored in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Cross-worker broadcast of real-time updates
+
+Each worker delivers the updates it produces to its own WebSocket clients
+at once and publishes them in batched frames on a shared channel. Every
+other worker delivers the frames it receives to its clients. With the
+"unix" backend the channel is a relay started separately:
+    python backplane.py --hub /tmp/fleetvision-backplane.sock
+"""
+import abc
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+from connection_manager import COALESCED_TYPES, ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# Seconds before reconnecting a lost channel, and before publishing again after a failed publish
+RETRY_SECONDS = 5.0
+
+# Longest frame read from the unix relay
+MAX_FRAME_BYTES = 64 * 2**20
+
+BACKPLANES = ("local", "redis", "unix")
+
+
+class LocalBackplane:
+    """Single worker: updates go straight to this worker's clients (of every manager in managers)"""
+
+    backend = "local"
+    connected = True
+
+    def __init__(self, managers: Sequence[ConnectionManager]):
+        self.managers = list(managers)
+        self.published = 0
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, data: dict):
+        self.published += 1
+        for manager in self.managers:
+            await manager.broadcast(data)
+
+    def get_stats(self) -> Dict:
+        return {"backend": self.backend, "published": self.published}
+
+
+class Backplane(LocalBackplane, abc.ABC):
+    """Batches this worker's updates onto a shared channel and delivers other workers' updates
+
+    An update is delivered to this worker's clients at once and queued for
+    the channel. Every ``batch_interval`` seconds the queue goes out as one
+    frame, holding only the latest update per equipment for
+    ``COALESCED_TYPES``, so a burst costs at most one message per equipment
+    per interval on the wire. At most ``max_pending`` updates are queued
+    (the oldest is dropped beyond that). Frames carry this worker's origin
+    and are skipped when they come back. While the channel is down, other
+    workers miss this worker's updates; local clients are unaffected.
+    Subclasses implement ``_send(frame)`` and ``_listen()``.
+    """
+
+    connected = False
+
+    def __init__(
+        self, managers: Sequence[ConnectionManager], batch_interval: float = 0.05, max_pending: int = 10000
+    ):
+        super().__init__(managers)
+        self.batch_interval = batch_interval
+        self.max_pending = max_pending
+        self.origin = uuid.uuid4().hex
+        self._pending: "OrderedDict[object, list]" = OrderedDict()
+        self._sequence = itertools.count()
+        self._has_pending = asyncio.Event()
+        self._retry_at = 0.0
+        self._tasks = []
+
+        # Metrics
+        self.coalesced = 0
+        self.dropped = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.send_failures = 0
+        self.frames_received = 0
+        self.received = 0
+        self.bytes_received = 0
+        self.bad_frames = 0
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._flush_loop()), asyncio.create_task(self._listen_loop())]
+            logger.info(f"Broadcast backplane ({self.backend}) started")
+
+    async def stop(self):
+        """Send what is queued and stop"""
+        tasks, self._tasks = self._tasks, []
+        # Stop batching first so the last frame goes out while the channel is still open
+        for task in tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            if task is tasks[0]:
+                await self.flush()
+
+    async def publish(self, data: dict):
+        self.published += 1
+        topic = data.get("equipment_id")
+        text = json.dumps(data, default=str)
+        self._deliver(topic, text, data)
+
+        message_type = data.get("type")
+        key = ("state", message_type, topic) if message_type in COALESCED_TYPES else next(self._sequence)
+        if key in self._pending:
+            self._pending[key] = [topic, text]
+            self.coalesced += 1
+            return
+        self._pending[key] = [topic, text]
+        if len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        self._has_pending.set()
+
+    def _deliver(self, topic: Optional[str], text: str, data: Optional[dict] = None):
+        for manager in self.managers:
+            manager.publish(topic, text, data)
+
+    async def _flush_loop(self):
+        while True:
+            await self._has_pending.wait()
+            await asyncio.sleep(self.batch_interval)
+            await self.flush()
+
+    async def flush(self):
+        """Send queued updates as one frame"""
+        self._has_pending.clear()
+        if not self._pending:
+            return
+        messages = list(self._pending.values())
+        self._pending.clear()
+        if time.monotonic() < self._retry_at:
+            self.dropped += len(messages)
+            return
+        frame = json.dumps({"origin": self.origin, "messages": messages}).encode()
+        try:
+            await self._send(frame)
+        except Exception as e:
+            self.send_failures += 1
+            self.dropped += len(messages)
+            self._retry_at = time.monotonic() + RETRY_SECONDS
+            logger.error(f"Broadcast backplane publish failed, retrying in {RETRY_SECONDS:.0f}s: {str(e)}")
+            return
+        self.frames_sent += 1
+        self.bytes_sent += len(frame)
+
+    async def _listen_loop(self):
+        while True:
+            try:
+                await self._listen()
+                logger.warning(f"Broadcast backplane ({self.backend}) channel closed, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcast backplane ({self.backend}) channel error, reconnecting: {str(e)}")
+            await asyncio.sleep(RETRY_SECONDS)
+
+    def _receive(self, frame: bytes):
+        """Deliver another worker's frame to this worker's clients"""
+        try:
+            payload = json.loads(frame)
+            if payload["origin"] == self.origin:
+                return
+            messages = payload["messages"]
+            if not all(
+                isinstance(message, list) and len(message) == 2 and isinstance(message[1], str)
+                for message in messages
+            ):
+                raise TypeError("messages must be [topic, text] pairs")
+        except (ValueError, KeyError, TypeError):
+            # Not JSON, or messages is not a list of [topic, text] pairs
+            self.bad_frames += 1
+            return
+        for topic, text in messages:
+            self._deliver(topic, text)
+        self.frames_received += 1
+        self.received += len(messages)
+        self.bytes_received += len(frame)
+
+    @abc.abstractmethod
+    async def _send(self, frame: bytes):
+        """Publish a frame on the channel"""
+
+    @abc.abstractmethod
+    async def _listen(self):
+        """Receive frames until the channel closes"""
+
+    def get_stats(self) -> Dict:
+        return {
+            "backend": self.backend,
+            "connected": self.connected,
+            "published": self.published,
+            "pending": len(self._pending),
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "send_failures": self.send_failures,
+            "frames_received": self.frames_received,
+            "received": self.received,
+            "bytes_received": self.bytes_received,
+            "bad_frames": self.bad_frames,
+        }
+
+
+class RedisBackplane(Backplane):
+    """Frames on a Redis pub/sub channel"""
+
+    backend = "redis"
+
+    def __init__(self, managers: Sequence[ConnectionManager], redis_url: str, channel: str, **kwargs):
+        import redis.asyncio as aioredis
+
+        super().__init__(managers, **kwargs)
+        self.channel = channel
+        self._redis = aioredis.from_url(redis_url)
+        self.connected = False
+
+    async def _send(self, frame: bytes):
+        await self._redis.publish(self.channel, frame)
+
+    async def _listen(self):
+        pubsub = self._redis.pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+            self.connected = True
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    self._receive(message["data"])
+        finally:
+            self.connected = False
+            await pubsub.reset()
+
+    async def stop(self):
+        await super().stop()
+        await self._redis.aclose()
+
+
+class UnixSocketBackplane(Backplane):
+    """Frames through a relay on a Unix socket (``python backplane.py --hub PATH``), one per line"""
+
+    backend = "unix"
+
+    def __init__(self, managers: Sequence[ConnectionManager], path: str, **kwargs):
+        super().__init__(managers, **kwargs)
+        self.path = path
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    async def _send(self, frame: bytes):
+        if self._writer is None:
+            raise ConnectionError(f"not connected to {self.path}")
+        self._writer.write(frame + b"\n")
+        await self._writer.drain()
+
+    async def _listen(self):
+        reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_FRAME_BYTES)
+        self._writer = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                self._receive(line)
+        finally:
+            self._writer = None
+            writer.close()
+
+
+def create_backplane(
+    backend: str,
+    managers: Sequence[ConnectionManager],
+    redis_url: Optional[str] = None,
+    channel: str = "fleetvision:updates",
+    socket_path: Optional[str] = None,
+    batch_interval: float = 0.05,
+    max_pending: int = 10000,
+) -> LocalBackplane:
+    """Backplane for backend ("local", "redis" or "unix")
+
+    Raises:
+        ValueError: if backend is not one of BACKPLANES
+    """
+    if backend not in BACKPLANES:
+        raise ValueError(f"backend must be one of {', '.join(BACKPLANES)}")
+    options = {"batch_interval": batch_interval, "max_pending": max_pending}
+    if backend == "redis":
+        try:
+            return RedisBackplane(managers, redis_url, channel, **options)
+        except ImportError:
+            logger.warning("redis package not installed, real-time updates reach this worker's clients only")
+    elif backend == "unix":
+        return UnixSocketBackplane(managers, socket_path, **options)
+    return LocalBackplane(managers)
+
+
+async def serve_hub(path: str):
+    """Relay every line a connection sends to every connection, dropping lines for connections that fall behind"""
+    writers = set()
+
+    async def relay(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for other in list(writers):
+                    if other.transport.get_write_buffer_size() < MAX_FRAME_BYTES:
+                        other.write(line)
+        except ConnectionError:
+            pass
+        except ValueError as e:
+            # Line longer than MAX_FRAME_BYTES
+            logger.warning(f"Backplane relay dropped a connection: {str(e)}")
+        finally:
+            writers.discard(writer)
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(relay, path, limit=MAX_FRAME_BYTES)
+    logger.info(f"Backplane relay listening on {path}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay for BROADCAST_BACKPLANE=unix")
+    parser.add_argument("--hub", required=True, metavar="PATH", help="Unix socket to listen on")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(serve_hub(args.hub))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark cross-worker update delivery through the broadcast backplane
+
+Runs --workers simulated workers in one process, each with a backplane on a
+local unix relay and one client subscribed to every equipment. Publishes
+--rate updates/s spread over --equipment machines and the workers for
+--seconds, once per --batch-ms setting. Reports bytes/s on the relay, how
+many updates reached the other workers, and publish-to-delivery latency on
+the other workers.
+
+Run from the backend directory:
+    python -m benchmarks.bench_backplane --rate 5000 --batch-ms 0 50 250
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from backplane import UnixSocketBackplane, serve_hub
+from connection_manager import ALL_EQUIPMENT, ConnectionManager
+
+
+class LatencySocket:
+    """Records publish-to-delivery latency of updates from other workers"""
+
+    def __init__(self, worker: int):
+        self.worker = worker
+        self.latencies = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        update = json.loads(text)
+        if update["worker"] != self.worker:
+            self.latencies.append(time.perf_counter() - update["published_at"])
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def run_case(args, path: str, batch_ms: float):
+    hub = asyncio.create_task(serve_hub(path))
+    while not os.path.exists(path):
+        await asyncio.sleep(0.01)
+
+    workers, sockets = [], []
+    for i in range(args.workers):
+        manager = ConnectionManager(queue_size=1 << 20)
+        socket = LatencySocket(i)
+        await manager.connect(socket, [ALL_EQUIPMENT])
+        backplane = UnixSocketBackplane([manager], path, batch_interval=batch_ms / 1000)
+        await backplane.start()
+        workers.append(backplane)
+        sockets.append(socket)
+    while not all(backplane.connected for backplane in workers):
+        await asyncio.sleep(0.01)
+
+    rng = random.Random(0)
+    total = int(args.rate * args.seconds)
+    published = 0
+    started = time.perf_counter()
+    while published < total:
+        due = min(total, int(args.rate * (time.perf_counter() - started)))
+        for _ in range(due - published):
+            worker = published % args.workers
+            await workers[worker].publish(
+                {
+                    "type": "sensor_update",
+                    "equipment_id": f"EQ-{rng.randrange(args.equipment):05d}",
+                    "health_score": round(rng.uniform(0, 100), 2),
+                    "failure_probability": round(rng.random(), 4),
+                    "worker": worker,
+                    "published_at": time.perf_counter(),
+                }
+            )
+            published += 1
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(batch_ms / 1000 + 0.5)
+
+    for backplane, socket in zip(workers, sockets):
+        await backplane.stop()
+        backplane.managers[0].disconnect(socket)
+    hub.cancel()
+    try:
+        await hub
+    except asyncio.CancelledError:
+        pass
+
+    latencies = np.concatenate([np.asarray(socket.latencies) for socket in sockets]) * 1000
+    bytes_sent = sum(backplane.bytes_sent for backplane in workers)
+    # Without coalescing every update would reach every other worker
+    remote_updates = total * (args.workers - 1)
+    print(
+        f"batch {batch_ms:5.0f}ms: {bytes_sent / elapsed / 1024:9.1f} KiB/s published, "
+        f"{sum(b.frames_sent for b in workers) / elapsed:7.1f} frames/s, "
+        f"{sum(b.coalesced for b in workers)} coalesced, "
+        f"{len(latencies) / remote_updates:6.1%} of remote deliveries sent, "
+        f"latency p50 {np.percentile(latencies, 50):6.1f}ms p99 {np.percentile(latencies, 99):6.1f}ms"
+    )
+
+
+async def run(args):
+    print(f"{args.workers} workers, {args.equipment} equipment, {args.rate} updates/s for {args.seconds}s")
+    with tempfile.TemporaryDirectory() as tmp:
+        for batch_ms in args.batch_ms:
+            await run_case(args, os.path.join(tmp, "backplane.sock"), batch_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--equipment", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=5000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--batch-ms", type=float, nargs="+", default=[0, 50, 250])
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
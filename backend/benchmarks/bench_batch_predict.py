@@ -0,0 +1,55 @@
+"""
+Benchmark per-row vs vectorized PredictiveModel.batch_predict
+
+Run from the backend directory:
+    python -m benchmarks.bench_batch_predict --sizes 1 10 100 1000 5000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from ml_service import PredictiveModel
+
+
+def make_sensor_batch(n: int, seed: int = 0):
+    """Generate n random sensor dicts in the model's feature space"""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n, 5))
+    names = ["temperature", "vibration", "pressure", "power_consumption", "operating_hours"]
+    return [dict(zip(names, map(float, row))) for row in X]
+
+
+def time_call(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 5000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    os.makedirs("models", exist_ok=True)
+    model = PredictiveModel()
+
+    print(f"{'batch':>8} {'per-row (s)':>12} {'batched (s)':>12} {'speedup':>8}  identical")
+    for n in args.sizes:
+        batch = make_sensor_batch(n)
+        per_row = [model.predict(sensor_data) for sensor_data in batch]
+        batched = model.batch_predict(batch)
+        identical = per_row == batched
+
+        t_row = time_call(lambda: [model.predict(s) for s in batch], args.repeats)
+        t_batch = time_call(lambda: model.batch_predict(batch), args.repeats)
+        print(f"{n:>8} {t_row:>12.4f} {t_batch:>12.4f} {t_row / t_batch:>7.1f}x  {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark sending sensor readings as single POSTs vs bulk POSTs
+
+Sends the same readings three ways against a freshly started server:
+one /sensor/reading request each, JSON-array bulk requests and NDJSON
+bulk requests to /sensor/readings/bulk. Run from the backend directory:
+    python -m benchmarks.bench_bulk_ingest --readings 10000 --bulk-size 1000
+"""
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from benchmarks.common import create_tables, free_port, seed_equipment, start_server, stop_server
+
+N_EQUIPMENT = 100
+
+
+def make_readings(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        {
+            "equipment_id": f"BENCH-{rng.randrange(N_EQUIPMENT):05d}",
+            "temperature": rng.uniform(40, 90),
+            "vibration": rng.uniform(0.5, 6.0),
+            "pressure": rng.uniform(2, 15),
+            "power_consumption": rng.uniform(5, 55),
+            "operating_hours": rng.uniform(0, 12000),
+        }
+        for _ in range(n)
+    ]
+
+
+def send_single(base_url: str, readings, concurrency: int) -> int:
+    def worker(offset: int) -> int:
+        ok = 0
+        with httpx.Client(base_url=base_url, timeout=60.0) as client:
+            for reading in readings[offset::concurrency]:
+                ok += client.post("/sensor/reading", json=reading).status_code < 300
+        return ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return sum(executor.map(worker, range(concurrency)))
+
+
+def send_bulk(base_url: str, readings, bulk_size: int, ndjson: bool) -> int:
+    accepted = 0
+    with httpx.Client(base_url=base_url, timeout=300.0) as client:
+        for start in range(0, len(readings), bulk_size):
+            chunk = readings[start : start + bulk_size]
+            if ndjson:
+                body = "\n".join(json.dumps(reading) for reading in chunk)
+                headers = {"content-type": "application/x-ndjson"}
+            else:
+                body = json.dumps(chunk)
+                headers = {"content-type": "application/json"}
+            response = client.post("/sensor/readings/bulk", content=body, headers=headers)
+            accepted += response.json()["accepted"]
+    return accepted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=10000)
+    parser.add_argument("--bulk-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    create_tables()
+    readings = make_readings(args.readings)
+    port = free_port()
+    proc = start_server(port)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        seed_equipment(base_url, N_EQUIPMENT)
+        runs = [
+            ("single POSTs", lambda: send_single(base_url, readings, args.concurrency)),
+            ("bulk JSON array", lambda: send_bulk(base_url, readings, args.bulk_size, ndjson=False)),
+            ("bulk NDJSON", lambda: send_bulk(base_url, readings, args.bulk_size, ndjson=True)),
+        ]
+        print(f"{'mode':<16} {'accepted':>9} {'seconds':>9} {'readings/s':>11}")
+        for name, run in runs:
+            start = time.perf_counter()
+            accepted = run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<16} {accepted:>9} {elapsed:>9.2f} {accepted / elapsed:>11.1f}")
+    finally:
+        stop_server(proc)
+
+
+if __name__ == "__main__":
+    main()
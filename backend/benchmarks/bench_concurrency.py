@@ -0,0 +1,109 @@
+"""
+Concurrency benchmark: p50/p99 latency per endpoint under mixed load
+
+Drives a mix of health, sensor ingest, prediction history and maintenance
+requests from many concurrent clients while a probe measures /health latency
+(a direct read on event-loop stalls). To compare before/after, start each
+build separately and pass both URLs:
+    python -m benchmarks.bench_concurrency --target before=http://127.0.0.1:8001 \\
+        --target after=http://127.0.0.1:8002
+Without --target the current tree is started on a free port.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.common import create_tables, free_port, percentile, seed_equipment, start_server, stop_server
+
+N_EQUIPMENT = 50
+
+
+def random_request(rng: random.Random):
+    equipment_id = f"BENCH-{rng.randrange(N_EQUIPMENT):05d}"
+    roll = rng.random()
+    if roll < 0.4:
+        payload = {
+            "equipment_id": equipment_id,
+            "temperature": rng.uniform(40, 90),
+            "vibration": rng.uniform(0.5, 6.0),
+            "pressure": rng.uniform(2, 15),
+            "power_consumption": rng.uniform(5, 55),
+            "operating_hours": rng.uniform(0, 12000),
+        }
+        return "POST /sensor/reading", "POST", "/sensor/reading", payload
+    if roll < 0.7:
+        return "GET /equipment/{id}/health", "GET", f"/equipment/{equipment_id}/health", None
+    if roll < 0.9:
+        return "GET /predictions/{id}", "GET", f"/predictions/{equipment_id}", None
+    return "GET /maintenance/upcoming", "GET", "/maintenance/upcoming", None
+
+
+async def run_target(base_url: str, concurrency: int, duration: float) -> dict:
+    latencies = defaultdict(list)
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0) as client:
+
+        async def worker(seed: int):
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                label, method, path, payload = random_request(rng)
+                start = time.perf_counter()
+                await client.request(method, path, json=payload)
+                latencies[label].append(time.perf_counter() - start)
+
+        async def probe():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/health")
+                latencies["GET /health (probe)"].append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(probe(), *(worker(i) for i in range(concurrency)))
+
+    return {label: sorted(values) for label, values in latencies.items()}
+
+
+def report(name: str, latencies: dict, duration: float):
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n[{name}] {total / duration:.1f} req/s")
+    print(f"{'endpoint':<30} {'count':>7} {'p50 ms':>9} {'p99 ms':>9}")
+    for label in sorted(latencies):
+        values = latencies[label]
+        print(
+            f"{label:<30} {len(values):>7} {percentile(values, 50) * 1000:>9.2f} "
+            f"{percentile(values, 99) * 1000:>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", default=[], help="name=url of a running server")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    targets = [target.split("=", 1) for target in args.target]
+    proc = None
+    if not targets:
+        create_tables()
+        port = free_port()
+        proc = start_server(port)
+        targets = [("current", f"http://127.0.0.1:{port}")]
+
+    try:
+        for name, base_url in targets:
+            seed_equipment(base_url, N_EQUIPMENT)
+            latencies = asyncio.run(run_target(base_url, args.concurrency, args.duration))
+            report(name, latencies, args.duration)
+    finally:
+        if proc:
+            stop_server(proc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark the cost of per-row explanations on top of plain batch scoring
+
+Times PredictiveModel.batch_predict with and without include_explanation
+on the same rows. "cold" is the first explained batch after the explainer
+was built (no cached cells), "warm" repeats it with every cell cached.
+Also reports how far expected value + contributions is from the
+predicted failure probability.
+
+Run from the backend directory:
+    python -m benchmarks.bench_explanations --rows 10000
+"""
+import argparse
+import os
+import time
+
+from benchmarks.bench_batch_predict import make_sensor_batch
+from ml_service import PredictiveModel
+
+
+def timed(fn, repeats: int = 1, before=None):
+    """Result of fn and its best time over repeats, calling before() untimed ahead of each run"""
+    best = float("inf")
+    for _ in range(repeats):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--engine", default="flat")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    os.makedirs("models", exist_ok=True)
+    model = PredictiveModel(engine=args.engine)
+    batch = make_sensor_batch(args.rows, seed=1)
+
+    # Build the explainer outside the timed runs
+    _, t_build = timed(lambda: model.batch_predict(make_sensor_batch(1, seed=2), include_explanation=True))
+    cache = model._explainer._cache
+
+    plain, t_plain = timed(lambda: model.batch_predict(batch), args.repeats)
+    explained, t_cold = timed(lambda: model.batch_predict(batch, include_explanation=True), args.repeats, cache.clear)
+    _, t_warm = timed(lambda: model.batch_predict(batch, include_explanation=True), args.repeats)
+
+    expected = model._explainer.expected_value
+    error = max(abs(expected + sum(row[3].values()) - row[0]) for row in explained)
+    same_scores = [row[:3] for row in plain] == [row[:3] for row in explained]
+
+    stats = model.get_explainer_stats()
+    print(
+        f"rows: {args.rows}, explainer build: {t_build * 1000:.0f} ms, "
+        f"{stats['tabulated_trees']}/{stats['trees']} trees tabulated"
+    )
+    print(f"{'plain (ms)':>11} {'cold (ms)':>10} {'warm (ms)':>10} {'cold/plain':>11} {'warm/plain':>11}")
+    print(
+        f"{t_plain * 1000:>11.1f} {t_cold * 1000:>10.1f} {t_warm * 1000:>10.1f} "
+        f"{t_cold / t_plain:>10.2f}x {t_warm / t_plain:>10.2f}x"
+    )
+    print(f"same scores: {same_scores}, max |expected + sum(contributions) - probability|: {error:.2g}")
+
+
+if __name__ == "__main__":
+    main()
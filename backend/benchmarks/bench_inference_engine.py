@@ -0,0 +1,58 @@
+"""
+Benchmark the flat-array inference engine against sklearn's RandomForest predict_proba
+
+Both engines serve the same saved model; the flat one must match sklearn
+within PredictiveModel.PARITY_TOLERANCE. "served" is what the flat engine
+uses for a batch of that size, handing batches over --flat-max-batch rows
+to sklearn.
+
+Run from the backend directory:
+    python -m benchmarks.bench_inference_engine --sizes 1 100 100000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from ml_service import PredictiveModel
+
+
+def time_call(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 100000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--flat-max-batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    os.makedirs("models", exist_ok=True)
+    sklearn_model = PredictiveModel(engine="sklearn").classifier
+    served = PredictiveModel(engine="flat", flat_max_batch=args.flat_max_batch)
+    flat_model = served.classifier
+
+    print(f"{'rows':>8} {'sklearn (ms)':>13} {'flat (ms)':>10} {'speedup':>8} {'served (ms)':>12} {'max |diff|':>11}")
+    rng = np.random.default_rng(0)
+    for n in args.sizes:
+        X = rng.standard_normal((n, flat_model.n_features_in_)) * 1.5
+        diff = np.abs(sklearn_model.predict_proba(X) - flat_model.predict_proba(X)).max()
+        repeats = args.repeats if n < 10000 else 1
+        t_sklearn = time_call(lambda: sklearn_model.predict_proba(X), repeats)
+        t_flat = time_call(lambda: flat_model.predict_proba(X), repeats)
+        t_served = time_call(lambda: served._batch_classifier(n).predict_proba(X), repeats)
+        print(
+            f"{n:>8} {t_sklearn * 1000:>13.2f} {t_flat * 1000:>10.2f} "
+            f"{t_sklearn / t_flat:>7.1f}x {t_served * 1000:>12.2f} {diff:>11.2g}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark cold start and per-worker memory of the failure model: joblib pickle vs memory-mapped flat artifact
+
+Trains a forest into a scratch directory, then starts --workers processes
+per format that each load the model and score one row, like uvicorn
+workers booting. Memory is read from /proc once all workers of a format
+are up: PSS splits shared pages between the processes mapping them, so
+a model shared through the page cache shows up as a smaller PSS and
+private footprint per worker. Linux only.
+
+Run from the backend directory:
+    python -m benchmarks.bench_model_load --workers 4 --trees 300 --samples 20000
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+
+import numpy as np
+
+FORMATS = ("pickle", "mmap")
+
+
+def read_memory_kb() -> dict:
+    """RSS, PSS and private (unshared) memory of the current process in kB"""
+    memory = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                memory[key] = int(rest.split()[0])
+    return {
+        "rss": memory["Rss"],
+        "pss": memory["Pss"],
+        "private": memory["Private_Clean"] + memory["Private_Dirty"],
+    }
+
+
+def worker(fmt: str, directory: str, barrier, results):
+    import joblib
+
+    from ml_service import FlatForest
+
+    baseline = read_memory_kb()
+    row = np.zeros((1, 5))
+    start = time.perf_counter()
+    if fmt == "pickle":
+        model = joblib.load(os.path.join(directory, "forest.pkl"))
+    else:
+        model = FlatForest.load(os.path.join(directory, "forest"))
+    loaded = time.perf_counter()
+    model.predict_proba(row)
+    first_prediction = time.perf_counter()
+
+    # Measure with every worker alive so shared pages are split between them
+    barrier.wait()
+    memory = read_memory_kb()
+    results.put(
+        {
+            "load_ms": (loaded - start) * 1000,
+            "first_prediction_ms": (first_prediction - start) * 1000,
+            "rss_mb": (memory["rss"] - baseline["rss"]) / 1024,
+            "pss_mb": (memory["pss"] - baseline["pss"]) / 1024,
+            "private_mb": (memory["private"] - baseline["private"]) / 1024,
+        }
+    )
+    barrier.wait()
+
+
+def run_workers(fmt: str, directory: str, n_workers: int) -> list:
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(n_workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(fmt, directory, barrier, results)) for _ in range(n_workers)]
+    for proc in procs:
+        proc.start()
+    collected = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return collected
+
+
+def build_artifacts(directory: str, n_trees: int, n_samples: int) -> dict:
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+
+    from ml_service import FlatForest
+
+    rng = np.random.default_rng(42)
+    X = rng.standard_normal((n_samples, 5))
+    y = ((X[:, 0] > 1.5) | (X[:, 1] > 1.2) | (X[:, 2] > 1.0) | (X[:, 3] > 1.3)).astype(int)
+    # Label noise keeps trees deep, like a model fit on real sensor data
+    y ^= rng.random(n_samples) < 0.05
+    forest = RandomForestClassifier(n_estimators=n_trees, random_state=42, n_jobs=-1).fit(X, y)
+
+    joblib.dump(forest, os.path.join(directory, "forest.pkl"))
+    flat = FlatForest.from_sklearn(forest)
+    flat.save(os.path.join(directory, "forest"))
+    return {
+        "pickle": os.path.getsize(os.path.join(directory, "forest.pkl")) / 2**20,
+        "mmap": flat.nbytes / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--trees", type=int, default=300)
+    parser.add_argument("--samples", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        sizes = build_artifacts(directory, args.trees, args.samples)
+        print(f"{args.trees} trees, {args.workers} workers")
+        print(
+            f"{'format':>7} {'size MB':>8} {'load ms':>8} {'1st pred ms':>12} "
+            f"{'RSS MB':>8} {'PSS MB':>8} {'private MB':>11}  (per worker, mean)"
+        )
+        for fmt in FORMATS:
+            results = run_workers(fmt, directory, args.workers)
+            mean = {key: float(np.mean([r[key] for r in results])) for key in results[0]}
+            print(
+                f"{fmt:>7} {sizes[fmt]:>8.1f} {mean['load_ms']:>8.1f} {mean['first_prediction_ms']:>12.1f} "
+                f"{mean['rss_mb']:>8.1f} {mean['pss_mb']:>8.1f} {mean['private_mb']:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Load benchmark comparing NullPool and QueuePool throughput on /sensor/reading
+
+Starts the API once per pool class (DB_POOL_CLASS=null / queue) against the
+configured DATABASE_URL and drives /sensor/reading from concurrent clients.
+Use a real MySQL instance for meaningful numbers; run from the backend directory:
+    DATABASE_URL=mysql+pymysql://... python -m benchmarks.bench_pool --requests 2000
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from benchmarks.common import create_tables, free_port, percentile, seed_equipment, start_server, stop_server
+
+
+def run_load(base_url: str, n_requests: int, concurrency: int, n_equipment: int) -> dict:
+    seed_equipment(base_url, n_equipment)
+
+    def worker(worker_id: int):
+        latencies = []
+        with httpx.Client(base_url=base_url, timeout=30.0) as client:
+            for i in range(worker_id, n_requests, concurrency):
+                payload = {
+                    "equipment_id": f"BENCH-{i % n_equipment:05d}",
+                    "temperature": 55.0 + i % 30,
+                    "vibration": 2.0,
+                    "pressure": 8.0,
+                    "power_consumption": 15.0,
+                    "operating_hours": 1200.0,
+                }
+                start = time.perf_counter()
+                client.post("/sensor/reading", json=payload)
+                latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = [lat for chunk in executor.map(worker, range(concurrency)) for lat in chunk]
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "pool": httpx.get(f"{base_url}/metrics").json()["db_pool"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--equipment", type=int, default=50)
+    args = parser.parse_args()
+
+    create_tables()
+
+    for pool_class in ("null", "queue"):
+        port = free_port()
+        proc = start_server(port, DB_POOL_CLASS=pool_class)
+        try:
+            result = run_load(f"http://127.0.0.1:{port}", args.requests, args.concurrency, args.equipment)
+        finally:
+            stop_server(proc)
+        print(
+            f"{pool_class:>6}: {result['throughput']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  pool={result['pool']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
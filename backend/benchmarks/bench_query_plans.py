@@ -0,0 +1,219 @@
+"""
+Seed a large history and measure query plans and latency of hot endpoint queries
+
+Seeds sensor_readings (default 10M rows), predictions, maintenance events and
+audit logs into the configured DATABASE_URL, then prints the query plan and
+median latency of the queries behind each endpoint. Run it once as-is and
+once with --drop-indexes to see what the composite indexes buy:
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.bench_query_plans --rows 10000000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, insert, select, text
+
+from benchmarks.common import create_tables
+from database import engine
+from models import AuditLog, Equipment, MaintenanceEvent, Prediction, SensorReading
+
+HOT_PATH_INDEXES = {
+    "ix_sensor_readings_equipment_timestamp": "sensor_readings (equipment_id, timestamp)",
+    "ix_predictions_equipment_timestamp": "predictions (equipment_id, prediction_timestamp)",
+    "ix_maintenance_events_scheduled_date": "maintenance_events (scheduled_date)",
+    "ix_maintenance_events_equipment_scheduled": "maintenance_events (equipment_id, scheduled_date)",
+    "ix_audit_logs_equipment_timestamp": "audit_logs (equipment_id, timestamp)",
+}
+
+
+def equipment_id(i: int) -> str:
+    return f"BENCH-{i:05d}"
+
+
+def seed(n_rows: int, n_equipment: int, chunk_size: int = 50000):
+    rng = np.random.default_rng(0)
+    start = datetime(2025, 1, 1)
+    span_seconds = 365 * 24 * 3600
+
+    with engine.begin() as conn:
+        if conn.scalar(select(func.count()).select_from(SensorReading.__table__)) >= n_rows:
+            print("Database already seeded, skipping")
+            return
+        conn.execute(
+            insert(Equipment.__table__),
+            [
+                {"equipment_id": equipment_id(i), "name": "Bench pump", "type": "Pump", "health_score": 100.0}
+                for i in range(n_equipment)
+            ],
+        )
+
+    seeded = 0
+    seed_start = time.perf_counter()
+    while seeded < n_rows:
+        n = min(chunk_size, n_rows - seeded)
+        owners = rng.integers(0, n_equipment, n)
+        offsets = rng.integers(0, span_seconds, n)
+        values = rng.normal([60, 2.5, 8, 20, 5000], [10, 1, 2, 5, 2000], (n, 5))
+        readings = [
+            {
+                "equipment_id": equipment_id(owner),
+                "temperature": row[0],
+                "vibration": row[1],
+                "pressure": row[2],
+                "power_consumption": row[3],
+                "operating_hours": row[4],
+                "anomaly_score": 0.0,
+                "timestamp": start + timedelta(seconds=int(offset)),
+            }
+            for owner, offset, row in zip(owners.tolist(), offsets.tolist(), values.tolist())
+        ]
+        predictions = [
+            {
+                "equipment_id": reading["equipment_id"],
+                "failure_probability": 0.1,
+                "rul_days": 27,
+                "model_version": "v1.0",
+                "prediction_timestamp": reading["timestamp"],
+            }
+            for reading in readings[::10]
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(SensorReading.__table__), readings)
+            conn.execute(insert(Prediction.__table__), predictions)
+        seeded += n
+        rate = seeded / (time.perf_counter() - seed_start)
+        print(f"\rseeded {seeded:,}/{n_rows:,} readings ({rate:,.0f} rows/s)", end="", flush=True)
+    print()
+
+    with engine.begin() as conn:
+        conn.execute(
+            insert(MaintenanceEvent.__table__),
+            [
+                {
+                    "equipment_id": equipment_id(i % n_equipment),
+                    "maintenance_type": "inspection",
+                    "status": "SCHEDULED",
+                    "scheduled_date": start + timedelta(days=random.randrange(0, 900)),
+                }
+                for i in range(n_equipment * 20)
+            ],
+        )
+        conn.execute(
+            insert(AuditLog.__table__),
+            [
+                {
+                    "equipment_id": equipment_id(i % n_equipment),
+                    "action": "create_case",
+                    "user_id": "system",
+                    "timestamp": start + timedelta(minutes=i),
+                }
+                for i in range(n_equipment * 50)
+            ],
+        )
+
+
+def endpoint_queries(n_equipment: int):
+    target = equipment_id(n_equipment // 2)
+    batch_ids = [equipment_id(i) for i in range(0, n_equipment, max(1, n_equipment // 100))]
+    ranked = (
+        select(
+            SensorReading.equipment_id,
+            SensorReading.temperature,
+            func.row_number()
+            .over(
+                partition_by=SensorReading.equipment_id,
+                order_by=(SensorReading.timestamp.desc(), SensorReading.id.desc()),
+            )
+            .label("row_number"),
+        )
+        .where(SensorReading.equipment_id.in_(batch_ids))
+        .subquery()
+    )
+    return {
+        "GET /equipment/{id}/health (latest reading)": select(SensorReading)
+        .where(SensorReading.equipment_id == target)
+        .order_by(SensorReading.timestamp.desc())
+        .limit(1),
+        "GET /equipment/{id}/health (latest prediction)": select(Prediction)
+        .where(Prediction.equipment_id == target)
+        .order_by(Prediction.prediction_timestamp.desc())
+        .limit(1),
+        "GET /predictions/{id}": select(Prediction)
+        .where(Prediction.equipment_id == target)
+        .order_by(Prediction.prediction_timestamp.desc())
+        .limit(10),
+        "GET /maintenance/upcoming": select(MaintenanceEvent)
+        .where(MaintenanceEvent.scheduled_date >= datetime(2026, 1, 1))
+        .order_by(MaintenanceEvent.scheduled_date),
+        "POST /predict/batch (latest per id)": select(ranked).where(ranked.c.row_number == 1),
+        "audit history per equipment": select(AuditLog)
+        .where(AuditLog.equipment_id == target)
+        .order_by(AuditLog.timestamp.desc())
+        .limit(50),
+    }
+
+
+def explain(conn, statement) -> str:
+    sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    if engine.dialect.name == "sqlite":
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+        return "\n".join(f"    {row[-1]}" for row in rows)
+    rows = conn.execute(text(f"EXPLAIN {sql}")).mappings().fetchall()
+    return "\n".join(
+        f"    table={row.get('table')} type={row.get('type')} key={row.get('key')} rows={row.get('rows')}"
+        for row in rows
+    )
+
+
+def drop_indexes():
+    with engine.begin() as conn:
+        for name, target in HOT_PATH_INDEXES.items():
+            table = target.split()[0]
+            if engine.dialect.name == "sqlite":
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            else:
+                conn.execute(text(f"DROP INDEX {name} ON {table}"))
+
+
+def restore_indexes():
+    with engine.begin() as conn:
+        for name, target in HOT_PATH_INDEXES.items():
+            table, columns = target.split(" ", 1)
+            if engine.dialect.name == "sqlite":
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {columns}"))
+            else:
+                conn.execute(text(f"CREATE INDEX {name} ON {table} {columns}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--equipment", type=int, default=8000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--drop-indexes", action="store_true", help="measure without the hot path indexes")
+    parser.add_argument("--restore-indexes", action="store_true", help="recreate indexes dropped by a previous run")
+    args = parser.parse_args()
+
+    create_tables()
+    seed(args.rows, args.equipment)
+    if args.drop_indexes:
+        drop_indexes()
+    elif args.restore_indexes:
+        restore_indexes()
+
+    with engine.connect() as conn:
+        for label, statement in endpoint_queries(args.equipment).items():
+            timings = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                conn.execute(statement).fetchall()
+                timings.append(time.perf_counter() - start)
+            print(f"{label}: median {statistics.median(timings) * 1000:.2f} ms")
+            print(explain(conn, statement))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark /equipment/{id}/readings queries against the column store
+
+Writes DAYS of 1 Hz readings for one equipment into a scratch store, seals
+them, then times plot-ready queries (cold, then warm page cache):
+    python -m benchmarks.bench_readings_query --days 365 --root /tmp/fleetvision-ts
+"""
+import argparse
+import os
+import shutil
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from rollups import SENSOR_FIELDS
+from timeseries_store import ColumnStore, to_epoch_ms
+
+EQUIPMENT_ID = "BENCH-TS"
+
+
+def seed(store: ColumnStore, start: datetime, days: int):
+    rng = np.random.default_rng(0)
+    seconds = np.arange(86400, dtype=np.int64)
+    seed_start = time.perf_counter()
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).date()
+        timestamps = to_epoch_ms(start + timedelta(days=offset)) + seconds * 1000
+        drift = offset / max(days, 1)
+        values = {
+            "temperature": 60 + 10 * drift + rng.normal(0, 2, 86400),
+            "vibration": 2 + drift + np.abs(rng.normal(0, 0.3, 86400)),
+            "pressure": 8 + rng.normal(0, 0.5, 86400),
+            "power_consumption": 20 + rng.normal(0, 1, 86400),
+            "operating_hours": offset * 24 + seconds / 3600,
+        }
+        store.append_columns(EQUIPMENT_ID, day, timestamps, values)
+        print(f"\rwrote {offset + 1}/{days} days", end="", flush=True)
+    print(f" ({days * 86400 / (time.perf_counter() - seed_start):,.0f} rows/s)")
+    seal_start = time.perf_counter()
+    store.seal_pending()
+    print(f"sealed {days} segments in {time.perf_counter() - seal_start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--root", default="/tmp/fleetvision-ts")
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="reuse an existing store at --root")
+    args = parser.parse_args()
+
+    start = datetime(2025, 1, 1)
+    end = start + timedelta(days=args.days)
+    if not args.keep:
+        shutil.rmtree(args.root, ignore_errors=True)
+    store = ColumnStore(args.root)
+    if not os.path.isdir(os.path.join(args.root, EQUIPMENT_ID)):
+        seed(store, start, args.days)
+
+    cases = [
+        ("full range, minmax, all sensors", start, end, SENSOR_FIELDS, "auto", "minmax"),
+        ("full range, minmax, temperature", start, end, ("temperature",), "auto", "minmax"),
+        ("full range, lttb, temperature", start, end, ("temperature",), "auto", "lttb"),
+        ("last day, minmax, all sensors", end - timedelta(days=1), end, SENSOR_FIELDS, "auto", "minmax"),
+        ("last hour, raw, all sensors", end - timedelta(hours=1), end, SENSOR_FIELDS, "raw", "minmax"),
+    ]
+    print(f"{'query':<34} {'first (ms)':>11} {'median (ms)':>12} {'points':>8}")
+    for label, q_start, q_end, sensors, resolution, method in cases:
+        timings = []
+        for _ in range(args.repeats):
+            t0 = time.perf_counter()
+            result = store.query(EQUIPMENT_ID, q_start, q_end, sensors, resolution, args.points, method)
+            timings.append(time.perf_counter() - t0)
+        points = len(next(iter(result["series"].values()))["timestamps"])
+        print(f"{label:<34} {timings[0] * 1000:>11.1f} {statistics.median(timings) * 1000:>12.1f} {points:>8}")
+
+
+if __name__ == "__main__":
+    main()
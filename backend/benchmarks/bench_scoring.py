@@ -0,0 +1,80 @@
+"""
+Benchmark per-reading vs array health and anomaly scoring
+
+Scores --rows synthetic readings from --equipment machines both ways and
+checks that every health score, status, anomaly score and severity is
+identical. The per-reading path is timed on the first --scalar-rows
+readings and extrapolated, since it takes minutes at a million rows.
+
+Run from the backend directory:
+    python -m benchmarks.bench_scoring --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ml_service import SENSOR_FIELDS, AnomalyDetector, HealthScoreCalculator
+
+
+def make_readings(n: int, n_equipment: int, seed: int = 0):
+    """(n, 5) readings in SENSOR_FIELDS order around per-equipment levels, a few missing, plus equipment IDs"""
+    rng = np.random.default_rng(seed)
+    equipment = rng.integers(0, n_equipment, n)
+    levels = rng.uniform([40, 1, 3, 10, 0], [90, 6, 14, 60, 12000], (n_equipment, len(SENSOR_FIELDS)))
+    spread = np.array([3.0, 0.5, 1.0, 5.0, 100.0])
+    values = levels[equipment] + rng.standard_normal((n, len(SENSOR_FIELDS))) * spread
+    values[rng.random(values.shape) < 0.001] = np.nan
+    return values, [f"EQ-{e:05d}" for e in equipment]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--equipment", type=int, default=10000)
+    parser.add_argument("--scalar-rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    values, equipment_ids = make_readings(args.rows, args.equipment)
+    # The per-reading API takes dicts with None for missing sensors
+    dicts = [
+        {"equipment_id": equipment_id, **{f: None if np.isnan(v) else v for f, v in zip(SENSOR_FIELDS, row)}}
+        for equipment_id, row in zip(equipment_ids, values.tolist())
+    ]
+    n_scalar = min(args.scalar_rows, args.rows)
+    calculator = HealthScoreCalculator()
+
+    started = time.perf_counter()
+    scalar_health = [calculator.calculate_health_score(d) for d in dicts[:n_scalar]]
+    scalar_status = [calculator.determine_status(h) for h in scalar_health]
+    t_health_scalar = (time.perf_counter() - started) * args.rows / n_scalar
+
+    started = time.perf_counter()
+    health = calculator.calculate_health_scores(np.nan_to_num(values, nan=0.0))
+    status = calculator.determine_statuses(health)
+    t_health_array = time.perf_counter() - started
+    health_identical = health[:n_scalar].tolist() == scalar_health and status[:n_scalar].tolist() == scalar_status
+
+    detector = AnomalyDetector()
+    started = time.perf_counter()
+    scalar_anomalies = [detector.detect_anomaly(d) for d in dicts[:n_scalar]]
+    t_anomaly_scalar = (time.perf_counter() - started) * args.rows / n_scalar
+
+    detector = AnomalyDetector()
+    started = time.perf_counter()
+    scores, severities = detector.detect_anomalies(values, equipment_ids)
+    t_anomaly_array = time.perf_counter() - started
+    anomaly_identical = list(zip(scores[:n_scalar].tolist(), severities[:n_scalar].tolist())) == scalar_anomalies
+
+    print(f"{args.rows:,} readings from {args.equipment:,} equipment (per-reading timed on {n_scalar:,})")
+    print(f"{'':>8} {'per-reading (s)':>16} {'array (s)':>10} {'speedup':>8}  identical")
+    for name, t_scalar, t_array, identical in (
+        ("health", t_health_scalar, t_health_array, health_identical),
+        ("anomaly", t_anomaly_scalar, t_anomaly_array, anomaly_identical),
+    ):
+        print(f"{name:>8} {t_scalar:>16.2f} {t_array:>10.3f} {t_scalar / t_array:>7.1f}x  {identical}")
+    print(f"severities: {dict(zip(*np.unique(severities, return_counts=True)))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark full per-reading updates against the coalesced delta stream
+
+Simulates --machines machines each reporting --hz times a second for
+--seconds, delivered to --clients dashboards subscribed to every machine:
+once as one full sensor_update message per reading (/ws/equipment), and
+through the update stream (/ws/stream) with JSON and MessagePack frames
+every --tick seconds. Reports bytes/s per dashboard and the CPU time used
+per second for every 1,000 machines.
+
+Run from the backend directory:
+    python -m benchmarks.bench_update_stream --machines 1000 --hz 10 --clients 10
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+import numpy as np
+
+from backplane import LocalBackplane
+from connection_manager import ALL_EQUIPMENT, ConnectionManager
+from update_stream import UpdateStream, sensor_update
+
+
+class CountingSocket:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.frames += 1
+        self.bytes += len(text.encode())
+
+    async def send_bytes(self, data: bytes):
+        self.frames += 1
+        self.bytes += len(data)
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def make_rounds(args):
+    """Per reading round, one sensor_update per machine from slowly drifting sensors"""
+    rng = np.random.default_rng(0)
+    n = args.machines
+    levels = rng.uniform([40, 1, 3, 10], [90, 6, 14, 60], (n, 4))
+    health = rng.uniform(40, 100, n)
+    probability = rng.uniform(0, 1, n)
+    rul = rng.integers(1, 90, n)
+    rounds = []
+    for _ in range(int(args.seconds * args.hz)):
+        levels += rng.standard_normal(levels.shape) * [0.05, 0.01, 0.02, 0.1]
+        health = np.clip(health + rng.standard_normal(n) * 0.01, 0, 100)
+        probability = np.clip(probability + rng.standard_normal(n) * 0.001, 0, 1)
+        now = datetime.utcnow()
+        rounds.append(
+            [
+                sensor_update(
+                    f"EQ-{i:05d}",
+                    {
+                        "temperature": row[0],
+                        "vibration": row[1],
+                        "pressure": row[2],
+                        "power_consumption": row[3],
+                        "anomaly_score": 0.0,
+                    },
+                    h,
+                    "healthy" if h >= 70 else "warning" if h >= 40 else "critical",
+                    p,
+                    r,
+                    now,
+                )
+                for i, (row, h, p, r) in enumerate(zip(levels.tolist(), health.tolist(), probability.tolist(), rul))
+            ]
+        )
+    return rounds
+
+
+async def run_case(args, rounds, name: str, manager: ConnectionManager, **connect_options):
+    sockets = [CountingSocket() for _ in range(args.clients)]
+    for socket in sockets:
+        await manager.connect(socket, [ALL_EQUIPMENT], **connect_options)
+    await asyncio.sleep(0)
+    for socket in sockets:
+        # Leave out the snapshot on subscribe
+        socket.frames = socket.bytes = 0
+    if isinstance(manager, UpdateStream):
+        await manager.start()
+    backplane = LocalBackplane([manager])
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    for i, updates in enumerate(rounds):
+        for update in updates:
+            await backplane.publish(update)
+        # Readings arrive at --hz; writers and ticks run in between
+        await asyncio.sleep(max(0.0, started + (i + 1) / args.hz - time.perf_counter()))
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    if isinstance(manager, UpdateStream):
+        await manager.stop()
+    for socket in sockets:
+        manager.disconnect(socket)
+    await asyncio.sleep(0)
+
+    per_client = sum(socket.bytes for socket in sockets) / len(sockets) / elapsed
+    frames = sum(socket.frames for socket in sockets) / len(sockets) / elapsed
+    print(
+        f"{name:>16}: {per_client / 1024:9.1f} KiB/s and {frames:8.1f} frames/s per dashboard, "
+        f"{cpu / elapsed / (args.machines / 1000) * 1000:6.1f} ms CPU/s per 1,000 machines"
+    )
+
+
+async def run(args):
+    rounds = make_rounds(args)
+    print(
+        f"{args.machines} machines at {args.hz} Hz, {args.clients} dashboards on every machine, "
+        f"{args.seconds}s, tick {args.tick}s"
+    )
+    await run_case(args, rounds, "full updates", ConnectionManager(queue_size=args.machines * args.hz))
+    await run_case(args, rounds, "stream json", UpdateStream(tick=args.tick), encoding="json")
+    await run_case(args, rounds, "stream msgpack", UpdateStream(tick=args.tick), encoding="msgpack")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--machines", type=int, default=1000)
+    parser.add_argument("--hz", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--tick", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark WebSocket fan-out to many clients, including slow ones
+
+Connects --clients simulated sockets, each subscribed to one of --equipment
+machines, with --wildcard of them subscribed to every machine and --slow of
+them taking --slow-ms per send. Publishes --messages sensor updates and
+reports how long ingest was blocked publishing them and how long until every
+fast client had received its updates. The previous manager (every update
+encoded and awaited per socket, to every socket) runs on --legacy-messages
+updates and is extrapolated, since slow clients stall each of its
+broadcasts.
+
+Run from the backend directory:
+    python -m benchmarks.bench_websocket_fanout --clients 10000 --messages 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from connection_manager import ALL_EQUIPMENT, ConnectionManager
+
+
+class FakeSocket:
+    """Counts what it is sent; slow sockets take delay seconds per send"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.messages = 0
+        self.bytes = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.messages += 1
+        self.bytes += len(text)
+
+    async def send_json(self, data: dict):
+        await self.send_text(json.dumps(data))
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class LegacyConnectionManager:
+    """The previous manager: every update to every socket, one after another"""
+
+    def __init__(self):
+        self.active_connections = []
+
+    async def broadcast(self, data: dict):
+        for connection in self.active_connections:
+            await connection.send_json(data)
+
+
+def make_clients(args, rng):
+    """(socket, subscribed topic) per client"""
+    clients = []
+    for i in range(args.clients):
+        socket = FakeSocket(args.slow_ms / 1000 if rng.random() < args.slow else 0.0)
+        topic = ALL_EQUIPMENT if rng.random() < args.wildcard else f"EQ-{rng.randrange(args.equipment):05d}"
+        clients.append((socket, topic))
+    return clients
+
+
+def make_updates(n: int, n_equipment: int, rng):
+    return [
+        {
+            "type": "sensor_update",
+            "equipment_id": f"EQ-{rng.randrange(n_equipment):05d}",
+            "health_score": round(rng.uniform(0, 100), 2),
+            "failure_probability": round(rng.random(), 4),
+            "timestamp": "2026-01-01T00:00:00",
+        }
+        for _ in range(n)
+    ]
+
+
+async def run_topic(args, clients, updates, policy: str):
+    manager = ConnectionManager(queue_size=args.queue_size, policy=policy)
+    for socket, topic in clients:
+        await manager.connect(socket, [topic])
+    fast = [socket for socket, _ in clients if not socket.delay]
+
+    started = time.perf_counter()
+    blocked = 0.0
+    for update in updates:
+        t = time.perf_counter()
+        await manager.broadcast(update)
+        blocked += time.perf_counter() - t
+        # Let writers run between updates as they would between ingest requests
+        await asyncio.sleep(0)
+    while any(manager._clients[socket].pending for socket in fast):
+        await asyncio.sleep(0.001)
+    delivered = time.perf_counter() - started
+
+    stats = manager.get_stats()
+    for socket, _ in clients:
+        manager.disconnect(socket)
+    await asyncio.sleep(0)
+    return blocked, delivered, stats
+
+
+async def run_legacy(args, clients, updates):
+    manager = LegacyConnectionManager()
+    manager.active_connections = [socket for socket, _ in clients]
+    started = time.perf_counter()
+    for update in updates:
+        await manager.broadcast(update)
+    return time.perf_counter() - started
+
+
+async def run(args):
+    rng = random.Random(0)
+    clients = make_clients(args, rng)
+    updates = make_updates(args.messages, args.equipment, rng)
+    n_slow = sum(1 for socket, _ in clients if socket.delay)
+    n_wildcard = sum(1 for _, topic in clients if topic == ALL_EQUIPMENT)
+    print(
+        f"{args.clients} clients ({n_wildcard} on every equipment, {n_slow} slow at {args.slow_ms}ms/send), "
+        f"{args.equipment} equipment, {args.messages} updates"
+    )
+
+    expected = Counter(update["equipment_id"] for update in updates)
+    expected[ALL_EQUIPMENT] = len(updates)
+
+    legacy = await run_legacy(args, clients, updates[: args.legacy_messages])
+    per_update = legacy / args.legacy_messages
+    print(
+        f"{'legacy broadcast':>22}: {per_update * 1000:9.2f} ms/update blocked, "
+        f"~{per_update * args.messages:8.1f}s for all updates (extrapolated)"
+    )
+
+    for policy in ("coalesce", "drop_oldest"):
+        for socket, _ in clients:
+            socket.messages = socket.bytes = 0
+        blocked, delivered, stats = await run_topic(args, clients, updates, policy)
+        complete = all(
+            socket.messages == expected[topic] for socket, topic in clients if not socket.delay
+        )
+        print(
+            f"{'topic ' + policy:>22}: {blocked / args.messages * 1000:9.3f} ms/update blocked, "
+            f"{delivered:8.2f}s until fast clients caught up; "
+            f"{stats['sent']} sent, {stats['coalesced']} coalesced, {stats['dropped']} dropped, "
+            f"fast clients got every update: {complete}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--equipment", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--wildcard", type=float, default=0.05, help="fraction of clients subscribed to everything")
+    parser.add_argument("--slow", type=float, default=0.01, help="fraction of slow clients")
+    parser.add_argument("--slow-ms", type=float, default=20.0)
+    parser.add_argument("--queue-size", type=int, default=256)
+    parser.add_argument("--legacy-messages", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Helpers shared by the HTTP benchmarks"""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def free_port() -> int:
+    """Pick an unused local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, **env_overrides) -> subprocess.Popen:
+    """Start the API under uvicorn with extra environment variables and wait for /health"""
+    env = dict(os.environ, **env_overrides)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Server did not start")
+
+
+def stop_server(proc: subprocess.Popen):
+    proc.terminate()
+    proc.wait()
+
+
+def create_tables():
+    """Migrate the configured DATABASE_URL to the latest schema"""
+    from database import init_db
+
+    init_db()
+
+
+def seed_equipment(base_url: str, n_equipment: int, prefix: str = "BENCH"):
+    """Register n_equipment pumps through the API (existing IDs are ignored)"""
+    with httpx.Client(base_url=base_url, timeout=30.0) as client:
+        for i in range(n_equipment):
+            client.post(
+                "/equipment",
+                json={"equipment_id": f"{prefix}-{i:05d}", "name": "Bench pump", "type": "Pump"},
+            )
+
+
+def percentile(sorted_values, q: float) -> float:
+    """q-th percentile (0-100) of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
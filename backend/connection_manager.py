@@ -0,0 +1,211 @@
+import asyncio
+import itertools
+import json
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# Topic of clients that receive every equipment's updates
+ALL_EQUIPMENT = "*"
+
+SLOW_CLIENT_POLICIES = ("drop_oldest", "coalesce")
+
+# Message types that carry an equipment's latest state; a newer one replaces an unsent one
+COALESCED_TYPES = ("sensor_update",)
+
+
+class _Client:
+    """One connected socket: its topics, pending messages and writer task"""
+
+    __slots__ = ("websocket", "topics", "pending", "ready", "writer")
+
+    def __init__(self, websocket: WebSocket, policy: str, queue_size: int):
+        self.websocket = websocket
+        self.topics: Set[str] = set()
+        # drop_oldest: encoded messages in order; coalesce: encoded messages in order, keyed by
+        # ("state", type, equipment_id) for COALESCED_TYPES (latest only) and a sequence number otherwise
+        self.pending = deque(maxlen=queue_size) if policy == "drop_oldest" else OrderedDict()
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+
+
+class ConnectionManager:
+    """Topic-filtered WebSocket fan-out with a bounded send queue per client
+
+    Clients subscribe to equipment IDs (or ``ALL_EQUIPMENT``), and an update
+    goes only to the subscribers of its ``equipment_id``. It is JSON-encoded
+    once and the same text is queued for every subscriber, so ``broadcast``
+    never waits on a socket. Each client has its own writer task draining
+    its queue, so a slow dashboard only delays itself. When a client's queue
+    holds ``queue_size`` messages, ``drop_oldest`` discards its oldest
+    message. ``coalesce`` keeps only the latest unsent message of each
+    ``COALESCED_TYPES`` type per equipment, in the place of the first one,
+    and queues every other message in order (discarding the oldest entry
+    when that is still too many). A send that fails or takes longer than ``send_timeout``
+    seconds drops the client and closes its socket.
+    """
+
+    def __init__(self, queue_size: int = 256, policy: str = "coalesce", send_timeout: float = 10.0):
+        if policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(SLOW_CLIENT_POLICIES)}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self._clients: Dict[WebSocket, _Client] = {}
+        self._subscribers: Dict[str, Set[_Client]] = {}
+        self._sequence = itertools.count()
+
+        # Metrics
+        self.published = 0
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.send_failures = 0
+
+    async def connect(self, websocket: WebSocket, topics: Iterable[str] = ()):
+        await websocket.accept()
+        self.register(websocket, topics)
+
+    def register(self, websocket: WebSocket, topics: Iterable[str] = ()):
+        """Start delivering to an accepted socket"""
+        client = _Client(websocket, self.policy, self.queue_size)
+        self._clients[websocket] = client
+        self.subscribe(websocket, topics)
+        client.writer = asyncio.create_task(self._write(client))
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        client = self._clients.get(websocket)
+        if client is None:
+            return
+        for topic in topics:
+            client.topics.add(topic)
+            self._subscribers.setdefault(topic, set()).add(client)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        client = self._clients.get(websocket)
+        if client is None:
+            return
+        for topic in topics:
+            client.topics.discard(topic)
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def disconnect(self, websocket: WebSocket):
+        """Stop delivering to a socket; safe to call for sockets already dropped"""
+        client = self._clients.pop(websocket, None)
+        if client is None:
+            return
+        self._unsubscribe_all(client)
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+    def _unsubscribe_all(self, client: _Client):
+        for topic in client.topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._subscribers[topic]
+        client.topics.clear()
+
+    async def broadcast(self, data: dict):
+        """Queue an update for the subscribers of its equipment_id (and of every equipment)"""
+        topic = data.get("equipment_id")
+        if topic in self._subscribers or ALL_EQUIPMENT in self._subscribers:
+            self.publish(topic, json.dumps(data, default=str), data)
+        else:
+            # Nobody to encode it for
+            self.published += 1
+
+    def publish(self, topic: Optional[str], text: str, data: Optional[dict] = None):
+        """Queue already-encoded text for the subscribers of topic; data is the decoded update, if at hand"""
+        self.published += 1
+        topics = (topic,) if topic == ALL_EQUIPMENT else (topic, ALL_EQUIPMENT)
+        key = None
+        for subscribers in [self._subscribers.get(t) for t in topics]:
+            if subscribers:
+                if key is None and self.policy == "coalesce":
+                    key = self._key(topic, text, data)
+                for client in subscribers:
+                    self._enqueue(client, key, text)
+
+    def _key(self, topic: Optional[str], text: str, data: Optional[dict]):
+        """Coalesce queue key: shared by an equipment's state messages of one type, unique otherwise"""
+        if data is None:
+            try:
+                data = json.loads(text)
+            except ValueError:
+                data = None
+        message_type = data.get("type") if isinstance(data, dict) else None
+        if message_type in COALESCED_TYPES and topic is not None:
+            return ("state", message_type, topic)
+        return next(self._sequence)
+
+    def _enqueue(self, client: _Client, key, text: str):
+        pending = client.pending
+        if self.policy == "drop_oldest":
+            if len(pending) == self.queue_size:
+                self.dropped += 1
+            pending.append(text)
+        elif key in pending:
+            # Keep the equipment's place in line, with its latest state
+            pending[key] = text
+            self.coalesced += 1
+            return
+        else:
+            pending[key] = text
+            if len(pending) > self.queue_size:
+                pending.popitem(last=False)
+                self.dropped += 1
+        self.queued += 1
+        client.ready.set()
+
+    async def _write(self, client: _Client):
+        websocket = client.websocket
+        pending = client.pending
+        pop = pending.popleft if isinstance(pending, deque) else lambda: pending.popitem(last=False)[1]
+        try:
+            while True:
+                if not pending:
+                    client.ready.clear()
+                    await client.ready.wait()
+                    continue
+                text = pop()
+                async with asyncio.timeout(self.send_timeout):
+                    await websocket.send_text(text)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Dead or stalled socket: stop delivering and let the endpoint see the close
+            self.send_failures += 1
+            logger.info(f"Dropping WebSocket client after failed send: {type(e).__name__} {str(e)}")
+            self.disconnect(websocket)
+            try:
+                async with asyncio.timeout(self.send_timeout):
+                    await websocket.close(code=1011)
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict:
+        return {
+            "clients": len(self._clients),
+            "topics": len(self._subscribers),
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "pending": sum(len(client.pending) for client in self._clients.values()),
+            "published": self.published,
+            "queued": self.queued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "send_failures": self.send_failures,
+        }
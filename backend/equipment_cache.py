@@ -0,0 +1,181 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Equipment
+
+logger = logging.getLogger(__name__)
+
+# Equipment attributes that only change through create/update of the registry.
+# Health score and status change on every reading and are never cached here.
+CACHED_FIELDS = ("id", "equipment_id", "name", "type", "location", "manufacturer", "model", "criticality")
+
+
+class EquipmentCache:
+    """Process-local TTL/LRU cache of equipment registry entries keyed by equipment_id
+
+    Lookups check the local LRU first, then an optional shared Redis tier,
+    then the database. Unknown IDs are cached for a short negative TTL so a
+    misconfigured gateway cannot turn every reading into a SELECT.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_size: int = 10000,
+        negative_ttl: float = 5.0,
+        redis_url: Optional[str] = None,
+        redis_prefix: str = "fleetvision:equipment:",
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        self.redis_prefix = redis_prefix
+        self._entries: "OrderedDict[str, Tuple[float, Optional[dict]]]" = OrderedDict()
+        self._redis = None
+        self._redis_retry_at = 0.0
+
+        if redis_url:
+            try:
+                import redis.asyncio as aioredis
+
+                self._redis = aioredis.from_url(redis_url, decode_responses=True)
+                logger.info("Equipment cache Redis tier enabled")
+            except ImportError:
+                logger.warning("redis package not installed, equipment cache is process-local only")
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+        self.db_loads = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _get_local(self, equipment_id: str) -> Tuple[bool, Optional[dict]]:
+        entry = self._entries.get(equipment_id)
+        if entry is None:
+            return False, None
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            del self._entries[equipment_id]
+            return False, None
+        self._entries.move_to_end(equipment_id)
+        return True, snapshot
+
+    def _set_local(self, equipment_id: str, snapshot: Optional[dict]):
+        ttl = self.ttl if snapshot is not None else self.negative_ttl
+        self._entries[equipment_id] = (time.monotonic() + ttl, snapshot)
+        self._entries.move_to_end(equipment_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _redis_available(self) -> bool:
+        return self._redis is not None and time.monotonic() >= self._redis_retry_at
+
+    def _redis_failed(self, error: Exception):
+        # Back off instead of paying a connection timeout on every lookup
+        logger.warning(f"Equipment cache Redis tier unavailable: {str(error)}")
+        self._redis_retry_at = time.monotonic() + 30.0
+
+    async def _get_redis_many(self, equipment_ids: list) -> Dict[str, dict]:
+        if not equipment_ids or not self._redis_available():
+            return {}
+        try:
+            values = await self._redis.mget([self.redis_prefix + eid for eid in equipment_ids])
+        except Exception as e:
+            self._redis_failed(e)
+            return {}
+        return {eid: json.loads(value) for eid, value in zip(equipment_ids, values) if value}
+
+    async def _set_redis_many(self, snapshots: Dict[str, dict]):
+        if not snapshots or not self._redis_available():
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for equipment_id, snapshot in snapshots.items():
+                    pipe.set(self.redis_prefix + equipment_id, json.dumps(snapshot), ex=int(self.ttl))
+                await pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def get_many(self, db: AsyncSession, equipment_ids: Iterable[str]) -> Dict[str, dict]:
+        """Resolve registry snapshots for many IDs; unknown IDs are omitted"""
+        found: Dict[str, dict] = {}
+        missing = []
+        for equipment_id in dict.fromkeys(equipment_ids):
+            cached, snapshot = self._get_local(equipment_id)
+            if cached:
+                self.hits += 1
+                if snapshot is not None:
+                    found[equipment_id] = snapshot
+            else:
+                self.misses += 1
+                missing.append(equipment_id)
+
+        if not missing:
+            return found
+
+        from_redis = await self._get_redis_many(missing)
+        self.redis_hits += len(from_redis)
+        for equipment_id, snapshot in from_redis.items():
+            self._set_local(equipment_id, snapshot)
+            found[equipment_id] = snapshot
+
+        to_load = [equipment_id for equipment_id in missing if equipment_id not in from_redis]
+        if to_load:
+            self.db_loads += 1
+            result = await db.execute(
+                select(*(getattr(Equipment, field) for field in CACHED_FIELDS)).where(
+                    Equipment.equipment_id.in_(to_load)
+                )
+            )
+            loaded = {row.equipment_id: dict(row._mapping) for row in result}
+            for equipment_id in to_load:
+                self._set_local(equipment_id, loaded.get(equipment_id))
+            found.update(loaded)
+            await self._set_redis_many(loaded)
+
+        return found
+
+    async def get(self, db: AsyncSession, equipment_id: str) -> Optional[dict]:
+        """Registry snapshot for one equipment ID, or None if it does not exist"""
+        return (await self.get_many(db, [equipment_id])).get(equipment_id)
+
+    async def exists(self, db: AsyncSession, equipment_id: str) -> bool:
+        return await self.get(db, equipment_id) is not None
+
+    async def invalidate(self, equipment_id: str):
+        """Drop an entry from both tiers after the registry row changes"""
+        self.invalidations += 1
+        self._entries.pop(equipment_id, None)
+        if self._redis_available():
+            try:
+                await self._redis.delete(self.redis_prefix + equipment_id)
+            except Exception as e:
+                self._redis_failed(e)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "redis_enabled": self._redis is not None,
+            "redis_hits": self.redis_hits,
+            "db_loads": self.db_loads,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,411 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+
+from models import SensorReading
+
+logger = logging.getLogger(__name__)
+
+# Sensors with rolling statistics; operating_hours only ever increases
+TRACKED_FIELDS = ("temperature", "vibration", "pressure", "power_consumption")
+STATS = ("ewma", "mean", "std", "slope", "peaks")
+FEATURE_NAMES = tuple(f"{field}_{stat}" for field in TRACKED_FIELDS for stat in STATS)
+
+# Rolling features models trained with --temporal-features take after the five sensor
+# values: smoothed temperature level and spread, and the vibration trend
+MODEL_FEATURES = ("temperature_ewma", "temperature_std", "vibration_slope")
+
+EPOCH = datetime(1970, 1, 1)
+
+# A reading is a peak when it exceeds the window mean by this many standard deviations
+PEAK_SIGMA = 2.0
+# Readings in the window before peaks are counted
+PEAK_MIN_COUNT = 8
+
+
+def to_hours(timestamp: datetime) -> float:
+    """Hours since the epoch; naive datetimes are taken as UTC"""
+    if timestamp.tzinfo is not None:
+        return timestamp.timestamp() / 3600
+    return (timestamp - EPOCH).total_seconds() / 3600
+
+
+class FeatureStore:
+    """Rolling per-equipment statistics over the last ``window`` readings, updated in O(1) per reading
+
+    Each equipment gets a slot in preallocated arrays: a ring buffer of its
+    last ``window`` readings and reading times, plus running sums from which
+    the mean, standard deviation, least-squares slope (units per hour) and
+    peak count of every tracked sensor are read without touching the ring.
+    A reading only adds itself to the sums and subtracts the one it
+    overwrites. The sums are recomputed exactly from the ring once per
+    ``window`` readings (amortized O(1)), which also rebases reading times
+    so float error cannot build up. EWMA is per reading with factor
+    ``alpha``. Readings missing any tracked sensor are not added.
+
+    Slots take about ``window * 28`` bytes each and are allocated as
+    equipment appears, doubling up to ``max_equipment``. When the store is
+    full, the least recently updated equipment loses its slot. The state
+    belongs to one process, so with several workers each sees only the
+    readings it ingested. With ``reload`` every seed() rebuilds its
+    equipment's windows from sensor_readings, which all workers share.
+    """
+
+    # Per-slot state: name -> (shape after the slot axis, dtype); shapes use F fields and W window
+    STATE = {
+        # Ring of readings; float32 values are rounded before they enter the sums too
+        "_values": (("F", "W"), np.float32),
+        "_times": (("W",), np.float64),
+        "_peak_flags": (("F", "W"), np.bool_),
+        "_origin": ((), np.float64),
+        "_count": ((), np.int64),
+        "_head": ((), np.int64),
+        "_sum": (("F",), np.float64),
+        "_sum_sq": (("F",), np.float64),
+        "_sum_xt": (("F",), np.float64),
+        "_sum_t": ((), np.float64),
+        "_sum_tt": ((), np.float64),
+        "_peaks": (("F",), np.int64),
+        "_ewma": (("F",), np.float64),
+    }
+    INITIAL_SLOTS = 1024
+
+    def __init__(
+        self,
+        window: int = 64,
+        alpha: float = 0.2,
+        max_equipment: int = 100000,
+        seed_hours: float = 168.0,
+        reload: bool = False,
+    ):
+        if window < 2:
+            raise ValueError("window must hold at least 2 readings")
+        self.window = window
+        self.alpha = alpha
+        self.max_equipment = max_equipment
+        # seed() only reads readings this recent, so the scan is bounded and partitions are pruned
+        self.seed_hours = seed_hours
+        self.reload = reload
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        # Reentrant so seed can check for missing equipment and replay it atomically
+        self._lock = threading.RLock()
+        self.capacity = 0
+        self._grow(min(self.INITIAL_SLOTS, max_equipment))
+
+        # Metrics
+        self.updates = 0
+        self.evictions = 0
+        self.seeded = 0
+        self.reloads = 0
+
+    def _grow(self, capacity: int):
+        sizes = {"F": len(TRACKED_FIELDS), "W": self.window}
+        for name, (shape, dtype) in self.STATE.items():
+            array = np.zeros((capacity,) + tuple(sizes[axis] for axis in shape), dtype=dtype)
+            if self.capacity:
+                array[: self.capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self._free = list(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.STATE)
+
+    def _slot(self, equipment_id: str) -> int:
+        """Slot of equipment_id, claiming one (and evicting the least recent if full); caller holds _lock"""
+        slot = self._slots.get(equipment_id)
+        if slot is not None:
+            self._slots.move_to_end(equipment_id)
+            return slot
+        if not self._free and self.capacity < self.max_equipment:
+            self._grow(min(2 * self.capacity, self.max_equipment))
+        if self._free:
+            slot = self._free.pop()
+        else:
+            _, slot = self._slots.popitem(last=False)
+            self.evictions += 1
+        self._count[slot] = 0
+        self._head[slot] = 0
+        self._sum[slot] = self._sum_sq[slot] = self._sum_xt[slot] = self._peaks[slot] = 0
+        self._sum_t[slot] = self._sum_tt[slot] = 0
+        self._slots[equipment_id] = slot
+        return slot
+
+    def update(
+        self, equipment_ids: Sequence[str], timestamps: Sequence[datetime], readings: Sequence[Dict]
+    ) -> List[Optional[Dict[str, float]]]:
+        """Add readings in order and return each one's features including itself
+
+        Readings of the same equipment are applied in the order given, so a
+        batch gives the same features as adding its readings one by one.
+
+        Returns:
+            per reading, feature name -> value, or None if the reading lacks a tracked sensor
+        """
+        values = (
+            np.array([[reading.get(field) for field in TRACKED_FIELDS] for reading in readings], dtype=np.float32)
+            .reshape(-1, len(TRACKED_FIELDS))
+            .astype(np.float64)
+        )
+        complete = np.flatnonzero(np.isfinite(values).all(axis=1))
+        hours = np.array([to_hours(timestamps[i]) for i in complete], dtype=float)
+        features = np.empty((len(complete), len(FEATURE_NAMES)))
+
+        with self._lock:
+            slots = np.array([self._slot(equipment_ids[i]) for i in complete], dtype=np.int64)
+            # A slot appears at most once per round so the vectorized update never races with itself
+            occurrence = np.zeros(len(slots), dtype=np.int64)
+            seen: Dict[int, int] = {}
+            for position, slot in enumerate(slots.tolist()):
+                occurrence[position] = seen.get(slot, 0)
+                seen[slot] = occurrence[position] + 1
+            for round_ in range(int(occurrence.max()) + 1 if len(slots) else 0):
+                rows = np.flatnonzero(occurrence == round_)
+                self._add(slots[rows], hours[rows], values[complete[rows]])
+                features[rows] = self._features(slots[rows])
+            self.updates += len(slots)
+
+        results: List[Optional[Dict[str, float]]] = [None] * len(readings)
+        for position, row in enumerate(features.tolist()):
+            results[complete[position]] = dict(zip(FEATURE_NAMES, row))
+        return results
+
+    def _add(self, slots: np.ndarray, hours: np.ndarray, values: np.ndarray):
+        """Add one reading to each of the (distinct) slots; caller holds _lock"""
+        head = self._head[slots]
+        full = self._count[slots] == self.window
+
+        # Drop the reading being overwritten from the sums
+        old = self._values[slots, :, head].astype(np.float64) * full[:, None]
+        old_t = self._times[slots, head] * full
+        self._sum[slots] -= old
+        self._sum_sq[slots] -= old * old
+        self._sum_xt[slots] -= old * old_t[:, None]
+        self._sum_t[slots] -= old_t
+        self._sum_tt[slots] -= old_t * old_t
+        self._peaks[slots] -= self._peak_flags[slots, :, head] & full[:, None]
+        count = self._count[slots] - full
+
+        # Peak against the window before this reading
+        first = self._count[slots] == 0
+        self._origin[slots[first]] = hours[first]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self._sum[slots] / count[:, None]
+            std = np.sqrt(np.maximum(self._sum_sq[slots] / count[:, None] - mean * mean, 0.0))
+        is_peak = (count[:, None] >= PEAK_MIN_COUNT) & (values > mean + PEAK_SIGMA * std)
+
+        t = hours - self._origin[slots]
+        self._values[slots, :, head] = values
+        self._times[slots, head] = t
+        self._peak_flags[slots, :, head] = is_peak
+        self._sum[slots] += values
+        self._sum_sq[slots] += values * values
+        self._sum_xt[slots] += values * t[:, None]
+        self._sum_t[slots] += t
+        self._sum_tt[slots] += t * t
+        self._peaks[slots] += is_peak
+        self._ewma[slots] = np.where(first[:, None], values, self.alpha * values + (1 - self.alpha) * self._ewma[slots])
+        self._count[slots] = count + 1
+        self._head[slots] = (head + 1) % self.window
+
+        wrapped = slots[self._head[slots] == 0]
+        if len(wrapped):
+            self._recompute(wrapped)
+
+    def _recompute(self, slots: np.ndarray):
+        """Exact sums from the (full) rings of slots, with times rebased to the oldest reading"""
+        rebase = self._times[slots].min(axis=1)
+        self._times[slots] -= rebase[:, None]
+        self._origin[slots] += rebase
+        values = self._values[slots].astype(np.float64)
+        times = self._times[slots]
+        self._sum[slots] = values.sum(axis=2)
+        self._sum_sq[slots] = (values * values).sum(axis=2)
+        self._sum_xt[slots] = (values * times[:, None, :]).sum(axis=2)
+        self._sum_t[slots] = times.sum(axis=1)
+        self._sum_tt[slots] = (times * times).sum(axis=1)
+        self._peaks[slots] = self._peak_flags[slots].sum(axis=2)
+
+    def _features(self, slots: np.ndarray) -> np.ndarray:
+        """(len(slots), len(FEATURE_NAMES)) features of slots that hold at least one reading"""
+        n = self._count[slots].astype(float)[:, None]
+        mean = self._sum[slots] / n
+        std = np.sqrt(np.maximum(self._sum_sq[slots] / n - mean * mean, 0.0))
+        sum_t = self._sum_t[slots][:, None]
+        denominator = n * self._sum_tt[slots][:, None] - sum_t * sum_t
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = np.where(
+                denominator > 1e-12, (n * self._sum_xt[slots] - sum_t * self._sum[slots]) / denominator, 0.0
+            )
+        stats = np.stack([self._ewma[slots], mean, std, slope, self._peaks[slots].astype(float)], axis=2)
+        # (slots, fields, stats) -> field-major, matching FEATURE_NAMES
+        return stats.reshape(len(slots), -1)
+
+    def get(self, equipment_ids: Sequence[str]) -> List[Optional[Dict[str, float]]]:
+        """Current features per equipment, or None for equipment without readings in the store"""
+        with self._lock:
+            slots = [self._slots.get(equipment_id) for equipment_id in equipment_ids]
+            known = [position for position, slot in enumerate(slots) if slot is not None]
+            features = self._features(np.array([slots[i] for i in known], dtype=np.int64)) if known else []
+        results: List[Optional[Dict[str, float]]] = [None] * len(equipment_ids)
+        for position, row in zip(known, np.asarray(features).tolist()):
+            results[position] = dict(zip(FEATURE_NAMES, row))
+        return results
+
+    async def warm(self, db, hours: float, chunk_size: int = 50000) -> int:
+        """Replay the last ``hours`` of sensor_readings in id (ingest) order
+
+        Returns:
+            number of readings replayed
+        """
+        since = datetime.utcnow() - timedelta(hours=hours)
+        columns = (SensorReading.id, SensorReading.equipment_id, SensorReading.timestamp) + tuple(
+            getattr(SensorReading, field) for field in TRACKED_FIELDS
+        )
+        last_id = 0
+        replayed = 0
+        while True:
+            result = await db.execute(
+                select(*columns)
+                .where(SensorReading.id > last_id, SensorReading.timestamp >= since)
+                .order_by(SensorReading.id)
+                .limit(chunk_size)
+            )
+            rows = result.all()
+            if not rows:
+                return replayed
+            last_id = rows[-1].id
+            self.update(
+                [row.equipment_id for row in rows],
+                [row.timestamp for row in rows],
+                [row._mapping for row in rows],
+            )
+            replayed += len(rows)
+
+    def _release(self, equipment_id: str):
+        """Free equipment_id's slot; caller holds _lock"""
+        slot = self._slots.pop(equipment_id, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    async def seed(self, db, equipment_ids: Sequence[str]) -> int:
+        """Replay the last ``window`` readings of equipment not in the store
+
+        Equipment that reported before the warm-up window, was evicted, or
+        whose readings another worker ingested gets its features from
+        sensor_readings instead of starting from an empty window. Only the
+        last ``seed_hours`` are read; equipment silent for longer starts
+        empty. With ``reload`` equipment already in the store is rebuilt
+        too, so readings other workers ingested are included. Call it
+        before the reading being scored is written, or the reading is
+        replayed twice.
+
+        Returns:
+            number of readings replayed
+        """
+        with self._lock:
+            missing = list(dict.fromkeys(e for e in equipment_ids if self.reload or e not in self._slots))
+        if not missing:
+            return 0
+        ranked = (
+            select(
+                SensorReading.id,
+                SensorReading.equipment_id,
+                SensorReading.timestamp,
+                *(getattr(SensorReading, field) for field in TRACKED_FIELDS),
+                func.row_number()
+                .over(partition_by=SensorReading.equipment_id, order_by=SensorReading.id.desc())
+                .label("row_number"),
+            )
+            .where(
+                SensorReading.equipment_id.in_(missing),
+                SensorReading.timestamp >= datetime.utcnow() - timedelta(hours=self.seed_hours),
+            )
+            .subquery()
+        )
+        result = await db.execute(
+            select(ranked).where(ranked.c.row_number <= self.window).order_by(ranked.c.id)
+        )
+        rows = result.all()
+        with self._lock:
+            if self.reload:
+                for equipment_id in missing:
+                    self._release(equipment_id)
+                self.reloads += len(missing)
+            else:
+                # Another request may have seeded or updated the same equipment meanwhile
+                rows = [row for row in rows if row.equipment_id not in self._slots]
+            if rows:
+                self.update(
+                    [row.equipment_id for row in rows],
+                    [row.timestamp for row in rows],
+                    [row._mapping for row in rows],
+                )
+        self.seeded += len(rows)
+        return len(rows)
+
+    def save(self, path: str):
+        """Write every equipment's window and sums to an .npz file atomically"""
+        with self._lock:
+            equipment_ids = list(self._slots)
+            slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(equipment_ids))
+            arrays = {name.lstrip("_"): getattr(self, name)[slots] for name in self.STATE}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        staging = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(
+            staging,
+            equipment_ids=np.array(equipment_ids, dtype=str),
+            fields=np.array(TRACKED_FIELDS),
+            window=self.window,
+            alpha=self.alpha,
+            **arrays,
+        )
+        os.replace(staging, path)
+
+    def restore(self, path: str) -> int:
+        """Replace the store's state with the one saved at path
+
+        Returns:
+            number of equipment restored
+
+        Raises:
+            ValueError: if the file was saved with other fields, window or alpha
+        """
+        with np.load(path) as saved:
+            settings = (tuple(saved["fields"].tolist()), int(saved["window"]), float(saved["alpha"]))
+            if settings != (TRACKED_FIELDS, self.window, self.alpha):
+                raise ValueError(f"Feature store state in {path} was saved with (fields, window, alpha) {settings}")
+            # Saved least recent first, so the most recent max_equipment are kept
+            saved_ids = saved["equipment_ids"].tolist()
+            equipment_ids = saved_ids[-self.max_equipment:]
+            skip = len(saved_ids) - len(equipment_ids)
+            arrays = {name: saved[name.lstrip("_")][skip:] for name in self.STATE}
+        with self._lock:
+            self._slots = OrderedDict()
+            self.capacity = 0
+            self._grow(min(max(self.INITIAL_SLOTS, len(equipment_ids)), self.max_equipment))
+            self._free = self._free[: self.capacity - len(equipment_ids)]
+            for name, array in arrays.items():
+                getattr(self, name)[: len(equipment_ids)] = array
+            self._slots.update(zip(equipment_ids, range(len(equipment_ids))))
+        return len(equipment_ids)
+
+    def get_stats(self) -> Dict:
+        return {
+            "equipment": len(self._slots),
+            "capacity": self.capacity,
+            "max_equipment": self.max_equipment,
+            "window": self.window,
+            "updates": self.updates,
+            "evictions": self.evictions,
+            "seeded": self.seeded,
+            "reloads": self.reloads,
+            "memory_mb": self.nbytes / 2**20,
+        }
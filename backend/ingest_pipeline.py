@@ -0,0 +1,483 @@
+import asyncio
+import codecs
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+
+from models import Equipment, SensorReading, Prediction, EquipmentStatus
+from latest_state import LatestStateStore, prediction_state, reading_state
+from schemas import SensorReadingSchema
+from timeseries_store import ColumnStore
+from feature_store import FeatureStore
+from rollups import RollupJob
+from update_stream import sensor_update
+
+logger = logging.getLogger(__name__)
+
+# Largest single record the streaming parsers will buffer while waiting for more bytes
+MAX_RECORD_BYTES = 1024 * 1024
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+    """Parse newline-delimited JSON incrementally
+
+    Yields:
+        (record, error) per non-empty line; error is None when the line parsed
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+        if len(pending) > MAX_RECORD_BYTES:
+            yield None, "Record exceeds maximum size"
+            return
+    if pending.strip():
+        yield _parse_line(pending)
+
+
+def _parse_line(line: bytes) -> Tuple[Any, Optional[str]]:
+    try:
+        return json.loads(line), None
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return None, f"Malformed JSON: {e}"
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+    """Parse the elements of a top-level JSON array incrementally
+
+    Only one element is buffered at a time. A syntax error ends the stream
+    with a final (None, error) item since the rest cannot be resynchronized.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    state = "start"  # start -> value_or_end -> separator -> value -> ... -> done
+    finished = False
+    chunk_iter = chunks.__aiter__()
+
+    while not finished:
+        try:
+            buffer += text_decoder.decode(await chunk_iter.__anext__())
+        except StopAsyncIteration:
+            buffer += text_decoder.decode(b"", final=True)
+            finished = True
+        except UnicodeDecodeError as e:
+            yield None, f"Malformed JSON: {e}"
+            return
+
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos >= len(buffer):
+                break
+
+            char = buffer[pos]
+            if state == "start":
+                if char != "[":
+                    yield None, "Malformed JSON: expected a JSON array"
+                    return
+                state, pos = "value_or_end", pos + 1
+            elif state == "separator":
+                if char == ",":
+                    state, pos = "value", pos + 1
+                elif char == "]":
+                    state, pos = "done", pos + 1
+                else:
+                    yield None, f"Malformed JSON: expected ',' or ']' but found {char!r}"
+                    return
+            elif state == "done":
+                yield None, "Malformed JSON: unexpected data after array"
+                return
+            elif state == "value_or_end" and char == "]":
+                state, pos = "done", pos + 1
+            else:
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as e:
+                    if finished:
+                        yield None, f"Malformed JSON: {e.msg}"
+                        return
+                    break  # incomplete element, wait for more bytes
+                if not finished and not isinstance(record, (dict, list)):
+                    # A scalar is only complete once its delimiter has arrived
+                    rest = buffer[end:].lstrip()
+                    if not rest or rest[0] not in ",]":
+                        break
+                yield record, None
+                state, pos = "separator", end
+
+        buffer = buffer[pos:]
+        if len(buffer) > MAX_RECORD_BYTES:
+            yield None, "Record exceeds maximum size"
+            return
+
+    if state != "done":
+        yield None, "Malformed JSON: unterminated array"
+
+
+class IngestPipeline:
+    """Bounded in-process queue that ingests sensor readings in micro-batches
+
+    Readings are validated and enqueued by the HTTP handler. A single worker
+    drains the queue in batches (up to max_batch_size readings or
+    max_batch_wait seconds), scores each batch with one call per model
+    (the failure model active when the batch starts),
+    writes readings and predictions in one transaction and then fans out
+    the WebSocket broadcasts. Stopping refuses new readings and waits up to
+    drain_timeout seconds for the ones already accepted to be written.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        model_manager,
+        anomaly_detector,
+        health_calculator,
+        broadcast: Optional[Callable[[dict], Awaitable[None]]] = None,
+        latest_state: Optional[LatestStateStore] = None,
+        timeseries_store: Optional[ColumnStore] = None,
+        feature_store: Optional[FeatureStore] = None,
+        rollups: Optional[RollupJob] = None,
+        max_queue_size: int = 10000,
+        max_batch_size: int = 500,
+        max_batch_wait: float = 0.05,
+        drain_timeout: float = 30.0,
+    ):
+        self.session_factory = session_factory
+        self.model_manager = model_manager
+        self.anomaly_detector = anomaly_detector
+        self.health_calculator = health_calculator
+        self.broadcast = broadcast
+        self.latest_state = latest_state
+        self.timeseries_store = timeseries_store
+        self.feature_store = feature_store
+        self.rollups = rollups
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self.drain_timeout = drain_timeout
+        self.accepting = True
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._worker: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.enqueued_count = 0
+        self.rejected_count = 0
+        self.processed_count = 0
+        self.failed_count = 0
+        self.batch_count = 0
+        self.last_batch_size = 0
+        self.max_batch_size_seen = 0
+        self.last_batch_latency = 0.0
+
+    def submit(self, reading: SensorReadingSchema) -> bool:
+        """Enqueue a validated reading; returns False when the queue is full or the pipeline is stopping"""
+        if not self.accepting:
+            self.rejected_count += 1
+            return False
+        try:
+            self.queue.put_nowait(reading)
+        except asyncio.QueueFull:
+            self.rejected_count += 1
+            return False
+        self.enqueued_count += 1
+        return True
+
+    async def start(self):
+        """Start the background worker"""
+        if self._worker is None or self._worker.done():
+            self.accepting = True
+            self._worker = asyncio.create_task(self._run())
+            logger.info("Ingest pipeline started")
+
+    async def stop(self):
+        """Stop accepting readings and stop the worker once the queued ones are written"""
+        self.accepting = False
+        if self._worker is None:
+            return
+        try:
+            # The worker marks readings done only after their batch is written
+            await asyncio.wait_for(self.queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Ingest pipeline did not drain within {self.drain_timeout:.0f}s, "
+                f"{self.queue.qsize()} queued readings not written"
+            )
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        logger.info("Ingest pipeline stopped")
+
+    async def _next_batch(self) -> List[SensorReadingSchema]:
+        """Wait for one reading, then collect more until the size or time window closes"""
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_batch_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.process_batch(batch)
+            except Exception as e:
+                logger.error(f"Ingest batch error: {str(e)}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _model_inputs(self, sensor_dicts: List[Dict[str, float]]) -> List[Dict[str, float]]:
+        """Readings with their equipment's rolling features, updating the feature store in batch order"""
+        if self.feature_store is None:
+            return sensor_dicts
+        try:
+            features = self.feature_store.update(
+                [d["equipment_id"] for d in sensor_dicts], [d["timestamp"] for d in sensor_dicts], sensor_dicts
+            )
+        except Exception as e:
+            logger.error(f"Feature store update error: {str(e)}")
+            return sensor_dicts
+        # Readings missing a sensor are not added; they are scored with their equipment's features so far
+        unadded = [i for i, f in enumerate(features) if f is None]
+        if unadded:
+            for i, f in zip(unadded, self.feature_store.get([sensor_dicts[i]["equipment_id"] for i in unadded])):
+                features[i] = f
+        return [{**d, **f} if f else d for d, f in zip(sensor_dicts, features)]
+
+    async def _seed_features(self, readings: List[SensorReadingSchema]):
+        """Replay recent readings of equipment the feature store does not hold, before the batch is stored"""
+        if self.feature_store is None:
+            return
+        try:
+            async with self.session_factory() as db:
+                await self.feature_store.seed(db, [reading.equipment_id for reading in readings])
+        except Exception as e:
+            logger.error(f"Feature store seed error: {str(e)}")
+
+    def _score(self, predictor, sensor_dicts: List[Dict[str, float]]) -> List[Optional[dict]]:
+        """Score a batch; falls back to per-row scoring to isolate bad readings
+
+        The feature store and anomaly baselines are updated once per reading.
+        Only the stateless health and failure scoring is retried per row.
+        """
+        model_inputs = self._model_inputs(sensor_dicts)
+        try:
+            anomalies = self.anomaly_detector.batch_detect_anomaly(sensor_dicts)
+        except Exception:
+            # Input is validated before any baseline is touched, so rows can still be tried one by one
+            anomalies = [self._detect_one(sensor_dict) for sensor_dict in sensor_dicts]
+        try:
+            health_scores = self.health_calculator.batch_calculate_health_score(sensor_dicts)
+        except Exception:
+            health_scores = [self._health_one(sensor_dict) for sensor_dict in sensor_dicts]
+        try:
+            started = time.perf_counter()
+            predictions = predictor.batch_predict(model_inputs)
+            self.model_manager.shadow.offer(predictor, model_inputs, predictions, time.perf_counter() - started)
+        except Exception:
+            predictions = [self._predict_one(predictor, model_input) for model_input in model_inputs]
+
+        return [
+            {
+                "health_score": health_score,
+                "status": self.health_calculator.determine_status(health_score),
+                "anomaly": anomaly,
+                "prediction": prediction,
+            }
+            if health_score is not None and anomaly is not None and prediction is not None
+            else None
+            for health_score, anomaly, prediction in zip(health_scores, anomalies, predictions)
+        ]
+
+    def _detect_one(self, sensor_dict: Dict[str, float]) -> Optional[Tuple[float, str]]:
+        try:
+            return self.anomaly_detector.detect_anomaly(sensor_dict)
+        except Exception as e:
+            logger.error(f"Error scoring anomaly for {sensor_dict.get('equipment_id')}: {str(e)}")
+            return None
+
+    def _health_one(self, sensor_dict: Dict[str, float]) -> Optional[float]:
+        try:
+            return self.health_calculator.calculate_health_score(sensor_dict)
+        except Exception as e:
+            logger.error(f"Error scoring health for {sensor_dict.get('equipment_id')}: {str(e)}")
+            return None
+
+    def _predict_one(self, predictor, model_input: Dict[str, float]) -> Optional[tuple]:
+        try:
+            return predictor.predict(model_input)
+        except Exception as e:
+            logger.error(f"Error predicting failure for {model_input.get('equipment_id')}: {str(e)}")
+            return None
+
+    async def process_batch(self, readings: List[SensorReadingSchema]) -> List[bool]:
+        """Score and persist a batch of readings in one transaction
+
+        Returns:
+            per-reading success flags, in input order
+        """
+        if not readings:
+            return []
+
+        start = time.perf_counter()
+        sensor_dicts = [reading.dict() for reading in readings]
+        await self._seed_features(readings)
+        loop = asyncio.get_running_loop()
+        predictor = self.model_manager.active
+        scores = await loop.run_in_executor(None, self._score, predictor, sensor_dicts)
+
+        now = datetime.utcnow()
+        reading_rows = []
+        prediction_rows = []
+        equipment_updates: Dict[str, dict] = {}
+        reading_states = []
+        updates = []
+
+        for reading, sensor_dict, score in zip(readings, sensor_dicts, scores):
+            if score is None:
+                continue
+            failure_prob, rul_days, confidence, feature_importance = score["prediction"]
+            sensor_dict["anomaly_score"] = score["anomaly"][0]
+            reading_rows.append(SensorReading(**sensor_dict))
+            prediction_rows.append(
+                Prediction(
+                    equipment_id=reading.equipment_id,
+                    failure_probability=float(failure_prob),
+                    rul_days=rul_days,
+                    expected_failure_date=now + timedelta(days=rul_days),
+                    confidence_score=confidence,
+                    feature_importance=feature_importance,
+                    model_version=predictor.model_version,
+                    prediction_timestamp=now,
+                    created_at=now,
+                )
+            )
+            reading_states.append(
+                reading_state(
+                    reading.equipment_id,
+                    sensor_dict,
+                    score["health_score"],
+                    EquipmentStatus(score["status"]),
+                    reading.timestamp,
+                )
+            )
+            # Last reading in the batch wins for the equipment row
+            equipment_updates[reading.equipment_id] = {
+                "b_equipment_id": reading.equipment_id,
+                "health_score": score["health_score"],
+                "status": EquipmentStatus(score["status"]),
+                "last_reading_time": now,
+            }
+            updates.append(
+                sensor_update(
+                    reading.equipment_id,
+                    sensor_dict,
+                    score["health_score"],
+                    score["status"],
+                    failure_prob,
+                    rul_days,
+                    now,
+                )
+            )
+
+        succeeded = [score is not None for score in scores]
+        committed_states = []
+        if reading_rows:
+            try:
+                async with self.session_factory() as db:
+                    db.add_all(reading_rows)
+                    db.add_all(prediction_rows)
+                    await db.execute(
+                        update(Equipment.__table__).where(
+                            Equipment.__table__.c.equipment_id == bindparam("b_equipment_id")
+                        ),
+                        list(equipment_updates.values()),
+                    )
+                    if self.rollups is not None:
+                        await self.rollups.record_late(
+                            db, [(row.equipment_id, row.timestamp) for row in reading_rows]
+                        )
+                    if self.latest_state is not None:
+                        await db.flush()
+                        committed_states = await self.latest_state.stage(
+                            db,
+                            (
+                                {**state, **prediction_state(prediction)}
+                                for state, prediction in zip(reading_states, prediction_rows)
+                            ),
+                        )
+                    await db.commit()
+                if self.latest_state is not None:
+                    self.latest_state.apply(committed_states)
+            except Exception as e:
+                logger.error(f"Error persisting ingest batch of {len(reading_rows)}: {str(e)}")
+                succeeded = [False] * len(readings)
+                updates = []
+            else:
+                if self.timeseries_store is not None:
+                    await self._append_history(
+                        [sensor_dict for sensor_dict, score in zip(sensor_dicts, scores) if score is not None]
+                    )
+
+        n_ok = sum(succeeded)
+        self.processed_count += n_ok
+        self.failed_count += len(readings) - n_ok
+        self.batch_count += 1
+        self.last_batch_size = len(readings)
+        self.max_batch_size_seen = max(self.max_batch_size_seen, len(readings))
+        self.last_batch_latency = time.perf_counter() - start
+
+        if self.broadcast:
+            for message in updates:
+                await self.broadcast(message)
+
+        return succeeded
+
+    async def _append_history(self, sensor_dicts: List[dict]):
+        # The column store is derived from sensor_readings, so a failed append never fails ingest
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.timeseries_store.append, sensor_dicts)
+        except Exception as e:
+            logger.error(f"Error appending {len(sensor_dicts)} readings to the column store: {str(e)}")
+
+    def get_stats(self) -> dict:
+        """Queue depth and batch metrics for monitoring"""
+        return {
+            "running": self._worker is not None and not self._worker.done(),
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "enqueued": self.enqueued_count,
+            "rejected": self.rejected_count,
+            "processed": self.processed_count,
+            "failed": self.failed_count,
+            "batches": self.batch_count,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size_seen,
+            "avg_batch_size": (self.processed_count + self.failed_count) / self.batch_count
+            if self.batch_count
+            else 0.0,
+            "last_batch_latency_ms": self.last_batch_latency * 1000,
+        }
@@ -0,0 +1,215 @@
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import EquipmentLatestState
+
+logger = logging.getLogger(__name__)
+
+STATE_COLUMNS = tuple(column.name for column in EquipmentLatestState.__table__.columns)
+READING_FIELDS = (
+    "temperature",
+    "vibration",
+    "pressure",
+    "power_consumption",
+    "operating_hours",
+    "anomaly_score",
+)
+# A row carrying the first of these set only replaces state at least as new
+VERSION_COLUMNS = ("reading_timestamp", "prediction_timestamp")
+
+
+def reading_state(
+    equipment_id: str, sensor_data: dict, health_score: float, status, timestamp: datetime
+) -> dict:
+    """State columns describing a freshly ingested reading"""
+    state = {field: sensor_data.get(field) for field in READING_FIELDS}
+    state.update(
+        {
+            "equipment_id": equipment_id,
+            "health_score": health_score,
+            "status": status,
+            "reading_timestamp": timestamp,
+        }
+    )
+    return state
+
+
+def prediction_state(prediction) -> dict:
+    """State columns describing a flushed Prediction row"""
+    return {
+        "equipment_id": prediction.equipment_id,
+        "prediction_id": prediction.id,
+        "failure_probability": prediction.failure_probability,
+        "rul_days": prediction.rul_days,
+        "expected_failure_date": prediction.expected_failure_date,
+        "confidence_score": prediction.confidence_score,
+        "feature_importance": prediction.feature_importance,
+        "model_version": prediction.model_version,
+        "prediction_timestamp": prediction.prediction_timestamp,
+    }
+
+
+def _version_column(state: dict) -> Optional[str]:
+    return next((column for column in VERSION_COLUMNS if state.get(column) is not None), None)
+
+
+def _utc(timestamp: datetime) -> datetime:
+    """Naive UTC, as stored"""
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _is_older(state: dict, current: dict, version_column: Optional[str]) -> bool:
+    """Whether state is older than current on version_column (missing versions are never older)"""
+    if version_column is None or current.get(version_column) is None:
+        return False
+    return _utc(state[version_column]) < _utc(current[version_column])
+
+
+def _upsert_statement(dialect_name: str, update_columns: List[str], version_column: Optional[str] = None):
+    """INSERT ... ON CONFLICT/DUPLICATE KEY UPDATE for the state table
+
+    With version_column, an existing row is only updated when the new
+    version_column value is at least the stored one (or none is stored).
+    """
+    table = EquipmentLatestState.__table__
+    if dialect_name in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert
+
+        stmt = insert(table)
+        if version_column is None:
+            return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+        newer = or_(table.c[version_column].is_(None), stmt.inserted[version_column] >= table.c[version_column])
+        # MySQL applies assignments left to right, so the version column is compared before it changes
+        ordered = [column for column in update_columns if column != version_column] + [version_column]
+        return stmt.on_duplicate_key_update(
+            [(column, case((newer, stmt.inserted[column]), else_=table.c[column])) for column in ordered]
+        )
+
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(table)
+    where = None
+    if version_column is not None:
+        where = or_(table.c[version_column].is_(None), stmt.excluded[version_column] >= table.c[version_column])
+    return stmt.on_conflict_do_update(
+        index_elements=["equipment_id"],
+        set_={column: stmt.excluded[column] for column in update_columns},
+        where=where,
+    )
+
+
+class LatestStateStore:
+    """equipment_latest_state projection with a process-local mirror
+
+    Writers stage upserts inside their own transaction and call apply()
+    once it has committed. A row with a reading_timestamp (else a
+    prediction_timestamp) never replaces newer state, so readings that
+    arrive out of order cannot roll an equipment back. Readers hit the mirror first; entries expire
+    after mirror_ttl seconds so updates committed by other worker
+    processes become visible.
+    """
+
+    def __init__(self, mirror_ttl: float = 2.0):
+        self.mirror_ttl = mirror_ttl
+        self._mirror: Dict[str, tuple] = {}
+
+        # Metrics
+        self.mirror_hits = 0
+        self.table_reads = 0
+        self.upserts = 0
+
+    async def stage(self, db: AsyncSession, states: Iterable[dict]) -> List[dict]:
+        """Upsert state rows in the caller's transaction (partial rows update only their columns)
+
+        Returns:
+            the merged rows to pass to apply() after commit
+        """
+        merged: Dict[str, dict] = {}
+        for state in states:
+            current = merged.setdefault(state["equipment_id"], {})
+            if not _is_older(state, current, _version_column(state)):
+                current.update(state)
+        if not merged:
+            return []
+
+        now = datetime.utcnow()
+        by_columns: Dict[tuple, List[dict]] = {}
+        for state in merged.values():
+            state["updated_at"] = now
+            by_columns.setdefault((tuple(sorted(state)), _version_column(state)), []).append(state)
+
+        dialect_name = db.get_bind().dialect.name
+        for (columns, version_column), rows in by_columns.items():
+            update_columns = [column for column in columns if column != "equipment_id"]
+            await db.execute(_upsert_statement(dialect_name, update_columns, version_column), rows)
+        self.upserts += len(merged)
+        return list(merged.values())
+
+    def apply(self, states: Iterable[dict]):
+        """Reflect committed state rows in the mirror, skipping rows older than what it holds"""
+        expires_at = time.monotonic() + self.mirror_ttl
+        for state in states:
+            equipment_id = state["equipment_id"]
+            entry = self._mirror.get(equipment_id)
+            if entry is not None:
+                if _is_older(state, entry[1], _version_column(state)):
+                    continue
+                entry[1].update(state)
+                self._mirror[equipment_id] = (expires_at, entry[1])
+            elif set(STATE_COLUMNS) <= set(state):
+                self._mirror[equipment_id] = (expires_at, dict(state))
+            # Partial rows for unmirrored equipment are loaded from the table on next read
+
+    def _get_mirror(self, equipment_id: str) -> Optional[dict]:
+        entry = self._mirror.get(equipment_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._mirror[equipment_id]
+            return None
+        return entry[1]
+
+    async def get(self, db: AsyncSession, equipment_id: str) -> Optional[dict]:
+        """Current state for one equipment, or None if nothing has been recorded"""
+        state = self._get_mirror(equipment_id)
+        if state is not None:
+            self.mirror_hits += 1
+            return state
+
+        self.table_reads += 1
+        row = await db.get(EquipmentLatestState, equipment_id, populate_existing=True)
+        if row is None:
+            return None
+        state = {column: getattr(row, column) for column in STATE_COLUMNS}
+        self._mirror[equipment_id] = (time.monotonic() + self.mirror_ttl, state)
+        return state
+
+    async def get_all(self, db: AsyncSession) -> List[dict]:
+        """Current state for the whole fleet (one row per equipment)"""
+        self.table_reads += 1
+        result = await db.execute(select(EquipmentLatestState))
+        expires_at = time.monotonic() + self.mirror_ttl
+        states = []
+        for row in result.scalars():
+            state = {column: getattr(row, column) for column in STATE_COLUMNS}
+            self._mirror[row.equipment_id] = (expires_at, state)
+            states.append(state)
+        return states
+
+    def get_stats(self) -> dict:
+        return {
+            "mirror_size": len(self._mirror),
+            "mirror_hits": self.mirror_hits,
+            "table_reads": self.table_reads,
+            "upserts": self.upserts,
+        }
@@ -1,11 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from datetime import datetime, timedelta, timezone
+import asyncio
+import glob
 import logging
 import json
-from typing import List, Optional
+import os
+import time
+from functools import partial
+from typing import List, Optional, Tuple
 
 from models import (
     Equipment,
@@ -14,12 +21,18 @@ from models import (
     MaintenanceEvent,
     AuditLog,
     EquipmentStatus,
+    ModelRegistry,
+    ShadowComparison,
 )
 from schemas import (
     EquipmentSchema,
     EquipmentDetailSchema,
     HealthStatusSchema,
     SensorReadingSchema,
+    BulkIngestRowError,
+    BulkIngestResponse,
+    SensorHistoryResponse,
+    EquipmentReadingsResponse,
     PredictionSchema,
     PredictionResponseSchema,
     BatchPredictionRequest,
@@ -29,17 +42,27 @@ from schemas import (
     CreateCaseRequest,
     CreateCaseResponse,
     WebhookPayload,
+    ModelRegistrySchema,
+    ShadowComparisonSchema,
 )
-from ml_service import PredictiveModel, AnomalyDetector, HealthScoreCalculator
-from database import get_db, engine, Base
+from ml_service import AnomalyDetector, FlatForest, HealthScoreCalculator
+from model_manager import ModelManager
+from ingest_pipeline import IngestPipeline, iter_json_array, iter_ndjson
+from equipment_cache import EquipmentCache
+from latest_state import LatestStateStore, prediction_state, reading_state
+from rollups import RESOLUTIONS, SENSOR_FIELDS, RollupJob, fetch_history
+from timeseries_store import ColumnStore
+from feature_store import FeatureStore
+from connection_manager import ConnectionManager
+from backplane import create_backplane
+from update_stream import UpdateStream, sensor_update
+from database import get_db, get_pool_stats, init_db, AsyncSessionLocal
+from config import Config
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 # Initialize FastAPI app
 app = FastAPI(
     title="FleetVision Predictive Maintenance API",
@@ -57,31 +80,232 @@ app.add_middleware(
 )
 
 # Initialize ML services
-predictor = PredictiveModel(model_version="v1.0")
-anomaly_detector = AnomalyDetector(threshold=2.0)
+# Failure model: the version marked active in ModelRegistry, hot-swapped when it changes
+model_manager = ModelManager(
+    session_factory=AsyncSessionLocal,
+    default_version=Config.MODEL_VERSION,
+    default_model_path=Config.MODEL_PATH,
+    engine=Config.INFERENCE_ENGINE,
+    explanation_cache_size=Config.EXPLANATION_CACHE_SIZE,
+    flat_max_batch=Config.FLAT_MAX_BATCH_ROWS,
+    poll_interval=Config.MODEL_REGISTRY_POLL_SECONDS,
+    shadow_sample_rate=Config.SHADOW_SAMPLE_RATE,
+    shadow_flush_interval=Config.SHADOW_FLUSH_SECONDS,
+    shadow_max_pending=Config.SHADOW_MAX_PENDING,
+)
+anomaly_detector = AnomalyDetector(
+    threshold=Config.ANOMALY_THRESHOLD,
+    memory=Config.ANOMALY_MEMORY,
+    max_equipment=Config.ANOMALY_MAX_EQUIPMENT,
+)
 health_calculator = HealthScoreCalculator()
 
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+# Equipment registry cache for existence checks on hot paths
+equipment_cache = EquipmentCache(
+    ttl=Config.EQUIPMENT_CACHE_TTL,
+    max_size=Config.EQUIPMENT_CACHE_MAX_SIZE,
+    negative_ttl=Config.EQUIPMENT_CACHE_NEGATIVE_TTL,
+    redis_url=Config.REDIS_URL if Config.EQUIPMENT_CACHE_REDIS else None,
+)
+
+# Current state per equipment, maintained on ingest
+latest_state = LatestStateStore(mirror_ttl=Config.LATEST_STATE_MIRROR_TTL)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Columnar sensor history for /equipment/{id}/readings
+timeseries_store = (
+    ColumnStore(Config.TIMESERIES_STORE_PATH, Config.TIMESERIES_SUMMARY_SECONDS)
+    if Config.TIMESERIES_STORE_ENABLED
+    else None
+)
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+# Rolling per-equipment features for models trained on them, updated on ingest
+feature_store = FeatureStore(
+    window=Config.FEATURE_WINDOW,
+    alpha=Config.FEATURE_EWMA_ALPHA,
+    max_equipment=Config.FEATURE_STORE_MAX_EQUIPMENT,
+    seed_hours=Config.FEATURE_STORE_SEED_HOURS,
+    reload=Config.FEATURE_STORE_RELOAD,
+)
 
-    async def broadcast(self, data: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(data)
-            except Exception as e:
-                logger.error(f"Error broadcasting to connection: {str(e)}")
+# Topic-filtered WebSocket fan-out
+manager = ConnectionManager(
+    queue_size=Config.WS_SEND_QUEUE_SIZE,
+    policy=Config.WS_SLOW_CLIENT_POLICY,
+    send_timeout=Config.WS_SEND_TIMEOUT_SECONDS,
+)
+
+# Per-tick delta frames of the latest state per equipment, for dashboards
+update_stream = UpdateStream(
+    tick=Config.STREAM_TICK_SECONDS,
+    decimals=Config.STREAM_DECIMALS,
+    send_timeout=Config.WS_SEND_TIMEOUT_SECONDS,
+)
+
+# Real-time updates from every worker reach the clients of every worker
+backplane = create_backplane(
+    Config.BROADCAST_BACKPLANE,
+    [manager, update_stream],
+    redis_url=Config.REDIS_URL,
+    channel=Config.BROADCAST_CHANNEL,
+    socket_path=Config.BROADCAST_SOCKET_PATH,
+    batch_interval=Config.BROADCAST_BATCH_MS / 1000,
+    max_pending=Config.BROADCAST_MAX_PENDING,
+)
+
+# 1-minute/1-hour sensor rollups and raw retention
+rollup_job = RollupJob(
+    session_factory=AsyncSessionLocal,
+    interval=Config.ROLLUP_INTERVAL_SECONDS,
+    lateness=Config.ROLLUP_LATENESS_SECONDS,
+    raw_retention_days=Config.RAW_RETENTION_DAYS,
+    minute_retention_days=Config.ROLLUP_1M_RETENTION_DAYS,
+    partition_days_ahead=Config.PARTITION_DAYS_AHEAD,
+    timeseries_store=timeseries_store,
+)
 
+# Micro-batched sensor ingest (used when INGEST_MODE=queued)
+ingest_pipeline = IngestPipeline(
+    session_factory=AsyncSessionLocal,
+    model_manager=model_manager,
+    anomaly_detector=anomaly_detector,
+    health_calculator=health_calculator,
+    broadcast=backplane.publish,
+    latest_state=latest_state,
+    timeseries_store=timeseries_store,
+    feature_store=feature_store,
+    rollups=rollup_job,
+    max_queue_size=Config.INGEST_QUEUE_SIZE,
+    max_batch_size=Config.INGEST_BATCH_SIZE,
+    max_batch_wait=Config.INGEST_BATCH_WAIT_MS / 1000,
+    drain_timeout=Config.INGEST_DRAIN_TIMEOUT_SECONDS,
+)
+
+
+@app.on_event("startup")
+async def apply_migrations():
+    if Config.DB_AUTO_MIGRATE:
+        init_db()
 
-manager = ConnectionManager()
+
+@app.on_event("startup")
+async def warm_feature_store():
+    if Config.FEATURE_STORE_WARM_HOURS <= 0:
+        return
+    started = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            replayed = await feature_store.warm(db, Config.FEATURE_STORE_WARM_HOURS)
+        logger.info(f"Feature store warmed from {replayed} readings in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        logger.error(f"Feature store warm-up failed: {str(e)}")
+
+
+@app.on_event("startup")
+async def seed_update_stream():
+    try:
+        async with AsyncSessionLocal() as db:
+            states = await latest_state.get_all(db)
+        update_stream.seed(states)
+        logger.info(f"Update stream seeded with {len(states)} equipment states")
+    except Exception as e:
+        logger.error(f"Update stream seeding failed: {str(e)}")
+
+
+def worker_anomaly_state_path() -> str:
+    """This worker's baseline file: ANOMALY_STATE_PATH with the process id before the extension"""
+    stem, extension = os.path.splitext(Config.ANOMALY_STATE_PATH)
+    return f"{stem}-{os.getpid()}{extension}"
+
+
+def anomaly_state_paths() -> List[str]:
+    """Baseline files of every worker (and the single file of older versions), oldest first"""
+    stem, extension = os.path.splitext(Config.ANOMALY_STATE_PATH)
+    paths = [
+        path
+        for path in glob.glob(f"{glob.escape(stem)}-*{extension}")
+        if path[len(stem) + 1 : len(path) - len(extension)].isdigit()
+    ]
+    if os.path.exists(Config.ANOMALY_STATE_PATH):
+        paths.append(Config.ANOMALY_STATE_PATH)
+    return sorted(paths, key=os.path.getmtime)
+
+
+def _save_anomaly_baselines():
+    # Shared: workers save their own files side by side while no restore is merging them
+    with FlatForest.lock(Config.ANOMALY_STATE_PATH, exclusive=False):
+        anomaly_detector.save(worker_anomaly_state_path())
+
+
+def _restore_anomaly_baselines() -> int:
+    """Merge every worker's baselines into this worker's file and remove the others"""
+    with FlatForest.lock(Config.ANOMALY_STATE_PATH):
+        paths = anomaly_state_paths()
+        if not paths:
+            return 0
+        restored = anomaly_detector.restore(*paths)
+        own_path = worker_anomaly_state_path()
+        anomaly_detector.save(own_path)
+        # Live workers write theirs again at their next save; the merge takes the larger baseline
+        for path in paths:
+            if path != own_path:
+                os.remove(path)
+        return restored
+
+
+async def save_anomaly_baselines():
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, _save_anomaly_baselines)
+    except Exception as e:
+        logger.error(f"Could not save anomaly baselines: {str(e)}")
+
+
+async def checkpoint_anomaly_baselines():
+    while True:
+        await asyncio.sleep(Config.ANOMALY_SAVE_SECONDS)
+        await save_anomaly_baselines()
+
+
+anomaly_checkpoint: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def restore_anomaly_baselines():
+    global anomaly_checkpoint
+    if not Config.ANOMALY_STATE_PATH:
+        return
+    try:
+        restored = await asyncio.get_running_loop().run_in_executor(None, _restore_anomaly_baselines)
+        logger.info(f"Restored anomaly baselines of {restored} equipment")
+    except Exception as e:
+        logger.error(f"Could not restore anomaly baselines: {str(e)}")
+    if Config.ANOMALY_SAVE_SECONDS > 0:
+        anomaly_checkpoint = asyncio.create_task(checkpoint_anomaly_baselines())
+
+
+@app.on_event("startup")
+async def start_background_workers():
+    await model_manager.start()
+    await backplane.start()
+    await update_stream.start()
+    if Config.INGEST_MODE == "queued":
+        await ingest_pipeline.start()
+    if Config.ROLLUP_ENABLED:
+        await rollup_job.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    # Accepted readings are scored and broadcast before the model and backplane stop
+    await ingest_pipeline.stop()
+    await model_manager.stop()
+    await backplane.stop()
+    await update_stream.stop()
+    await rollup_job.stop()
+    if anomaly_checkpoint is not None:
+        anomaly_checkpoint.cancel()
+    if Config.ANOMALY_STATE_PATH:
+        await save_anomaly_baselines()
 
 
 # Health check endpoint
@@ -90,18 +314,38 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Runtime metrics for monitoring"""
+    return {
+        "db_pool": get_pool_stats(),
+        "ingest": ingest_pipeline.get_stats(),
+        "equipment_cache": equipment_cache.get_stats(),
+        "latest_state": latest_state.get_stats(),
+        "rollups": rollup_job.get_stats(),
+        "timeseries_store": timeseries_store.get_stats() if timeseries_store is not None else None,
+        "models": model_manager.get_stats(),
+        "feature_store": feature_store.get_stats(),
+        "anomaly_detector": anomaly_detector.get_stats(),
+        "websockets": manager.get_stats(),
+        "backplane": backplane.get_stats(),
+        "update_stream": update_stream.get_stats(),
+        "timestamp": datetime.utcnow(),
+    }
+
+
 # Equipment endpoints
 @app.get("/equipment", response_model=List[EquipmentDetailSchema])
-async def list_equipment(db: Session = Depends(get_db)):
+async def list_equipment(db: AsyncSession = Depends(get_db)):
     """List all equipment"""
-    equipment = db.query(Equipment).all()
-    return equipment
+    result = await db.execute(select(Equipment))
+    return result.scalars().all()
 
 
 @app.get("/equipment/{equipment_id}", response_model=EquipmentDetailSchema)
-async def get_equipment(equipment_id: str, db: Session = Depends(get_db)):
+async def get_equipment(equipment_id: str, db: AsyncSession = Depends(get_db)):
     """Get equipment by ID"""
-    equipment = db.query(Equipment).filter(Equipment.equipment_id == equipment_id).first()
+    equipment = await db.scalar(select(Equipment).where(Equipment.equipment_id == equipment_id))
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     return equipment
@@ -109,40 +353,90 @@ async def get_equipment(equipment_id: str, db: Session = Depends(get_db)):
 
 @app.post("/equipment", response_model=EquipmentDetailSchema)
 async def create_equipment(
-    equipment: EquipmentSchema, db: Session = Depends(get_db)
+    equipment: EquipmentSchema, db: AsyncSession = Depends(get_db)
 ):
     """Create new equipment"""
-    existing = db.query(Equipment).filter(Equipment.equipment_id == equipment.equipment_id).first()
+    existing = await db.scalar(
+        select(Equipment).where(Equipment.equipment_id == equipment.equipment_id)
+    )
     if existing:
         raise HTTPException(status_code=400, detail="Equipment already exists")
 
     db_equipment = Equipment(**equipment.dict())
     db.add(db_equipment)
-    db.commit()
-    db.refresh(db_equipment)
+    await db.commit()
+    await db.refresh(db_equipment)
+    await equipment_cache.invalidate(db_equipment.equipment_id)
     return db_equipment
 
 
 # Health status endpoint
-@app.get("/equipment/{equipment_id}/health", response_model=HealthStatusSchema)
-async def get_equipment_health(equipment_id: str, db: Session = Depends(get_db)):
-    """Get equipment health status with latest prediction"""
-    equipment = db.query(Equipment).filter(Equipment.equipment_id == equipment_id).first()
-    if not equipment:
-        raise HTTPException(status_code=404, detail="Equipment not found")
+def _naive_utc(timestamp: Optional[datetime]) -> Optional[datetime]:
+    """Query parameters may carry a UTC offset; stored timestamps are naive UTC"""
+    if timestamp is not None and timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _health_from_state(equipment: dict, state: dict) -> HealthStatusSchema:
+    """Build the health response from an equipment_latest_state row"""
+    sensor_data = None
+    if state["reading_timestamp"] is not None:
+        sensor_data = SensorReadingSchema(
+            equipment_id=state["equipment_id"],
+            temperature=state["temperature"],
+            vibration=state["vibration"],
+            pressure=state["pressure"],
+            power_consumption=state["power_consumption"],
+            operating_hours=state["operating_hours"],
+            anomaly_score=state["anomaly_score"],
+            timestamp=state["reading_timestamp"],
+        )
+
+    latest_prediction = None
+    if state["prediction_id"] is not None:
+        latest_prediction = PredictionResponseSchema(
+            id=state["prediction_id"],
+            equipment_id=state["equipment_id"],
+            failure_probability=state["failure_probability"],
+            rul_days=state["rul_days"],
+            expected_failure_date=state["expected_failure_date"],
+            confidence_score=state["confidence_score"],
+            feature_importance=state["feature_importance"],
+            model_version=state["model_version"],
+            prediction_timestamp=state["prediction_timestamp"],
+            created_at=state["prediction_timestamp"],
+        )
+
+    return HealthStatusSchema(
+        equipment_id=state["equipment_id"],
+        name=equipment["name"],
+        status=state["status"],
+        health_score=state["health_score"],
+        rul_days=state["rul_days"],
+        failure_probability=state["failure_probability"],
+        last_update=state["reading_timestamp"] or state["updated_at"] or datetime.utcnow(),
+        sensor_data=sensor_data,
+        latest_prediction=latest_prediction,
+    )
 
-    latest_sensor = (
-        db.query(SensorReading)
-        .filter(SensorReading.equipment_id == equipment_id)
+
+async def _health_from_history(db: AsyncSession, equipment_id: str) -> HealthStatusSchema:
+    """Build the health response from the reading/prediction history tables"""
+    equipment = await db.scalar(select(Equipment).where(Equipment.equipment_id == equipment_id))
+
+    latest_sensor = await db.scalar(
+        select(SensorReading)
+        .where(SensorReading.equipment_id == equipment_id)
         .order_by(SensorReading.timestamp.desc())
-        .first()
+        .limit(1)
     )
 
-    latest_prediction = (
-        db.query(Prediction)
-        .filter(Prediction.equipment_id == equipment_id)
+    latest_prediction = await db.scalar(
+        select(Prediction)
+        .where(Prediction.equipment_id == equipment_id)
         .order_by(Prediction.prediction_timestamp.desc())
-        .first()
+        .limit(1)
     )
 
     return HealthStatusSchema(
@@ -160,35 +454,162 @@ async def get_equipment_health(equipment_id: str, db: Session = Depends(get_db))
     )
 
 
+@app.get("/equipment/{equipment_id}/health", response_model=HealthStatusSchema)
+async def get_equipment_health(equipment_id: str, db: AsyncSession = Depends(get_db)):
+    """Get equipment health status with latest prediction"""
+    equipment = await equipment_cache.get(db, equipment_id)
+    if not equipment:
+        raise HTTPException(status_code=404, detail="Equipment not found")
+
+    state = await latest_state.get(db, equipment_id)
+    if state is None or state["status"] is None:
+        # Nothing ingested since the projection was introduced
+        return await _health_from_history(db, equipment_id)
+    return _health_from_state(equipment, state)
+
+
+@app.get("/equipment/{equipment_id}/readings", response_model=EquipmentReadingsResponse)
+async def get_equipment_readings(
+    equipment_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "auto",
+    points: int = Query(2000, ge=10, le=20000),
+    method: str = "minmax",
+    sensors: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Downsampled sensor history from the column store
+
+    resolution is "raw", "auto" (about `points` buckets) or a bucket width
+    such as "30s", "5m" or "1h"; method is "minmax" (min/max/mean per
+    bucket) or "lttb". sensors is a comma-separated subset of sensor
+    names. Timestamps are epoch milliseconds. Defaults to the last 24 hours.
+    """
+    if timeseries_store is None:
+        raise HTTPException(status_code=404, detail="Column store is disabled")
+    if method not in ("minmax", "lttb"):
+        raise HTTPException(status_code=400, detail=f"Unsupported method: {method}")
+    selected = tuple(sensors.split(",")) if sensors else SENSOR_FIELDS
+    unknown = [name for name in selected if name not in SENSOR_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sensors: {', '.join(unknown)}")
+    if not await equipment_cache.exists(db, equipment_id):
+        raise HTTPException(status_code=404, detail="Equipment not found")
+
+    end = _naive_utc(end) or datetime.utcnow()
+    start = _naive_utc(start) or end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(
+            None, timeseries_store.query, equipment_id, start, end, selected, resolution, points, method
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return EquipmentReadingsResponse(
+        equipment_id=equipment_id,
+        start=start,
+        end=end,
+        resolution=result["resolution"],
+        method="raw" if result["resolution"] == "raw" else method,
+        series=result["series"],
+    )
+
+
+@app.get("/equipment/{equipment_id}/features")
+async def get_equipment_features(equipment_id: str):
+    """Rolling features over the equipment's recent readings, as held by this worker"""
+    features = feature_store.get([equipment_id])[0]
+    if features is None:
+        raise HTTPException(status_code=404, detail="No recent readings for equipment")
+    return {"equipment_id": equipment_id, "window": feature_store.window, "features": features}
+
+
+@app.get("/equipment/{equipment_id}/anomaly-baseline")
+async def get_anomaly_baseline(equipment_id: str):
+    """Per-sensor baseline readings of the equipment are scored against, as held by this worker"""
+    baseline = anomaly_detector.baseline(equipment_id)
+    if baseline is None:
+        raise HTTPException(status_code=404, detail="No readings for equipment")
+    return {"equipment_id": equipment_id, "threshold": anomaly_detector.threshold, "baseline": baseline}
+
+
+@app.get("/fleet/health", response_model=List[HealthStatusSchema])
+async def get_fleet_health(db: AsyncSession = Depends(get_db)):
+    """Current health of every equipment that has reported a reading"""
+    states = [state for state in await latest_state.get_all(db) if state["status"] is not None]
+    equipment = await equipment_cache.get_many(db, (state["equipment_id"] for state in states))
+    return [
+        _health_from_state(equipment[state["equipment_id"]], state)
+        for state in states
+        if state["equipment_id"] in equipment
+    ]
+
+
 # Sensor reading endpoints
 @app.post("/sensor/reading", response_model=SensorReadingSchema)
 async def ingest_sensor_reading(
-    reading: SensorReadingSchema, db: Session = Depends(get_db)
+    reading: SensorReadingSchema, response: Response, db: AsyncSession = Depends(get_db)
 ):
     """Ingest sensor reading and trigger predictions"""
-    equipment = db.query(Equipment).filter(Equipment.equipment_id == reading.equipment_id).first()
-    if not equipment:
+    if not await equipment_cache.exists(db, reading.equipment_id):
         raise HTTPException(status_code=404, detail="Equipment not found")
 
-    # Store sensor reading
-    db_reading = SensorReading(**reading.dict())
-    db.add(db_reading)
+    if Config.INGEST_MODE == "queued":
+        if not ingest_pipeline.submit(reading):
+            if not ingest_pipeline.accepting:
+                raise HTTPException(status_code=503, detail="Server is shutting down, retry later")
+            raise HTTPException(
+                status_code=429,
+                detail="Ingest queue is full, retry later",
+                headers={"Retry-After": "1"},
+            )
+        response.status_code = 202
+        return reading
 
     # Calculate health score
     sensor_dict = reading.dict()
     health_score = health_calculator.calculate_health_score(sensor_dict)
     status = health_calculator.determine_status(health_score)
 
-    # Detect anomalies
+    # Detect anomalies against the equipment's baseline
     anomaly_score, severity = anomaly_detector.detect_anomaly(sensor_dict)
+    sensor_dict["anomaly_score"] = reading.anomaly_score = anomaly_score
+
+    # Replay the equipment's recent readings if this worker has none, before this one is stored
+    await feature_store.seed(db, [reading.equipment_id])
+
+    # Store sensor reading
+    db_reading = SensorReading(**sensor_dict)
+    db.add(db_reading)
+    await rollup_job.record_late(db, [(reading.equipment_id, reading.timestamp)])
 
     # Update equipment
-    equipment.health_score = health_score
-    equipment.status = EquipmentStatus(status)
-    equipment.last_reading_time = datetime.utcnow()
+    await db.execute(
+        update(Equipment)
+        .where(Equipment.equipment_id == reading.equipment_id)
+        .values(
+            health_score=health_score,
+            status=EquipmentStatus(status),
+            last_reading_time=datetime.utcnow(),
+        )
+    )
 
-    # Generate prediction
-    failure_prob, rul_days, confidence, feature_importance = predictor.predict(sensor_dict)
+    # Generate prediction from the reading and its equipment's rolling features
+    features = feature_store.update([reading.equipment_id], [reading.timestamp], [sensor_dict])[0]
+    if features is None:
+        # A reading missing a sensor is not added; score it with the features so far
+        features = feature_store.get([reading.equipment_id])[0]
+    model_input = {**sensor_dict, **features} if features else sensor_dict
+    predictor = model_manager.active
+    started = time.perf_counter()
+    prediction = predictor.predict(model_input)
+    model_manager.shadow.offer(predictor, [model_input], [prediction], time.perf_counter() - started)
+    failure_prob, rul_days, confidence, feature_importance = prediction
 
     db_prediction = Prediction(
         equipment_id=reading.equipment_id,
@@ -197,92 +618,295 @@ async def ingest_sensor_reading(
         expected_failure_date=datetime.utcnow() + timedelta(days=rul_days),
         confidence_score=confidence,
         feature_importance=feature_importance,
-        model_version="v1.0",
+        model_version=predictor.model_version,
     )
     db.add(db_prediction)
 
-    db.commit()
-    db.refresh(db_reading)
+    await db.flush()
+    states = await latest_state.stage(
+        db,
+        [
+            {
+                **reading_state(
+                    reading.equipment_id,
+                    sensor_dict,
+                    health_score,
+                    EquipmentStatus(status),
+                    reading.timestamp,
+                ),
+                **prediction_state(db_prediction),
+            }
+        ],
+    )
+    await db.commit()
+    latest_state.apply(states)
+    if timeseries_store is not None:
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, timeseries_store.append, [sensor_dict])
+        except Exception as e:
+            logger.error(f"Error appending reading to the column store: {str(e)}")
 
     # Broadcast update via WebSocket
-    await manager.broadcast(
-        {
-            "type": "sensor_update",
-            "equipment_id": reading.equipment_id,
-            "health_score": health_score,
-            "failure_probability": failure_prob,
-            "timestamp": datetime.utcnow().isoformat(),
-        }
+    await backplane.publish(
+        sensor_update(
+            reading.equipment_id, sensor_dict, health_score, status, failure_prob, rul_days, datetime.utcnow()
+        )
     )
 
     return reading
 
 
+async def _ingest_bulk_chunk(
+    db: AsyncSession, pending: List[Tuple[int, SensorReadingSchema]]
+) -> Tuple[int, List[BulkIngestRowError]]:
+    """Persist a chunk of validated bulk readings; returns (accepted, row errors)"""
+    known_ids = await equipment_cache.get_many(db, (reading.equipment_id for _, reading in pending))
+
+    errors = []
+    batch = []
+    for row, reading in pending:
+        if reading.equipment_id in known_ids:
+            batch.append((row, reading))
+        else:
+            errors.append(BulkIngestRowError(row=row, error="Equipment not found"))
+
+    results = await ingest_pipeline.process_batch([reading for _, reading in batch])
+    for (row, _), ok in zip(batch, results):
+        if not ok:
+            errors.append(BulkIngestRowError(row=row, error="Failed to process reading"))
+    return sum(results), errors
+
+
+@app.post("/sensor/readings/bulk", response_model=BulkIngestResponse)
+async def ingest_sensor_readings_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    """Ingest a JSON array or NDJSON stream (application/x-ndjson) of sensor readings
+
+    The body is parsed incrementally and written in chunks; only failed rows
+    are listed in the response, by their zero-based position in the body.
+    """
+    content_type = request.headers.get("content-type", "")
+    parse = iter_ndjson if ("ndjson" in content_type or "jsonl" in content_type) else iter_json_array
+
+    received = 0
+    accepted = 0
+    errors: List[BulkIngestRowError] = []
+    pending: List[Tuple[int, SensorReadingSchema]] = []
+
+    async for record, parse_error in parse(request.stream()):
+        row = received
+        received += 1
+        if parse_error:
+            errors.append(BulkIngestRowError(row=row, error=parse_error))
+            continue
+        if not isinstance(record, dict):
+            errors.append(BulkIngestRowError(row=row, error="Expected a JSON object"))
+            continue
+        try:
+            pending.append((row, SensorReadingSchema(**record)))
+        except ValidationError as e:
+            first = e.errors()[0]
+            location = ".".join(str(part) for part in first["loc"])
+            errors.append(BulkIngestRowError(row=row, error=f"{location}: {first['msg']}"))
+            continue
+
+        if len(pending) >= Config.INGEST_BULK_CHUNK_SIZE:
+            chunk_accepted, chunk_errors = await _ingest_bulk_chunk(db, pending)
+            accepted += chunk_accepted
+            errors.extend(chunk_errors)
+            pending = []
+
+    if pending:
+        chunk_accepted, chunk_errors = await _ingest_bulk_chunk(db, pending)
+        accepted += chunk_accepted
+        errors.extend(chunk_errors)
+
+    errors.sort(key=lambda error: error.row)
+    return BulkIngestResponse(
+        received=received,
+        accepted=accepted,
+        rejected=received - accepted,
+        errors=errors,
+        timestamp=datetime.utcnow(),
+    )
+
+
+@app.get("/sensor/{equipment_id}/history", response_model=SensorHistoryResponse)
+async def get_sensor_history(
+    equipment_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = "auto",
+    db: AsyncSession = Depends(get_db),
+):
+    """Sensor history with per-bucket min/max/mean/std
+
+    resolution is "raw", "1m", "1h" or "auto", which serves long ranges
+    from rollups and short recent ranges from raw readings. Defaults to
+    the last 24 hours.
+    """
+    if resolution != "auto" and resolution != "raw" and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported resolution: {resolution}")
+    if not await equipment_cache.exists(db, equipment_id):
+        raise HTTPException(status_code=404, detail="Equipment not found")
+
+    end = _naive_utc(end) or datetime.utcnow()
+    start = _naive_utc(start) or end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if resolution == "auto":
+        resolution = rollup_job.choose_resolution(start, end)
+
+    points = await fetch_history(db, equipment_id, start, end, resolution)
+    return SensorHistoryResponse(
+        equipment_id=equipment_id, resolution=resolution, start=start, end=end, points=points
+    )
+
+
 # Prediction endpoints
 @app.post("/predict", response_model=PredictionResponseSchema)
 async def predict_failure(
-    prediction: PredictionSchema, db: Session = Depends(get_db)
+    prediction: PredictionSchema, db: AsyncSession = Depends(get_db)
 ):
     """Single equipment failure prediction"""
-    equipment = db.query(Equipment).filter(Equipment.equipment_id == prediction.equipment_id).first()
-    if not equipment:
+    if not await equipment_cache.exists(db, prediction.equipment_id):
         raise HTTPException(status_code=404, detail="Equipment not found")
 
     db_prediction = Prediction(**prediction.dict())
     db.add(db_prediction)
-    db.commit()
-    db.refresh(db_prediction)
+    await db.flush()
+    states = await latest_state.stage(db, [prediction_state(db_prediction)])
+    await db.commit()
+    await db.refresh(db_prediction)
+    latest_state.apply(states)
 
     return db_prediction
 
 
+async def _latest_sensor_rows(db: AsyncSession, equipment_ids: List[str]):
+    """Fetch the most recent sensor reading for each equipment ID in one query"""
+    ranked = (
+        select(
+            SensorReading.equipment_id,
+            SensorReading.temperature,
+            SensorReading.vibration,
+            SensorReading.pressure,
+            SensorReading.power_consumption,
+            SensorReading.operating_hours,
+            func.row_number()
+            .over(
+                partition_by=SensorReading.equipment_id,
+                order_by=(SensorReading.timestamp.desc(), SensorReading.id.desc()),
+            )
+            .label("row_number"),
+        )
+        .where(SensorReading.equipment_id.in_(equipment_ids))
+        .subquery()
+    )
+    result = await db.execute(select(ranked).where(ranked.c.row_number == 1))
+    return result.all()
+
+
 @app.post("/predict/batch", response_model=BatchPredictionResponse)
 async def batch_predict(
-    request: BatchPredictionRequest, db: Session = Depends(get_db)
+    request: BatchPredictionRequest, db: AsyncSession = Depends(get_db)
 ):
     """Batch prediction for multiple equipment"""
     predictions = []
     failed_count = 0
+    equipment_ids = list(dict.fromkeys(request.equipment_ids))
 
-    for equipment_id in request.equipment_ids:
-        try:
-            latest_sensor = (
-                db.query(SensorReading)
-                .filter(SensorReading.equipment_id == equipment_id)
-                .order_by(SensorReading.timestamp.desc())
-                .first()
-            )
-
-            if latest_sensor:
-                sensor_dict = {
-                    "temperature": latest_sensor.temperature,
-                    "vibration": latest_sensor.vibration,
-                    "pressure": latest_sensor.pressure,
-                    "power_consumption": latest_sensor.power_consumption,
-                    "operating_hours": latest_sensor.operating_hours,
-                }
+    try:
+        latest_rows = await _latest_sensor_rows(db, equipment_ids)
+    except Exception as e:
+        logger.error(f"Batch prediction error loading sensor readings: {str(e)}")
+        return BatchPredictionResponse(
+            predictions=[],
+            processed_count=0,
+            failed_count=len(equipment_ids),
+            timestamp=datetime.utcnow(),
+        )
 
-                failure_prob, rul_days, confidence, feature_importance = predictor.predict(
-                    sensor_dict
-                )
+    latest_by_id = {row.equipment_id: row for row in latest_rows}
+    scored_ids = [equipment_id for equipment_id in equipment_ids if equipment_id in latest_by_id]
+    # Equipment without readings cannot be scored
+    failed_count += len(equipment_ids) - len(scored_ids)
+    sensor_dicts = [
+        {
+            "temperature": latest_by_id[equipment_id].temperature,
+            "vibration": latest_by_id[equipment_id].vibration,
+            "pressure": latest_by_id[equipment_id].pressure,
+            "power_consumption": latest_by_id[equipment_id].power_consumption,
+            "operating_hours": latest_by_id[equipment_id].operating_hours,
+        }
+        for equipment_id in scored_ids
+    ]
+    try:
+        await feature_store.seed(db, scored_ids)
+    except Exception as e:
+        logger.error(f"Batch prediction error seeding rolling features: {str(e)}")
+    for sensor_dict, features in zip(sensor_dicts, feature_store.get(scored_ids)):
+        if features:
+            sensor_dict.update(features)
+    predictor = model_manager.active
+    # A latest reading missing a sensor, or rolling features the model takes, is not scored
+    complete = [not predictor.missing_features(sensor_dict) for sensor_dict in sensor_dicts]
+    failed_count += len(complete) - sum(complete)
+    scored_ids = [equipment_id for equipment_id, ok in zip(scored_ids, complete) if ok]
+    sensor_dicts = [sensor_dict for sensor_dict, ok in zip(sensor_dicts, complete) if ok]
+    started = time.perf_counter()
+    # Scoring (and explaining) thousands of rows takes long enough to stall the event loop
+    loop = asyncio.get_running_loop()
+    results = (
+        await loop.run_in_executor(
+            None, partial(predictor.batch_predict, sensor_dicts, include_explanation=request.include_explanation)
+        )
+        if sensor_dicts
+        else []
+    )
+    model_manager.shadow.offer(predictor, sensor_dicts, results, time.perf_counter() - started)
 
-                db_prediction = Prediction(
+    now = datetime.utcnow()
+    db_predictions = []
+    for equipment_id, result in zip(scored_ids, results):
+        if result == predictor.UNSCORED:
+            # Scoring failed; not a prediction to store
+            failed_count += 1
+            continue
+        failure_prob, rul_days, confidence, feature_importance = result
+        try:
+            db_predictions.append(
+                Prediction(
                     equipment_id=equipment_id,
-                    failure_probability=failure_prob,
+                    failure_probability=float(failure_prob),
                     rul_days=rul_days,
-                    expected_failure_date=datetime.utcnow() + timedelta(days=rul_days),
+                    expected_failure_date=now + timedelta(days=rul_days),
                     confidence_score=confidence,
                     feature_importance=feature_importance,
-                    model_version="v1.0",
+                    model_version=predictor.model_version,
+                    prediction_timestamp=now,
+                    created_at=now,
                 )
-                db.add(db_prediction)
-                db.commit()
-                db.refresh(db_prediction)
-                predictions.append(PredictionResponseSchema.from_orm(db_prediction))
+            )
         except Exception as e:
             logger.error(f"Batch prediction error for {equipment_id}: {str(e)}")
             failed_count += 1
 
+    # One bulk insert and one commit for the whole batch; responses are built
+    # after the flush so the commit does not force a refresh per row
+    try:
+        db.add_all(db_predictions)
+        await db.flush()
+        predictions = [PredictionResponseSchema.from_orm(p) for p in db_predictions]
+        states = await latest_state.stage(db, (prediction_state(p) for p in db_predictions))
+        await db.commit()
+        latest_state.apply(states)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Batch prediction error persisting predictions: {str(e)}")
+        failed_count += len(db_predictions)
+        predictions = []
+
     return BatchPredictionResponse(
         predictions=predictions,
         processed_count=len(predictions),
@@ -292,47 +916,110 @@ async def batch_predict(
 
 
 @app.get("/predictions/{equipment_id}", response_model=List[PredictionResponseSchema])
-async def get_predictions(equipment_id: str, db: Session = Depends(get_db)):
+async def get_predictions(equipment_id: str, db: AsyncSession = Depends(get_db)):
     """Get prediction history for equipment"""
-    predictions = (
-        db.query(Prediction)
-        .filter(Prediction.equipment_id == equipment_id)
+    result = await db.execute(
+        select(Prediction)
+        .where(Prediction.equipment_id == equipment_id)
         .order_by(Prediction.prediction_timestamp.desc())
         .limit(10)
-        .all()
     )
-    return predictions
+    return result.scalars().all()
+
+
+# Model registry endpoints
+@app.get("/models", response_model=List[ModelRegistrySchema])
+async def list_models(db: AsyncSession = Depends(get_db)):
+    """List registered model versions"""
+    result = await db.execute(select(ModelRegistry).order_by(ModelRegistry.created_at.desc()))
+    return result.scalars().all()
+
+
+@app.post("/models/{model_version}/activate")
+async def activate_model(model_version: str):
+    """Load, warm and serve a registered model version on this worker; other workers follow the registry"""
+    try:
+        await model_manager.activate(model_version)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error activating model {model_version}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Could not load model {model_version}")
+    return model_manager.get_stats()
+
+
+@app.post("/models/{model_version}/shadow")
+async def shadow_model(model_version: str):
+    """Score a sample of live readings with a registered version alongside the active one"""
+    try:
+        await model_manager.set_shadow(model_version)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error loading shadow model {model_version}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Could not load model {model_version}")
+    return model_manager.get_stats()
+
+
+@app.delete("/models/shadow")
+async def stop_shadow_model():
+    """Stop shadow scoring"""
+    await model_manager.clear_shadow()
+    return model_manager.get_stats()
+
+
+@app.get("/models/shadow/comparisons", response_model=List[ShadowComparisonSchema])
+async def get_shadow_comparisons(
+    candidate_version: Optional[str] = None, limit: int = 100, db: AsyncSession = Depends(get_db)
+):
+    """Recent shadow comparison windows, newest first"""
+    query = select(ShadowComparison).order_by(ShadowComparison.window_start.desc()).limit(min(limit, 1000))
+    if candidate_version is not None:
+        query = query.where(ShadowComparison.candidate_version == candidate_version)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+
+@app.post("/models/rollback")
+async def rollback_model():
+    """Serve the previously active model version again (kept warm, no reload)"""
+    try:
+        await model_manager.rollback()
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return model_manager.get_stats()
 
 
 # Maintenance endpoints
 @app.get("/maintenance/upcoming", response_model=List[MaintenanceEventResponseSchema])
-async def get_upcoming_maintenance(db: Session = Depends(get_db)):
+async def get_upcoming_maintenance(db: AsyncSession = Depends(get_db)):
     """Get upcoming maintenance tasks"""
-    maintenance = (
-        db.query(MaintenanceEvent)
-        .filter(MaintenanceEvent.scheduled_date >= datetime.utcnow())
+    result = await db.execute(
+        select(MaintenanceEvent)
+        .where(MaintenanceEvent.scheduled_date >= datetime.utcnow())
         .order_by(MaintenanceEvent.scheduled_date)
-        .all()
     )
-    return maintenance
+    return result.scalars().all()
 
 
 @app.post("/maintenance", response_model=MaintenanceEventResponseSchema)
 async def create_maintenance(
-    maintenance: MaintenanceEventSchema, db: Session = Depends(get_db)
+    maintenance: MaintenanceEventSchema, db: AsyncSession = Depends(get_db)
 ):
     """Create maintenance event"""
     db_maintenance = MaintenanceEvent(**maintenance.dict())
     db.add(db_maintenance)
-    db.commit()
-    db.refresh(db_maintenance)
+    await db.commit()
+    await db.refresh(db_maintenance)
     return db_maintenance
 
 
 # Salesforce/Agentforce integration
 @app.post("/actions/create_case", response_model=CreateCaseResponse)
 async def create_service_case(
-    request: CreateCaseRequest, db: Session = Depends(get_db)
+    request: CreateCaseRequest, db: AsyncSession = Depends(get_db)
 ):
     """Create Salesforce service case for equipment failure"""
     try:
@@ -346,7 +1033,7 @@ async def create_service_case(
             timestamp=datetime.utcnow(),
         )
         db.add(audit)
-        db.commit()
+        await db.commit()
 
         return CreateCaseResponse(
             case_id=case_id,
@@ -362,7 +1049,7 @@ async def create_service_case(
 
 # Webhook endpoint for Tableau extensions
 @app.post("/webhooks/tableau")
-async def tableau_webhook(payload: WebhookPayload, db: Session = Depends(get_db)):
+async def tableau_webhook(payload: WebhookPayload, db: AsyncSession = Depends(get_db)):
     """Handle Tableau extension webhook events"""
     try:
         logger.info(f"Tableau webhook received: {payload.action}")
@@ -386,12 +1073,29 @@ async def tableau_webhook(payload: WebhookPayload, db: Session = Depends(get_db)
 # WebSocket endpoint for real-time updates
 @app.websocket("/ws/equipment/{equipment_id}")
 async def websocket_endpoint(websocket: WebSocket, equipment_id: str):
-    """WebSocket endpoint for real-time equipment updates"""
-    await manager.connect(websocket)
+    """WebSocket endpoint for real-time equipment updates
+
+    Subscribes to equipment_id (``*`` for every equipment). The client can
+    send {"action": "subscribe" | "unsubscribe", "equipment_ids": [...]} to
+    change its subscriptions; other text is relayed to equipment_id's
+    subscribers.
+    """
+    await manager.connect(websocket, [equipment_id])
     try:
         while True:
             data = await websocket.receive_text()
-            await manager.broadcast(
+            try:
+                command = json.loads(data)
+            except ValueError:
+                command = None
+            if isinstance(command, dict) and command.get("action") in ("subscribe", "unsubscribe"):
+                topics = [str(topic) for topic in command.get("equipment_ids") or []]
+                if command["action"] == "subscribe":
+                    manager.subscribe(websocket, topics)
+                else:
+                    manager.unsubscribe(websocket, topics)
+                continue
+            await backplane.publish(
                 {
                     "type": "message",
                     "equipment_id": equipment_id,
@@ -400,8 +1104,42 @@ async def websocket_endpoint(websocket: WebSocket, equipment_id: str):
                 }
             )
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
         logger.info(f"Client disconnected from {equipment_id}")
+    finally:
+        manager.disconnect(websocket)
+
+
+@app.websocket("/ws/stream")
+async def stream_endpoint(websocket: WebSocket, equipment_ids: str = "*", encoding: str = "json"):
+    """Dashboard stream: a snapshot, then one frame of changed fields per tick
+
+    equipment_ids is a comma-separated list (``*`` for every equipment) and
+    encoding is json (text frames) or msgpack (binary frames). Subscriptions
+    change with the same subscribe/unsubscribe messages as the equipment
+    endpoint; each subscribe is answered with a snapshot.
+    """
+    await websocket.accept()
+    try:
+        update_stream.register(websocket, [topic for topic in equipment_ids.split(",") if topic], encoding)
+    except ValueError as e:
+        await websocket.close(code=1003, reason=str(e))
+        return
+    try:
+        while True:
+            try:
+                command = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if isinstance(command, dict) and command.get("action") in ("subscribe", "unsubscribe"):
+                topics = [str(topic) for topic in command.get("equipment_ids") or []]
+                if command["action"] == "subscribe":
+                    update_stream.subscribe(websocket, topics)
+                else:
+                    update_stream.unsubscribe(websocket, topics)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        update_stream.disconnect(websocket)
 
 
 if __name__ == "__main__":
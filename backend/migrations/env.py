@@ -0,0 +1,63 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+from config import Config
+from database import MIGRATION_LOCK, Base, advisory_lock
+from partitions import PARTITIONED_TABLES
+import models  # noqa: F401  (registers tables on Base.metadata)
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+if not config.get_main_option("sqlalchemy.url"):
+    config.set_main_option("sqlalchemy.url", Config.DATABASE_URL.replace("%", "%%"))
+
+target_metadata = Base.metadata
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Skip foreign keys MySQL cannot keep on partitioned tables (see 0002)"""
+    if type_ == "foreign_key_constraint" and obj.table.name in PARTITIONED_TABLES:
+        return context.get_context().dialect.name != "mysql"
+    return True
+
+
+def run_migrations_offline():
+    """Emit migration SQL without connecting to the database"""
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Apply migrations over a live connection, one process at a time"""
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+    # Workers that start together wait here, then find the schema already at head
+    with connectable.connect() as connection, advisory_lock(connection, MIGRATION_LOCK):
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
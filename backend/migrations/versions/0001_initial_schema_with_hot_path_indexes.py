@@ -0,0 +1,209 @@
+"""initial schema with hot path indexes
+
+Creates every table in models.py along with composite indexes for the
+access paths the API uses: latest/ranged readings and predictions per
+equipment, upcoming maintenance by date and audit history per equipment.
+
+Databases created earlier with Base.metadata.create_all (and never
+stamped) are adopted in place: tables and enum types that already exist
+are kept, and only the missing tables and indexes are created.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 19:51:48.820125
+"""
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+EQUIPMENT_STATUSES = ('HEALTHY', 'WARNING', 'CRITICAL', 'DOWN')
+MAINTENANCE_STATUSES = ('SCHEDULED', 'IN_PROGRESS', 'COMPLETED', 'CANCELLED')
+
+
+def _enum(values, name):
+    """Enum type; on PostgreSQL the named type is created up front, once, by upgrade()"""
+    return sa.Enum(*values, name=name).with_variant(
+        postgresql.ENUM(*values, name=name, create_type=False), 'postgresql'
+    )
+
+
+def _online():
+    """Whether the database can be inspected (not when emitting SQL with --sql)"""
+    return not context.is_offline_mode()
+
+
+def _create_table(name, *columns):
+    """Create a table unless an unversioned create_all schema already has it"""
+    if _online() and sa.inspect(op.get_bind()).has_table(name):
+        return
+    op.create_table(name, *columns)
+
+
+def _create_index(name, table, columns, **kwargs):
+    if _online() and name in {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}:
+        return
+    op.create_index(name, table, columns, **kwargs)
+
+
+def upgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        for values, name in ((EQUIPMENT_STATUSES, 'equipmentstatus'), (MAINTENANCE_STATUSES, 'maintenancestatus')):
+            postgresql.ENUM(*values, name=name).create(op.get_bind(), checkfirst=_online())
+
+    _create_table('audit_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('equipment_id', sa.String(length=50), nullable=True),
+    sa.Column('action', sa.String(length=100), nullable=True),
+    sa.Column('prediction_id', sa.Integer(), nullable=True),
+    sa.Column('payload_hash', sa.String(length=255), nullable=True),
+    sa.Column('solana_tx_hash', sa.String(length=255), nullable=True),
+    sa.Column('user_id', sa.String(length=100), nullable=True),
+    sa.Column('ip_address', sa.String(length=50), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    _create_index('ix_audit_logs_equipment_timestamp', 'audit_logs', ['equipment_id', 'timestamp'], unique=False)
+
+    _create_table('equipment',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('equipment_id', sa.String(length=50), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('type', sa.String(length=100), nullable=False),
+    sa.Column('location', sa.String(length=255), nullable=True),
+    sa.Column('manufacturer', sa.String(length=255), nullable=True),
+    sa.Column('model', sa.String(length=255), nullable=True),
+    sa.Column('criticality', sa.String(length=50), nullable=True),
+    sa.Column('status', _enum(EQUIPMENT_STATUSES, 'equipmentstatus'), nullable=True),
+    sa.Column('health_score', sa.Float(), nullable=True),
+    sa.Column('last_reading_time', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('equipment_id')
+    )
+    _create_table('model_registry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('model_version', sa.String(length=50), nullable=True),
+    sa.Column('model_type', sa.String(length=100), nullable=True),
+    sa.Column('training_date', sa.DateTime(), nullable=True),
+    sa.Column('dataset_hash', sa.String(length=255), nullable=True),
+    sa.Column('auc_score', sa.Float(), nullable=True),
+    sa.Column('accuracy', sa.Float(), nullable=True),
+    sa.Column('precision', sa.Float(), nullable=True),
+    sa.Column('recall', sa.Float(), nullable=True),
+    sa.Column('f1_score', sa.Float(), nullable=True),
+    sa.Column('model_path', sa.String(length=500), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('model_version')
+    )
+    _create_table('equipment_latest_state',
+    sa.Column('equipment_id', sa.String(length=50), nullable=False),
+    sa.Column('status', _enum(EQUIPMENT_STATUSES, 'equipmentstatus'), nullable=True),
+    sa.Column('health_score', sa.Float(), nullable=True),
+    sa.Column('temperature', sa.Float(), nullable=True),
+    sa.Column('vibration', sa.Float(), nullable=True),
+    sa.Column('pressure', sa.Float(), nullable=True),
+    sa.Column('power_consumption', sa.Float(), nullable=True),
+    sa.Column('operating_hours', sa.Float(), nullable=True),
+    sa.Column('anomaly_score', sa.Float(), nullable=True),
+    sa.Column('reading_timestamp', sa.DateTime(), nullable=True),
+    sa.Column('prediction_id', sa.Integer(), nullable=True),
+    sa.Column('failure_probability', sa.Float(), nullable=True),
+    sa.Column('rul_days', sa.Integer(), nullable=True),
+    sa.Column('expected_failure_date', sa.DateTime(), nullable=True),
+    sa.Column('confidence_score', sa.Float(), nullable=True),
+    sa.Column('feature_importance', sa.JSON(), nullable=True),
+    sa.Column('model_version', sa.String(length=50), nullable=True),
+    sa.Column('prediction_timestamp', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['equipment_id'], ['equipment.equipment_id'], ),
+    sa.PrimaryKeyConstraint('equipment_id')
+    )
+    _create_table('maintenance_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('equipment_id', sa.String(length=50), nullable=True),
+    sa.Column('maintenance_type', sa.String(length=100), nullable=True),
+    sa.Column('status', _enum(MAINTENANCE_STATUSES, 'maintenancestatus'), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('scheduled_date', sa.DateTime(), nullable=True),
+    sa.Column('completed_date', sa.DateTime(), nullable=True),
+    sa.Column('estimated_duration', sa.Integer(), nullable=True),
+    sa.Column('actual_duration', sa.Integer(), nullable=True),
+    sa.Column('parts_required', sa.Text(), nullable=True),
+    sa.Column('technician_assigned', sa.String(length=255), nullable=True),
+    sa.Column('cost', sa.Float(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['equipment_id'], ['equipment.equipment_id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    _create_index('ix_maintenance_events_equipment_scheduled', 'maintenance_events', ['equipment_id', 'scheduled_date'], unique=False)
+    _create_index('ix_maintenance_events_scheduled_date', 'maintenance_events', ['scheduled_date'], unique=False)
+
+    _create_table('predictions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('equipment_id', sa.String(length=50), nullable=True),
+    sa.Column('failure_probability', sa.Float(), nullable=False),
+    sa.Column('rul_days', sa.Integer(), nullable=True),
+    sa.Column('expected_failure_date', sa.DateTime(), nullable=True),
+    sa.Column('confidence_score', sa.Float(), nullable=True),
+    sa.Column('top_factors', sa.Text(), nullable=True),
+    sa.Column('feature_importance', sa.JSON(), nullable=True),
+    sa.Column('model_version', sa.String(length=50), nullable=True),
+    sa.Column('prediction_timestamp', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['equipment_id'], ['equipment.equipment_id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    _create_index('ix_predictions_equipment_timestamp', 'predictions', ['equipment_id', 'prediction_timestamp'], unique=False)
+
+    _create_table('sensor_readings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('equipment_id', sa.String(length=50), nullable=True),
+    sa.Column('temperature', sa.Float(), nullable=True),
+    sa.Column('vibration', sa.Float(), nullable=True),
+    sa.Column('pressure', sa.Float(), nullable=True),
+    sa.Column('power_consumption', sa.Float(), nullable=True),
+    sa.Column('operating_hours', sa.Float(), nullable=True),
+    sa.Column('anomaly_score', sa.Float(), nullable=True),
+    sa.Column('raw_data', sa.JSON(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['equipment_id'], ['equipment.equipment_id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    _create_index('ix_sensor_readings_equipment_timestamp', 'sensor_readings', ['equipment_id', 'timestamp'], unique=False)
+
+
+
+def downgrade():
+    op.drop_index('ix_sensor_readings_equipment_timestamp', table_name='sensor_readings')
+
+    op.drop_table('sensor_readings')
+    op.drop_index('ix_predictions_equipment_timestamp', table_name='predictions')
+
+    op.drop_table('predictions')
+    op.drop_index('ix_maintenance_events_scheduled_date', table_name='maintenance_events')
+    op.drop_index('ix_maintenance_events_equipment_scheduled', table_name='maintenance_events')
+
+    op.drop_table('maintenance_events')
+    op.drop_table('equipment_latest_state')
+    op.drop_table('model_registry')
+    op.drop_table('equipment')
+    op.drop_index('ix_audit_logs_equipment_timestamp', table_name='audit_logs')
+
+    op.drop_table('audit_logs')
+
+    if op.get_context().dialect.name == 'postgresql':
+        for values, name in ((MAINTENANCE_STATUSES, 'maintenancestatus'), (EQUIPMENT_STATUSES, 'equipmentstatus')):
+            postgresql.ENUM(*values, name=name).drop(op.get_bind(), checkfirst=_online())
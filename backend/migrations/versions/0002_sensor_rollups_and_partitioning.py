@@ -0,0 +1,87 @@
+"""sensor rollups and time-partitioned readings
+
+Adds the sensor_rollups and rollup_watermarks tables and a timestamp
+index used by the rollup job and retention. On MySQL, sensor_readings is
+converted to RANGE partitioning on TO_DAYS(timestamp): one partition for
+all existing history plus a catch-all that the rollup job splits into
+daily partitions ahead of time. MySQL requires the partition key in the
+primary key and does not support foreign keys on partitioned tables, so
+the primary key becomes (id, timestamp) and the equipment foreign key is
+dropped there. Converting a large table rewrites it: run this upgrade
+with `alembic upgrade` out of band, not with DB_AUTO_MIGRATE on startup.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 21:12:03.402118
+"""
+from datetime import date, timedelta
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from partitions import initial_partitions_sql
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _sensor_columns():
+    columns = []
+    for field in ('temperature', 'vibration', 'pressure', 'power_consumption', 'operating_hours'):
+        for stat in ('min', 'max', 'mean', 'std'):
+            columns.append(sa.Column(f'{field}_{stat}', sa.Float(), nullable=True))
+    return columns
+
+
+def upgrade():
+    op.create_table('sensor_rollups',
+    sa.Column('equipment_id', sa.String(length=50), nullable=False),
+    sa.Column('resolution', sa.String(length=8), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('sample_count', sa.Integer(), nullable=False),
+    *_sensor_columns(),
+    sa.ForeignKeyConstraint(['equipment_id'], ['equipment.equipment_id'], ),
+    sa.PrimaryKeyConstraint('equipment_id', 'resolution', 'bucket_start')
+    )
+    op.create_index('ix_sensor_rollups_resolution_bucket', 'sensor_rollups', ['resolution', 'bucket_start'], unique=False)
+
+    op.create_table('rollup_watermarks',
+    sa.Column('resolution', sa.String(length=8), nullable=False),
+    sa.Column('processed_until', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('resolution')
+    )
+
+    op.execute("UPDATE sensor_readings SET timestamp = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE timestamp IS NULL")
+    with op.batch_alter_table('sensor_readings') as batch_op:
+        batch_op.alter_column('timestamp', existing_type=sa.DateTime(), nullable=False)
+    op.create_index('ix_sensor_readings_timestamp', 'sensor_readings', ['timestamp'], unique=False)
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'mysql':
+        if context.is_offline_mode():
+            # Name MySQL generates for the unnamed foreign key created in 0001
+            foreign_keys = ['sensor_readings_ibfk_1']
+        else:
+            foreign_keys = [fk['name'] for fk in sa.inspect(bind).get_foreign_keys('sensor_readings')]
+        for name in foreign_keys:
+            op.drop_constraint(name, 'sensor_readings', type_='foreignkey')
+        op.execute("ALTER TABLE sensor_readings DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)")
+        op.execute(f"ALTER TABLE sensor_readings {initial_partitions_sql(date.today() + timedelta(days=1))}")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'mysql':
+        op.execute("ALTER TABLE sensor_readings REMOVE PARTITIONING")
+        op.execute("ALTER TABLE sensor_readings DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+        op.create_foreign_key(None, 'sensor_readings', 'equipment', ['equipment_id'], ['equipment_id'])
+
+    op.drop_index('ix_sensor_readings_timestamp', table_name='sensor_readings')
+    with op.batch_alter_table('sensor_readings') as batch_op:
+        batch_op.alter_column('timestamp', existing_type=sa.DateTime(), nullable=True)
+    op.drop_table('rollup_watermarks')
+    op.drop_index('ix_sensor_rollups_resolution_bucket', table_name='sensor_rollups')
+    op.drop_table('sensor_rollups')
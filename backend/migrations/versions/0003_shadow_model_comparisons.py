@@ -0,0 +1,49 @@
+"""shadow model comparisons
+
+Adds model_registry.is_shadow, marking the candidate version that workers
+score alongside the active one, and the shadow_comparisons table where
+they write per-window agreement and latency aggregates.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 23:41:17.285604
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('model_registry') as batch_op:
+        batch_op.add_column(sa.Column('is_shadow', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    op.create_table('shadow_comparisons',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('active_version', sa.String(length=50), nullable=False),
+    sa.Column('candidate_version', sa.String(length=50), nullable=False),
+    sa.Column('window_start', sa.DateTime(), nullable=False),
+    sa.Column('window_end', sa.DateTime(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('label_flips', sa.Integer(), nullable=False),
+    sa.Column('mean_abs_diff', sa.Float(), nullable=True),
+    sa.Column('max_abs_diff', sa.Float(), nullable=True),
+    sa.Column('mean_rul_abs_diff', sa.Float(), nullable=True),
+    sa.Column('diff_histogram', sa.JSON(), nullable=True),
+    sa.Column('active_latency_histogram', sa.JSON(), nullable=True),
+    sa.Column('candidate_latency_histogram', sa.JSON(), nullable=True),
+    sa.Column('candidate_errors', sa.Integer(), nullable=True),
+    sa.Column('dropped', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_shadow_comparisons_candidate_window', 'shadow_comparisons', ['candidate_version', 'window_start'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shadow_comparisons_candidate_window', table_name='shadow_comparisons')
+    op.drop_table('shadow_comparisons')
+    with op.batch_alter_table('model_registry') as batch_op:
+        batch_op.drop_column('is_shadow')
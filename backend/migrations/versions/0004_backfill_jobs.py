@@ -0,0 +1,36 @@
+"""backfill jobs
+
+Adds the backfill_jobs table where backfill.py records each re-scoring
+run's arguments and the last sensor reading it has written, in the same
+transaction as the chunk, so an interrupted run resumes without skipping
+or repeating readings.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:52:40.118734
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('backfill_jobs',
+    sa.Column('job', sa.String(length=100), nullable=False),
+    sa.Column('params', sa.JSON(), nullable=True),
+    sa.Column('model_version', sa.String(length=50), nullable=True),
+    sa.Column('last_reading_id', sa.Integer(), nullable=False),
+    sa.Column('rows_processed', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('job')
+    )
+
+
+def downgrade():
+    op.drop_table('backfill_jobs')
@@ -0,0 +1,31 @@
+"""rollup late buckets
+
+Adds the rollup_late_buckets table. Ingest records each minute that
+received a reading older than the rollup lateness window, and the
+rollup job re-aggregates those minutes (and their hours) if it had
+already rolled them up.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 09:14:27.503961
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rollup_late_buckets',
+    sa.Column('equipment_id', sa.String(length=50), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('marks', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('equipment_id', 'bucket_start')
+    )
+
+
+def downgrade():
+    op.drop_table('rollup_late_buckets')
@@ -0,0 +1,32 @@
+"""rollup sensor counts
+
+Adds the number of readings with each sensor to sensor_rollups, so
+1-hour buckets can be merged exactly from 1-minute ones. Rows already
+written keep NULL counts, which are read as sample_count for every
+sensor with a mean.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 10:02:41.118305
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+FIELDS = ('temperature', 'vibration', 'pressure', 'power_consumption', 'operating_hours')
+
+
+def upgrade():
+    with op.batch_alter_table('sensor_rollups') as batch_op:
+        for field in FIELDS:
+            batch_op.add_column(sa.Column(f'{field}_count', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('sensor_rollups') as batch_op:
+        for field in FIELDS:
+            batch_op.drop_column(f'{field}_count')
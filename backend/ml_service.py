@@ -4,38 +4,681 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 import joblib
 import json
+import math
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional, Union
 import logging
 
+try:
+    import fcntl
+except ImportError:  # Windows: artifact exports are not serialized between processes
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# Column order of sensor arrays passed to the array scoring methods
+SENSOR_FIELDS = ("temperature", "vibration", "pressure", "power_consumption", "operating_hours")
+
+Readings = Union[np.ndarray, Dict[str, np.ndarray], List[Dict[str, float]]]
+
+
+def sensor_array(readings: Readings, fields: Tuple[str, ...] = SENSOR_FIELDS, missing: float = 0.0) -> np.ndarray:
+    """(N, len(fields)) float array from an (N, 5) array in SENSOR_FIELDS order, a dict of columns or sensor dicts
+
+    Sensors that are absent, or None in a sensor dict, become ``missing``.
+    """
+    if isinstance(readings, dict):
+        n = len(next(iter(readings.values()))) if readings else 0
+        return np.column_stack(
+            [np.asarray(readings[f], dtype=float) if f in readings else np.full(n, missing) for f in fields]
+        ).reshape(n, len(fields))
+    if isinstance(readings, np.ndarray):
+        readings = np.asarray(readings, dtype=float)
+        if readings.ndim != 2 or readings.shape[1] != len(SENSOR_FIELDS):
+            raise ValueError(f"Expected an (N, {len(SENSOR_FIELDS)}) array of {SENSOR_FIELDS}, got {readings.shape}")
+        return readings[:, [SENSOR_FIELDS.index(f) for f in fields]]
+    return np.array(
+        [[missing if reading.get(f) is None else reading[f] for f in fields] for reading in readings], dtype=float
+    ).reshape(len(readings), len(fields))
+
+# "flat" serves from the memory-mapped FlatForest artifact, "sklearn" from the unpickled RandomForest
+INFERENCE_ENGINES = ("flat", "sklearn")
+
+
+class FlatForest:
+    """Tree ensemble stored as flat node arrays that can be memory-mapped
+
+    The nodes of every tree are concatenated into one set of arrays, with
+    ``roots`` holding the index of each tree's first node. ``children``
+    interleaves each node's (left, right) child and leaves point back at
+    themselves, so a walk can take extra steps past a leaf harmlessly.
+    Node values are stored as class probabilities, so predict_proba
+    averages the leaves reached exactly like sklearn's
+    RandomForestClassifier; ``cover`` holds each node's weighted training
+    sample count, which explanations use. Saved as one .npy file per array: loading with
+    mmap_mode maps the files instead of reading them, and every process
+    loading the same artifact shares a single page-cached copy. Saving
+    holds an exclusive flock on ``<path>.lock`` and loading a shared one,
+    so concurrent workers never load a half-replaced artifact.
+    """
+
+    FORMAT_VERSION = 2
+    ARRAYS = ("roots", "feature", "threshold", "children", "value", "cover", "feature_importances")
+    # (row, tree) pairs walked together; bounds the working set for large batches
+    BLOCK_PAIRS = 65536
+    # Levels descended between dropping the pairs that reached a leaf
+    STEPS_PER_COMPACTION = 4
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict):
+        self.roots = arrays["roots"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"]
+        self.value = arrays["value"]
+        self.cover = arrays["cover"]
+        self.feature_importances_ = arrays["feature_importances"]
+        self.classes_ = np.asarray(meta["classes"])
+        self.n_features_in_ = meta["n_features"]
+        self.max_depth = meta["max_depth"]
+        # Input names in column order when the forest was trained on named features
+        self.feature_names = meta.get("feature_names")
+
+    @classmethod
+    def from_sklearn(cls, forest: RandomForestClassifier) -> "FlatForest":
+        """Flatten a fitted single-output RandomForestClassifier"""
+        roots, feature, threshold, children, value, cover = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            nodes = np.arange(tree.node_count)
+            pairs = np.empty((tree.node_count, 2), dtype=np.int64)
+            pairs[:, 0] = np.where(is_leaf, nodes, tree.children_left)
+            pairs[:, 1] = np.where(is_leaf, nodes, tree.children_right)
+            roots.append(offset)
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            children.append((pairs + offset).ravel())
+            # Normalized the same way DecisionTreeClassifier.predict_proba does
+            leaf_value = tree.value[:, 0, :]
+            normalizer = leaf_value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            value.append(leaf_value / normalizer)
+            cover.append(tree.weighted_n_node_samples)
+            offset += tree.node_count
+
+        arrays = {
+            "roots": np.asarray(roots, dtype=np.int64),
+            "feature": np.concatenate(feature).astype(np.int64),
+            "threshold": np.concatenate(threshold).astype(np.float64),
+            "children": np.concatenate(children),
+            "value": np.ascontiguousarray(np.concatenate(value), dtype=np.float64),
+            "cover": np.concatenate(cover).astype(np.float64),
+            "feature_importances": np.asarray(forest.feature_importances_, dtype=np.float64),
+        }
+        meta = {
+            "classes": forest.classes_.tolist(),
+            "n_features": int(forest.n_features_in_),
+            "max_depth": max(int(estimator.tree_.max_depth) for estimator in forest.estimators_),
+            "feature_names": getattr(forest, "feature_names", None),
+        }
+        return cls(arrays, meta)
+
+    @staticmethod
+    @contextmanager
+    def lock(path: str, exclusive: bool = True) -> Iterator[None]:
+        """Hold the artifact's lock file; exclusive for writers, shared for readers
+
+        Without a writable lock file (read-only model directory) nothing is
+        locked, since nothing can replace the artifact there either.
+        """
+        try:
+            lock_file = open(f"{path}.lock", "a")
+        except OSError:
+            yield
+            return
+        with lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self, path: str):
+        """Write the artifact directory, replacing any previous one
+
+        Processes that still map the previous files keep reading them until
+        they reload; the files are never modified in place.
+        """
+        with self.lock(path):
+            self._write(path)
+
+    def _write(self, path: str):
+        """save() for callers already holding the exclusive lock"""
+        staging = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name in self.ARRAYS:
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(self._array(name)))
+        meta = {
+            "format_version": self.FORMAT_VERSION,
+            "classes": self.classes_.tolist(),
+            "n_features": int(self.n_features_in_),
+            "max_depth": int(self.max_depth),
+            "feature_names": self.feature_names,
+        }
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        retired = f"{path}.old-{os.getpid()}"
+        if os.path.exists(path):
+            os.replace(path, retired)
+        os.replace(staging, path)
+        shutil.rmtree(retired, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "r") -> "FlatForest":
+        """Open a saved artifact; with mmap_mode only the .npy headers are read
+
+        Raises:
+            FileNotFoundError: if there is no artifact at path
+            ValueError: if the artifact was written in another format version
+        """
+        with cls.lock(path, exclusive=False):
+            return cls._read(path, mmap_mode)
+
+    @classmethod
+    def _read(cls, path: str, mmap_mode: Optional[str] = "r") -> "FlatForest":
+        """load() for callers already holding the lock"""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("format_version") != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported model artifact format {meta.get('format_version')} in {path}")
+        # Plain ndarray views of the maps skip np.memmap's per-operation subclass overhead
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode).view(np.ndarray)
+            for name in cls.ARRAYS
+        }
+        return cls(arrays, meta)
+
+    def _array(self, name: str) -> np.ndarray:
+        return self.feature_importances_ if name == "feature_importances" else getattr(self, name)
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def is_leaf(self) -> np.ndarray:
+        return self.children[0::2] == np.arange(len(self.feature))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self._array(name).nbytes for name in self.ARRAYS)
+
+    def max_deviation(self, forest: RandomForestClassifier, n_samples: int = 2000, seed: int = 0) -> float:
+        """Largest absolute predict_proba difference from forest on rows spread around its split thresholds"""
+        rng = np.random.default_rng(seed)
+        probe = np.empty((n_samples, self.n_features_in_))
+        internal = ~self.is_leaf
+        for column in range(self.n_features_in_):
+            splits = self.threshold[internal & (self.feature == column)]
+            low, high = (splits.min(), splits.max()) if splits.size else (-1.0, 1.0)
+            margin = 0.1 * (high - low) + 1e-6
+            probe[:, column] = rng.uniform(low - margin, high + margin, n_samples)
+        return float(np.abs(self.predict_proba(probe) - forest.predict_proba(probe)).max())
+
+    def apply(self, X: np.ndarray, roots: np.ndarray) -> np.ndarray:
+        """Leaf reached by every row in each of the given trees, shape (n_samples * len(roots),)"""
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+        leaves = np.tile(roots, n_samples)
+        # Offset of each pair's row in flat_X
+        row_offset = np.repeat(np.arange(n_samples) * n_features, len(roots))
+        pairs = np.arange(leaves.size)
+        node = leaves.copy()
+        while node.size:
+            for _ in range(self.STEPS_PER_COMPACTION):
+                # sklearn sends a row left when value <= threshold
+                go_right = flat_X[row_offset + self.feature[node]] > self.threshold[node]
+                node = self.children[2 * node + go_right]
+            leaves[pairs] = node
+            unfinished = self.children[2 * node] != node
+            pairs, node, row_offset = pairs[unfinished], node[unfinished], row_offset[unfinished]
+        return leaves
+
+    def _check_input(self, X: np.ndarray) -> np.ndarray:
+        # sklearn trees split on float32 features against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected array of shape (n_samples, {self.n_features_in_}), got {X.shape}")
+        return X
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Mean leaf class probabilities over all trees, shape (n_samples, n_classes)"""
+        X = self._check_input(X)
+        proba = np.zeros((X.shape[0], len(self.classes_)))
+        trees_per_block = max(1, self.BLOCK_PAIRS // max(1, X.shape[0]))
+        for start in range(0, self.n_estimators, trees_per_block):
+            roots = self.roots[start:start + trees_per_block]
+            leaves = self.apply(X, roots)
+            proba += self.value[leaves].reshape(X.shape[0], len(roots), len(self.classes_)).sum(axis=1)
+        proba /= self.n_estimators
+        return proba
+
+
+class TreeExplainer:
+    """Per-row feature contributions of a FlatForest as exact path-dependent Shapley values
+
+    Uses TreeSHAP's path-dependent value function: features outside a
+    coalition follow both branches of a split weighted by training cover.
+    Each leaf's share of that function only depends on which of its
+    (lower, upper] threshold boxes the row falls into, and its Shapley
+    values have a closed form in the cover fractions of the features whose
+    boxes match, so they are computed per (row, leaf) instead of by
+    recursion.
+
+    Rows are quantized to the forest's split thresholds first. Inputs in
+    the same cell take the same side of every split, so their predictions
+    and explanations are identical and a cell can be explained once per
+    batch and cached across batches. Trees with at most MAX_TREE_CELLS
+    cells of their own thresholds get a table from cell to contributions,
+    built up front, so most of the work is a lookup per (row, tree); the
+    rest are evaluated from their leaf boxes.
+    """
+
+    MAX_FEATURES = 12
+    MAX_TREE_CELLS = 32768
+    # Bound on all tables together (cells x n_features float64 each)
+    MAX_TABLE_CELLS = 1 << 21
+    # (row, leaf) pairs evaluated together when building tables and for untabulated trees
+    PAIR_CHUNK = 1 << 12
+
+    def __init__(self, forest: FlatForest, class_index: int = 1, cache_size: int = 100000):
+        n_features = forest.n_features_in_
+        if n_features > self.MAX_FEATURES:
+            raise ValueError(f"Exact explanations support up to {self.MAX_FEATURES} features, got {n_features}")
+        self.n_features = n_features
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        internal = ~forest.is_leaf
+        # Sorted distinct split thresholds per feature; a row's bin for a feature is how many lie below it
+        self.thresholds = [
+            np.unique(forest.threshold[internal & (forest.feature == f)]) for f in range(n_features)
+        ]
+        self._build_leaves(forest, class_index)
+        # Shapley weight of a coalition of k other features, k = 0..n_features (k = n_features never occurs)
+        self._shapley_weights = np.array(
+            [
+                math.factorial(k) * math.factorial(n_features - k - 1) / math.factorial(n_features)
+                for k in range(n_features)
+            ]
+            + [0.0]
+        )
+        self._build_tables()
+
+    def _build_leaves(self, forest: FlatForest, class_index: int):
+        """Threshold box, cover fraction per feature and value of every leaf"""
+        n_nodes, n_features = len(forest.feature), self.n_features
+        n_bins = np.array([len(t) for t in self.thresholds])
+        threshold_index = np.zeros(n_nodes, dtype=np.int64)
+        internal = ~forest.is_leaf
+        for f in range(n_features):
+            nodes = np.flatnonzero(internal & (forest.feature == f))
+            threshold_index[nodes] = np.searchsorted(self.thresholds[f], forest.threshold[nodes])
+
+        # Rows in a node's box have lower < bin <= upper; fraction is the share of cover kept by splits per feature
+        lower = np.full((n_nodes, n_features), -1, dtype=np.int64)
+        upper = np.tile(n_bins, (n_nodes, 1))
+        fraction = np.ones((n_nodes, n_features))
+        frontier = np.asarray(forest.roots)
+        while frontier.size:
+            frontier = frontier[internal[frontier]]
+            feature = forest.feature[frontier]
+            left, right = forest.children[2 * frontier], forest.children[2 * frontier + 1]
+            for child in (left, right):
+                lower[child], upper[child], fraction[child] = lower[frontier], upper[frontier], fraction[frontier]
+                fraction[child, feature] *= forest.cover[child] / forest.cover[frontier]
+            upper[left, feature] = np.minimum(upper[left, feature], threshold_index[frontier])
+            lower[right, feature] = np.maximum(lower[right, feature], threshold_index[frontier])
+            frontier = np.concatenate([left, right])
+
+        leaves = np.flatnonzero(forest.is_leaf)
+        self.leaf_tree = np.searchsorted(forest.roots, leaves, side="right") - 1
+        # Leaves of tree t are leaf_start[t]:leaf_start[t + 1]
+        self.leaf_start = np.searchsorted(self.leaf_tree, np.arange(forest.n_estimators + 1))
+        self.leaf_lower = lower[leaves]
+        self.leaf_upper = upper[leaves]
+        self.leaf_fraction = fraction[leaves]
+        # Contribution to the forest mean, which is what the Shapley values add up to
+        self.leaf_value = forest.value[leaves, class_index] / forest.n_estimators
+        self.n_trees = forest.n_estimators
+        self.expected_value = float((self.leaf_value * self.leaf_fraction.prod(axis=1)).sum())
+
+    def _leaf_contributions(self, bins: np.ndarray, leaves: np.ndarray) -> np.ndarray:
+        """Summed contributions of the given leaves for quantized rows, shape (n_rows, n_features)
+
+        A leaf's value function is its value times the cover fraction of every
+        feature outside the coalition, and zero if a feature inside falls
+        outside the leaf's box. With M the features whose box matches the row,
+        a feature i outside M gets -value * prod(fractions outside M) *
+        sum_r w(|M| - r) e_r(fractions in M), and a feature in M gets value *
+        prod(fractions outside M) * (1 - fraction_i) * sum_r w(|M| - 1 - r)
+        e_r(fractions in M without i), where e_r are elementary symmetric
+        polynomials and w the Shapley weights: O(n_features**2) per (row, leaf).
+        """
+        n_rows, n_features = len(bins), self.n_features
+        contributions = np.zeros((n_rows, n_features))
+        chunk_size = max(1, self.PAIR_CHUNK // max(n_rows, 1))
+        weights = self._shapley_weights
+        for start in range(0, len(leaves), chunk_size):
+            chunk = leaves[start:start + chunk_size]
+            inside = (self.leaf_lower[chunk] < bins[:, None, :]) & (bins[:, None, :] <= self.leaf_upper[chunk])
+            fraction = np.broadcast_to(self.leaf_fraction[chunk], inside.shape)
+            scale = self.leaf_value[chunk] * np.where(inside, 1.0, fraction).prod(axis=2)
+            matched_fraction = np.where(inside, fraction, 0.0)
+            n_matched = inside.sum(axis=2)
+
+            # esp[..., r] = e_r(fractions in M), built one feature at a time
+            esp = np.zeros(inside.shape[:2] + (n_features + 1,))
+            esp[..., 0] = 1.0
+            for f in range(n_features):
+                esp[..., 1:] = esp[..., 1:] + matched_fraction[..., f:f + 1] * esp[..., :-1]
+            k = n_matched[..., None] - np.arange(n_features + 1)
+            unmatched = (np.where(k >= 0, weights[np.clip(k, 0, n_features)], 0.0) * esp).sum(axis=2)
+
+            # e_r(fractions in M without i) for every i at once by dividing out (1 + fraction_i x)
+            without = np.ones_like(matched_fraction)
+            matched = np.zeros_like(matched_fraction)
+            for r in range(n_features):
+                if r:
+                    without = esp[..., r:r + 1] - matched_fraction * without
+                k = n_matched - 1 - r
+                matched += np.where(k >= 0, weights[np.clip(k, 0, n_features)], 0.0)[..., None] * without
+
+            shares = np.where(inside, (1.0 - fraction) * matched, -unmatched[..., None])
+            contributions += (scale[..., None] * shares).sum(axis=1)
+        return contributions
+
+    def _build_tables(self):
+        """Tabulate contributions per cell for trees with few enough cells"""
+        n_features = self.n_features
+        tables, tabulated = [], []
+        # Per feature, global bin -> offset of the tree's cell index, one row per tabulated tree
+        self._cell_steps = [[] for _ in range(n_features)]
+        offset = 0
+        for t in range(self.n_trees):
+            leaves = np.arange(self.leaf_start[t], self.leaf_start[t + 1])
+            # The tree's own threshold indices per feature, without the -1 / n_bins box sentinels
+            own = []
+            for f in range(n_features):
+                bounds = np.unique(np.concatenate([self.leaf_lower[leaves, f], self.leaf_upper[leaves, f]]))
+                own.append(bounds[(bounds >= 0) & (bounds < len(self.thresholds[f]))])
+            sizes = np.array([len(k) + 1 for k in own])
+            # Python ints: the product overflows int64 for deep trees over many features
+            n_cells = math.prod(sizes.tolist())
+            if n_cells > self.MAX_TREE_CELLS or offset + n_cells > self.MAX_TABLE_CELLS:
+                continue
+            strides = np.concatenate([[1], np.cumprod(sizes)[:-1]])
+            cells = np.arange(n_cells)
+            # Representative global bin of each local bin: the threshold index itself, or past the last one
+            representative = np.column_stack(
+                [
+                    np.append(own[f], len(self.thresholds[f]))[(cells // strides[f]) % sizes[f]]
+                    for f in range(n_features)
+                ]
+            )
+            tables.append(self._leaf_contributions(representative, leaves))
+            for f in range(n_features):
+                local = np.searchsorted(own[f], np.arange(len(self.thresholds[f]) + 1))
+                self._cell_steps[f].append(local * strides[f] + (offset if f == 0 else 0))
+            tabulated.append(t)
+            offset += n_cells
+
+        self._tables = np.concatenate(tables) if tables else np.zeros((0, n_features))
+        self._cell_steps = [
+            np.vstack(steps) if steps else np.zeros((0, len(self.thresholds[f]) + 1), dtype=np.int64)
+            for f, steps in enumerate(self._cell_steps)
+        ]
+        self._untabulated_leaves = np.flatnonzero(~np.isin(self.leaf_tree, tabulated))
+        self.tabulated_trees = len(tabulated)
+
+    def quantize(self, X: np.ndarray) -> np.ndarray:
+        """Bin of each value among its feature's split thresholds, shape (n_samples, n_features)"""
+        # Features are compared as float32, like the trees do
+        X = np.asarray(X, dtype=np.float32)
+        return np.column_stack(
+            [np.searchsorted(self.thresholds[f], X[:, f].astype(np.float64)) for f in range(self.n_features)]
+        )
+
+    def _compute(self, bins: np.ndarray) -> np.ndarray:
+        contributions = np.zeros((len(bins), self.n_features))
+        if self._tables.size:
+            cells = sum(self._cell_steps[f][:, bins[:, f]] for f in range(self.n_features))
+            # One tree at a time keeps the gathered rows in cache
+            for tree_cells in cells:
+                contributions += self._tables[tree_cells]
+        if self._untabulated_leaves.size:
+            contributions += self._leaf_contributions(bins, self._untabulated_leaves)
+        return contributions
+
+    def shap_values(self, X: np.ndarray) -> np.ndarray:
+        """Contributions of each feature to the class probability, shape (n_samples, n_features)
+
+        For every row, expected_value plus its contributions equals the
+        forest's predicted probability.
+        """
+        cells, inverse = np.unique(self.quantize(X), axis=0, return_inverse=True)
+        keys = [cell.tobytes() for cell in cells]
+        values = np.empty((len(cells), self.n_features))
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    values[i] = cached
+            self.hits += len(cells) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            values[missing] = self._compute(cells[missing])
+            if self.cache_size > 0:
+                with self._lock:
+                    for i in missing:
+                        self._cache[keys[i]] = values[i]
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        return values[inverse.reshape(-1)]
+
+    def get_stats(self) -> Dict:
+        return {
+            "tabulated_trees": self.tabulated_trees,
+            "trees": self.n_trees,
+            "cache_size": len(self._cache),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+        }
+
 
 class PredictiveModel:
     """ML model for equipment failure prediction"""
 
-    def __init__(self, model_version: str = "v1.0"):
+    # Largest predict_proba difference from sklearn accepted when exporting the flat artifact
+    PARITY_TOLERANCE = 1e-9
+    SENSOR_FEATURES = SENSOR_FIELDS
+    # Result for a reading that cannot be scored: an input is None, NaN or infinite, or scoring failed
+    UNSCORED = (0.0, 30, 0.0, {})
+
+    def __init__(
+        self,
+        model_version: str = "v1.0",
+        engine: str = "flat",
+        explanation_cache_size: int = 100000,
+        model_path: Optional[str] = None,
+        train_if_missing: bool = True,
+        flat_max_batch: int = 1000,
+    ):
+        if engine not in INFERENCE_ENGINES:
+            raise ValueError(f"Unknown inference engine {engine!r}, expected one of {INFERENCE_ENGINES}")
         self.model_version = model_version
+        self.engine = engine
+        self.explanation_cache_size = explanation_cache_size
+        # Above this many rows the flat engine hands batches to the unpickled forest (0 never does)
+        self.flat_max_batch = flat_max_batch
         self.classifier = None
+        # Unpickled forest for large flat-engine batches, loaded on the first one; False when unavailable
+        self._batch_forest: Union[RandomForestClassifier, bool, None] = None
+        self._batch_forest_lock = threading.Lock()
+        # Global importances sorted once per loaded model, copied into every result
+        self.feature_importance: Dict[str, float] = {}
+        # Built on the first explanation request for the loaded model
+        self._explainer: Optional[TreeExplainer] = None
         self.scaler = StandardScaler()
-        self.feature_names = [
-            "temperature",
-            "vibration",
-            "pressure",
-            "power_consumption",
-            "operating_hours",
-        ]
-        self.model_path = f"models/failure_predictor_{model_version}.pkl"
+        # Replaced by the loaded model's own names when it was trained on other features
+        self.feature_names = list(self.SENSOR_FEATURES)
+        self.train_if_missing = train_if_missing
+        self.model_path = model_path or f"models/failure_predictor_{model_version}.pkl"
+        # Flattened, memory-mappable copy of the pickled forest used for serving
+        self.artifact_path = os.path.splitext(self.model_path)[0]
         self.load_or_train_model()
 
     def load_or_train_model(self):
-        """Load existing model or train a new one"""
+        """Load the model for the configured engine, training a new one if none is saved
+
+        The flat engine maps the artifact directory and exports it from the
+        pickle when missing; the sklearn engine unpickles the forest.
+
+        Raises:
+            FileNotFoundError: if no model is saved and train_if_missing is False
+        """
+        if self.engine == "flat":
+            try:
+                self._set_classifier(FlatForest.load(self.artifact_path))
+                logger.info(f"Memory-mapped model from {self.artifact_path}")
+                return
+            except FileNotFoundError:
+                pass
+            except ValueError as e:
+                logger.warning(f"Rebuilding model artifact: {str(e)}")
+
         try:
-            self.classifier = joblib.load(self.model_path)
+            forest = joblib.load(self.model_path)
             logger.info(f"Loaded model from {self.model_path}")
         except FileNotFoundError:
+            if not self.train_if_missing:
+                raise
             logger.info("Training new model...")
             self._train_model()
+            return
+        self._use_forest(forest)
+
+    def _use_forest(self, forest: RandomForestClassifier):
+        """Serve a fitted forest with the configured engine
+
+        Workers exporting the same model take turns; a worker that finds an
+        artifact matching the forest already exported maps it instead.
+        """
+        if self.engine == "sklearn":
+            self._set_classifier(forest)
+            return
+
+        with FlatForest.lock(self.artifact_path):
+            try:
+                exported = FlatForest._read(self.artifact_path)
+                if exported.max_deviation(forest) <= self.PARITY_TOLERANCE:
+                    self._set_classifier(exported)
+                    logger.info(f"Memory-mapped model already exported to {self.artifact_path}")
+                    return
+            except (FileNotFoundError, ValueError):
+                pass
+
+            flat = FlatForest.from_sklearn(forest)
+            deviation = flat.max_deviation(forest)
+            if deviation > self.PARITY_TOLERANCE:
+                logger.error(
+                    f"Flat model deviates from sklearn by {deviation:.3g}; serving the unpickled forest instead"
+                )
+                self._set_classifier(forest)
+                return
+            flat._write(self.artifact_path)
+            self._set_classifier(FlatForest._read(self.artifact_path))
+        logger.info(f"Exported memory-mappable model to {self.artifact_path}")
+
+    def _set_classifier(self, classifier: Union[FlatForest, RandomForestClassifier]):
+        """Serve classifier and precompute the per-model constants used on every prediction"""
+        self.classifier = classifier
+        self._explainer = None
+        self._batch_forest = None
+        # Forests saved with a feature_names attribute (training_pipeline.py) name their inputs
+        self.feature_names = list(getattr(classifier, "feature_names", None) or self.SENSOR_FEATURES)
+        importances = {
+            name: float(importance)
+            for name, importance in zip(self.feature_names, classifier.feature_importances_)
+        }
+        self.feature_importance = dict(sorted(importances.items(), key=lambda x: x[1], reverse=True))
+
+    def _explain(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(class probabilities, failure-probability contributions) for a feature matrix"""
+        explainer = self._explainer
+        if explainer is None:
+            started = time.perf_counter()
+            forest = self.classifier
+            if not isinstance(forest, FlatForest):
+                forest = FlatForest.from_sklearn(forest)
+            explainer = TreeExplainer(forest, class_index=1, cache_size=self.explanation_cache_size)
+            self._explainer = explainer
+            logger.info(
+                f"Built explainer in {time.perf_counter() - started:.2f}s "
+                f"({explainer.tabulated_trees}/{explainer.n_trees} trees tabulated)"
+            )
+        return self.classifier.predict_proba(features), explainer.shap_values(features)
+
+    @property
+    def explainable(self) -> bool:
+        """Whether the model has few enough inputs for exact per-reading explanations"""
+        return len(self.feature_names) <= TreeExplainer.MAX_FEATURES
+
+    def missing_features(self, sensor_data: Dict[str, float]) -> List[str]:
+        """Inputs of the model absent from sensor_data or not finite, e.g. a sensor the reading lacks
+
+        predict and batch_predict score absent inputs as 0 and return
+        UNSCORED for None, NaN or infinite ones, so callers that must not
+        store either check first.
+        """
+        missing = []
+        for name in self.feature_names:
+            value = sensor_data.get(name)
+            try:
+                if value is None or not math.isfinite(value):
+                    missing.append(name)
+            except TypeError:
+                missing.append(name)
+        return missing
+
+    def get_explainer_stats(self) -> Optional[Dict]:
+        return self._explainer.get_stats() if self._explainer is not None else None
+
+    def _explanations(self, contributions: np.ndarray) -> List[Dict[str, float]]:
+        """Per row, feature -> contribution to the failure probability, largest effect first"""
+        order = np.argsort(-np.abs(contributions), axis=1, kind="stable")
+        names = np.asarray(self.feature_names, dtype=object)[order].tolist()
+        values = np.take_along_axis(contributions, order, axis=1).tolist()
+        return [dict(zip(row_names, row_values)) for row_names, row_values in zip(names, values)]
 
     def _train_model(self):
         """Train a new failure prediction model"""
@@ -51,130 +694,465 @@ class PredictiveModel:
             | (X[:, 3] > 1.3)
         ).astype(int)
 
-        self.classifier = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.classifier.fit(X, y)
+        forest = RandomForestClassifier(n_estimators=100, random_state=42)
+        forest.fit(X, y)
 
-        joblib.dump(self.classifier, self.model_path)
+        joblib.dump(forest, self.model_path)
         logger.info(f"Model trained and saved to {self.model_path}")
+        self._use_forest(forest)
 
     def predict(
-        self, sensor_data: Dict[str, float]
+        self, sensor_data: Dict[str, float], include_explanation: bool = False
     ) -> Tuple[float, int, float, Dict[str, float]]:
         """
         Predict failure probability and RUL for equipment
 
+        With include_explanation the last element holds this reading's
+        contribution of each feature to the failure probability (Shapley
+        values, see TreeExplainer) instead of the model's global feature
+        importances. sensor_data is looked up by feature_names, so it can
+        carry the FeatureStore features models trained on them need; absent
+        features count as 0, so callers check missing_features first. A
+        reading with a None, NaN or infinite input gets UNSCORED, as in
+        batch_predict. Models with more inputs than TreeExplainer explains
+        return the global importances instead.
+
         Returns:
             (failure_probability, rul_days, confidence_score, feature_importance)
         """
         try:
-            # Extract features in correct order
-            features = np.array(
-                [
-                    [
-                        sensor_data.get("temperature", 0),
-                        sensor_data.get("vibration", 0),
-                        sensor_data.get("pressure", 0),
-                        sensor_data.get("power_consumption", 0),
-                        sensor_data.get("operating_hours", 0),
-                    ]
-                ]
-            )
+            # Extract features in correct order; None becomes NaN
+            features = np.array([[sensor_data.get(name, 0) for name in self.feature_names]], dtype=float)
+            if not np.isfinite(features).all():
+                return self.UNSCORED
 
-            # Get failure probability
-            failure_prob = self.classifier.predict_proba(features)[0, 1]
+            # One forest evaluation gives the failure probability and confidence
+            if include_explanation and self.explainable:
+                probas, contributions = self._explain(features)
+                feature_importance = self._explanations(contributions)[0]
+            else:
+                probas = self.classifier.predict_proba(features)
+                feature_importance = dict(self.feature_importance)
+            failure_prob = probas[0, 1]
 
             # Calculate RUL based on failure probability
             rul_days = max(1, int(30 * (1 - failure_prob)))
 
-            # Calculate confidence score
-            confidence = float(np.max(self.classifier.predict_proba(features)))
-
-            # Get feature importance
-            feature_importance = self._get_feature_importance(features)
+            confidence = float(np.max(probas[0]))
 
             return failure_prob, rul_days, confidence, feature_importance
 
         except Exception as e:
             logger.error(f"Prediction error: {str(e)}")
-            return 0.0, 30, 0.0, {}
+            return self.UNSCORED
 
-    def _get_feature_importance(self, features: np.ndarray) -> Dict[str, float]:
-        """Calculate feature importance for the prediction"""
-        importances = self.classifier.feature_importances_
-        feature_importance = {}
+    def _batch_classifier(self, n_rows: int) -> Union[FlatForest, RandomForestClassifier]:
+        """Classifier for a batch of n_rows: the unpickled forest for large flat-engine batches
 
-        for name, importance in zip(self.feature_names, importances):
-            feature_importance[name] = float(importance)
+        Walking flat arrays with numpy beats sklearn up to about a thousand
+        rows, then falls behind its compiled traversal (3-5x slower from
+        10,000 rows), so larger batches are scored by the pickled forest the
+        artifact was exported from. It is loaded on the first such batch and
+        kept as a private copy in this process.
+        """
+        if not isinstance(self.classifier, FlatForest) or not 0 < self.flat_max_batch < n_rows:
+            return self.classifier
+        forest = self._batch_forest
+        if forest is None:
+            with self._batch_forest_lock:
+                forest = self._batch_forest
+                if forest is None:
+                    forest = self._load_batch_forest()
+                    self._batch_forest = forest
+        return forest or self.classifier
 
-        # Sort by importance
-        sorted_importance = dict(
-            sorted(feature_importance.items(), key=lambda x: x[1], reverse=True)
-        )
-        return sorted_importance
+    def _load_batch_forest(self) -> Union[RandomForestClassifier, bool]:
+        try:
+            forest = joblib.load(self.model_path)
+        except Exception as e:
+            logger.warning(
+                f"Scoring large batches with the flat engine, could not load {self.model_path}: {str(e)}"
+            )
+            return False
+        if getattr(forest, "n_features_in_", None) != self.classifier.n_features_in_:
+            logger.warning(
+                f"Scoring large batches with the flat engine, {self.model_path} does not match the artifact"
+            )
+            return False
+        logger.info(f"Loaded {self.model_path} for batches over {self.flat_max_batch} rows")
+        return forest
+
+    def _build_feature_matrix(
+        self, sensor_data_list: Union[List[Dict[str, float]], np.ndarray]
+    ) -> np.ndarray:
+        """Stack sensor dicts (or a 2-D array) into an (n_samples, n_features) matrix"""
+        n_features = len(self.feature_names)
+
+        if isinstance(sensor_data_list, np.ndarray):
+            features = np.asarray(sensor_data_list, dtype=float)
+            if features.ndim != 2 or features.shape[1] != n_features:
+                raise ValueError(
+                    f"Expected array of shape (n_samples, {n_features}), got {features.shape}"
+                )
+            return features
+
+        # Missing values (None) become NaN so the row can be flagged as unscoreable
+        return np.array(
+            [
+                [sensor_data.get(name, 0) for name in self.feature_names]
+                for sensor_data in sensor_data_list
+            ],
+            dtype=float,
+        ).reshape(-1, n_features)
 
     def batch_predict(
-        self, sensor_data_list: List[Dict[str, float]]
+        self,
+        sensor_data_list: Union[List[Dict[str, float]], np.ndarray],
+        include_explanation: bool = False,
     ) -> List[Tuple[float, int, float, Dict[str, float]]]:
-        """Batch prediction for multiple equipment"""
-        results = []
-        for sensor_data in sensor_data_list:
-            result = self.predict(sensor_data)
-            results.append(result)
+        """
+        Batch prediction for multiple equipment
+
+        Scores the whole batch with a single forest evaluation and derives RUL,
+        confidence and importances with array ops. Results match calling
+        predict() on each row: rows with a None, NaN or infinite input get
+        UNSCORED, and so does the whole batch if scoring fails.
+
+        Returns:
+            list of (failure_probability, rul_days, confidence_score, feature_importance)
+        """
+        try:
+            features = self._build_feature_matrix(sensor_data_list)
+        except Exception as e:
+            logger.error(f"Batch prediction error: {str(e)}")
+            return [self.UNSCORED for _ in range(len(sensor_data_list))]
+
+        n_samples = features.shape[0]
+        results = [self.UNSCORED for _ in range(n_samples)]
+        valid = np.isfinite(features).all(axis=1)
+        if not valid.any():
+            return results
+
+        include_explanation = include_explanation and self.explainable
+        try:
+            if include_explanation:
+                probas, contributions = self._explain(features[valid])
+                explanations = self._explanations(contributions)
+            else:
+                probas = self._batch_classifier(int(valid.sum())).predict_proba(features[valid])
+            failure_probs = probas[:, 1]
+            rul_days = np.maximum(1, (30 * (1 - failure_probs)).astype(int))
+            confidences = probas.max(axis=1)
+        except Exception as e:
+            logger.error(f"Batch prediction error: {str(e)}")
+            return results
+
+        for row, idx in enumerate(np.flatnonzero(valid)):
+            results[idx] = (
+                failure_probs[row],
+                int(rul_days[row]),
+                float(confidences[row]),
+                explanations[row] if include_explanation else dict(self.feature_importance),
+            )
         return results
 
 
 class AnomalyDetector:
-    """Detect anomalies in sensor data"""
+    """Per-equipment streaming anomaly detection against each machine's own baseline
+
+    Every equipment keeps, per sensor, a Welford running mean and variance
+    and a running median and MAD, all updated in O(1) per reading. The mean
+    and variance are exact over the first ``memory`` readings and then
+    weight recent readings like an exponential moving average, so baselines
+    follow slow drift. The median and MAD move a small step towards each
+    reading, scaled by the current MAD, which an outlier cannot drag
+    further than one step. A reading is scored before it joins its
+    baseline: a sensor's z-score is its distance from the median in robust
+    standard deviations (1.4826 * MAD). The severity is warning above
+    ``threshold`` and critical from twice ``threshold``, and the score is
+    the largest z divided by twice ``threshold``, capped at 1. Until an
+    equipment has MIN_READINGS readings, the fixed DEFAULT_LIMITS cutoffs
+    score it instead. Operating hours only ever increase and are not scored.
+
+    Slots are allocated as equipment appears, doubling up to
+    ``max_equipment``, after which the least recently seen equipment loses
+    its baseline. The baselines belong to one process, so with several
+    workers each one only learns from the readings it ingested. save() and
+    restore() keep them across restarts; restore() merges the files of
+    several workers.
+    """
+
+    FIELDS = ("temperature", "vibration", "pressure", "power_consumption")
+    # Cold-start cutoffs per field: (low, high, score added outside them)
+    DEFAULT_LIMITS = {
+        "temperature": (10.0, 80.0, (0.2, 0.3)),
+        "vibration": (-np.inf, 5.0, (0.0, 0.4)),
+        "pressure": (2.0, 15.0, (0.3, 0.3)),
+        "power_consumption": (-np.inf, 50.0, (0.0, 0.2)),
+    }
+    MIN_READINGS = 30
+    # Median and MAD step per reading, in robust standard deviations
+    ROBUST_RATE = 0.01
+    # A change of this fraction of the median never counts as more than one standard deviation
+    MIN_RELATIVE_SCALE = 0.01
+    MAD_TO_STD = 1.4826
+    # Per-slot state: name -> dtype; each holds one value per field except _count
+    STATE = {
+        "_count": np.int64,
+        "_mean": np.float64,
+        "_var": np.float64,
+        "_median": np.float64,
+        "_mad": np.float64,
+    }
+    INITIAL_SLOTS = 1024
 
-    def __init__(self, threshold: float = 2.0):
+    def __init__(self, threshold: float = 2.0, memory: int = 1000, max_equipment: int = 100000):
         self.threshold = threshold
+        self.memory = memory
+        self.max_equipment = max_equipment
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.capacity = 0
+        self._grow(min(self.INITIAL_SLOTS, max_equipment))
+
+        # Metrics
+        self.scored = 0
+        self.cold_start = 0
+        self.warnings = 0
+        self.criticals = 0
+        self.evictions = 0
+
+    def _grow(self, capacity: int):
+        for name, dtype in self.STATE.items():
+            shape = (capacity,) if name == "_count" else (capacity, len(self.FIELDS))
+            array = np.zeros(shape, dtype=dtype)
+            if self.capacity:
+                array[: self.capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self._free = list(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def _slot(self, equipment_id: str) -> int:
+        """Slot of equipment_id, claiming one (and evicting the least recent if full); caller holds _lock"""
+        slot = self._slots.get(equipment_id)
+        if slot is not None:
+            self._slots.move_to_end(equipment_id)
+            return slot
+        if not self._free and self.capacity < self.max_equipment:
+            self._grow(min(2 * self.capacity, self.max_equipment))
+        if self._free:
+            slot = self._free.pop()
+        else:
+            _, slot = self._slots.popitem(last=False)
+            self.evictions += 1
+        for name in self.STATE:
+            getattr(self, name)[slot] = 0
+        self._slots[equipment_id] = slot
+        return slot
 
     def detect_anomaly(self, sensor_data: Dict[str, float]) -> Tuple[float, str]:
         """
-        Detect anomalies in sensor readings
+        Score a reading against its equipment's baseline, then add it to the baseline
 
         Returns:
             (anomaly_score, severity)
         """
-        anomaly_score = 0.0
-        severity_factors = []
+        return self.batch_detect_anomaly([sensor_data])[0]
 
-        # Temperature anomaly
-        temp = sensor_data.get("temperature", 0)
-        if temp > 80:
-            anomaly_score += 0.3
-            severity_factors.append("High temperature")
-        elif temp < 10:
-            anomaly_score += 0.2
-            severity_factors.append("Low temperature")
-
-        # Vibration anomaly
-        vibration = sensor_data.get("vibration", 0)
-        if vibration > 5.0:
-            anomaly_score += 0.4
-            severity_factors.append("High vibration")
+    def batch_detect_anomaly(
+        self, sensor_data_list: List[Dict[str, float]]
+    ) -> List[Tuple[float, str]]:
+        """Score a batch of readings from any number of equipment in one vectorized pass
 
-        # Pressure anomaly
-        pressure = sensor_data.get("pressure", 0)
-        if pressure > 15 or pressure < 2:
-            anomaly_score += 0.3
-            severity_factors.append("Abnormal pressure")
+        Readings of the same equipment are scored and added in list order,
+        so a batch gives the same results as calling detect_anomaly per
+        reading.
+        """
+        scores, severities = self.detect_anomalies(sensor_data_list)
+        return list(zip(scores.tolist(), severities.tolist()))
 
-        # Power consumption anomaly
-        power = sensor_data.get("power_consumption", 0)
-        if power > 50:
-            anomaly_score += 0.2
-            severity_factors.append("High power consumption")
-
-        # Determine severity
-        if anomaly_score > 0.7:
-            severity = "critical"
-        elif anomaly_score > 0.4:
-            severity = "warning"
-        else:
-            severity = "normal"
+    def detect_anomalies(
+        self, readings: Readings, equipment_ids: Optional[List[str]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Array version of batch_detect_anomaly for arrays or column dicts (see sensor_array)
+
+        equipment_ids defaults to each sensor dict's equipment_id and is
+        required for arrays and column dicts. Missing sensors, and NaN, are
+        left out of the baselines.
+
+        Returns:
+            (anomaly_scores, severities), arrays of len(readings)
+
+        Raises:
+            ValueError: if equipment_ids are missing or do not match the readings
+        """
+        values = sensor_array(readings, self.FIELDS, missing=np.nan)
+        if equipment_ids is None:
+            if not isinstance(readings, list):
+                raise ValueError("equipment_ids are required for array readings")
+            equipment_ids = [str(reading.get("equipment_id", "")) for reading in readings]
+        if len(equipment_ids) != len(values):
+            raise ValueError(f"Got {len(equipment_ids)} equipment_ids for {len(values)} readings")
+        z = np.zeros(len(values))
+        warm = np.zeros(len(values), dtype=bool)
+
+        with self._lock:
+            slots = np.array([self._slot(equipment_id) for equipment_id in equipment_ids], dtype=np.int64)
+            # A slot appears at most once per round so the vectorized update never races with itself
+            occurrence = np.zeros(len(slots), dtype=np.int64)
+            seen: Dict[int, int] = {}
+            for position, slot in enumerate(slots.tolist()):
+                occurrence[position] = seen.get(slot, 0)
+                seen[slot] = occurrence[position] + 1
+            for round_ in range(int(occurrence.max()) + 1 if len(slots) else 0):
+                rows = np.flatnonzero(occurrence == round_)
+                z[rows] = self._z_scores(slots[rows], values[rows])
+                warm[rows] = self._count[slots[rows]] >= self.MIN_READINGS
+                self._add(slots[rows], values[rows])
+
+        scores = np.minimum(np.where(warm, z / (2 * self.threshold), self._default_scores(values)), 1.0)
+        severities = np.where(
+            warm,
+            np.select([z >= 2 * self.threshold, z > self.threshold], ["critical", "warning"], "normal"),
+            np.select([scores > 0.7, scores > 0.4], ["critical", "warning"], "normal"),
+        )
+        self.scored += len(values)
+        self.cold_start += int(np.count_nonzero(~warm))
+        self.warnings += int(np.count_nonzero(severities == "warning"))
+        self.criticals += int(np.count_nonzero(severities == "critical"))
+        return scores, severities
+
+    def _z_scores(self, slots: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Largest robust z-score per reading against its slot's baseline; missing sensors score 0"""
+        z = np.abs(values - self._median[slots]) / self._scale(slots)
+        return np.nan_to_num(z, nan=0.0).max(axis=1)
+
+    def _scale(self, slots: np.ndarray) -> np.ndarray:
+        return np.maximum(
+            self.MAD_TO_STD * self._mad[slots],
+            np.maximum(self.MIN_RELATIVE_SCALE * np.abs(self._median[slots]), 1e-9),
+        )
+
+    def _add(self, slots: np.ndarray, values: np.ndarray):
+        """Add one reading to each of the (distinct) slots' baselines; caller holds _lock"""
+        present = np.isfinite(values)
+        x = np.where(present, values, 0.0)
+        count = self._count[slots] + 1
+        n = np.minimum(count, self.memory)[:, None].astype(float)
+
+        mean, var = self._mean[slots], self._var[slots]
+        delta = x - mean
+        new_mean = mean + delta / n
+        new_var = var + (delta * (x - new_mean) - var) / n
+
+        # Until the baseline is warm, median and MAD follow the mean and standard deviation
+        warming = (count < self.MIN_READINGS)[:, None]
+        median, mad = self._median[slots], self._mad[slots]
+        step = self.ROBUST_RATE * self._scale(slots)
+        new_median = np.where(warming, new_mean, median + step * np.sign(x - median))
+        new_mad = np.where(
+            warming,
+            np.sqrt(new_var) / self.MAD_TO_STD,
+            np.maximum(mad + step / self.MAD_TO_STD * np.sign(np.abs(x - median) - mad), 0.0),
+        )
 
-        return min(1.0, anomaly_score), severity
+        self._mean[slots] = np.where(present, new_mean, mean)
+        self._var[slots] = np.where(present, new_var, var)
+        self._median[slots] = np.where(present, new_median, median)
+        self._mad[slots] = np.where(present, new_mad, mad)
+        self._count[slots] = count
+
+    def _default_scores(self, values: np.ndarray) -> np.ndarray:
+        """Fixed-cutoff scores used while an equipment's baseline is cold"""
+        scores = np.zeros(len(values))
+        for f, field in enumerate(self.FIELDS):
+            low, high, (low_score, high_score) = self.DEFAULT_LIMITS[field]
+            # Missing sensors count as 0, as the fixed rules always did
+            column = np.nan_to_num(values[:, f], nan=0.0)
+            scores += np.select([column > high, column < low], [high_score, low_score], 0.0)
+        return scores
+
+    def baseline(self, equipment_id: str) -> Optional[Dict]:
+        """Current baseline per sensor of an equipment and its reading count, or None if it has no readings"""
+        with self._lock:
+            slot = self._slots.get(equipment_id)
+            if slot is None:
+                return None
+            baseline = {
+                field: {
+                    "mean": float(self._mean[slot, f]),
+                    "std": float(np.sqrt(self._var[slot, f])),
+                    "median": float(self._median[slot, f]),
+                    "mad": float(self._mad[slot, f]),
+                }
+                for f, field in enumerate(self.FIELDS)
+            }
+            baseline["readings"] = int(self._count[slot])
+            return baseline
+
+    def save(self, path: str):
+        """Write all baselines to an .npz file atomically"""
+        with self._lock:
+            equipment_ids = list(self._slots)
+            slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(equipment_ids))
+            arrays = {name.lstrip("_"): getattr(self, name)[slots] for name in self.STATE}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        staging = f"{path}.tmp-{os.getpid()}.npz"
+        np.savez(staging, equipment_ids=np.array(equipment_ids, dtype=str), fields=np.array(self.FIELDS), **arrays)
+        os.replace(staging, path)
+
+    def restore(self, *paths: str) -> int:
+        """Replace the baselines with those saved at paths, oldest file first
+
+        Equipment saved in several files (by different workers) keeps the
+        baseline built from the most readings.
+
+        Returns:
+            number of equipment restored
+
+        Raises:
+            ValueError: if a file was saved with other sensor fields
+        """
+        saved_ids, parts = [], {name: [] for name in self.STATE}
+        for path in paths:
+            with np.load(path) as saved:
+                if tuple(saved["fields"].tolist()) != self.FIELDS:
+                    raise ValueError(f"Anomaly baselines in {path} cover {saved['fields'].tolist()}, not {self.FIELDS}")
+                saved_ids.extend(saved["equipment_ids"].tolist())
+                for name in self.STATE:
+                    parts[name].append(saved[name.lstrip("_")])
+        if not paths:
+            return 0
+        ids = np.array(saved_ids, dtype=str)
+        arrays = {name: np.concatenate(part) for name, part in parts.items()}
+        order = np.lexsort((-arrays["_count"], ids))
+        _, first = np.unique(ids[order], return_index=True)
+        # Files are saved least recent first, so the most recent max_equipment are kept
+        keep = np.sort(order[first])[-self.max_equipment:]
+        equipment_ids = ids[keep].tolist()
+        arrays = {name: array[keep] for name, array in arrays.items()}
+        with self._lock:
+            self._slots = OrderedDict()
+            self.capacity = 0
+            self._grow(min(max(self.INITIAL_SLOTS, len(equipment_ids)), self.max_equipment))
+            self._free = self._free[: self.capacity - len(equipment_ids)]
+            for name, array in arrays.items():
+                getattr(self, name)[: len(equipment_ids)] = array
+            self._slots.update(zip(equipment_ids, range(len(equipment_ids))))
+        return len(equipment_ids)
+
+    def get_stats(self) -> Dict:
+        return {
+            "equipment": len(self._slots),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "memory": self.memory,
+            "scored": self.scored,
+            "cold_start": self.cold_start,
+            "warnings": self.warnings,
+            "criticals": self.criticals,
+            "evictions": self.evictions,
+        }
 
     def get_recommended_action(self, severity: str) -> str:
         """Get recommended action based on anomaly severity"""
@@ -202,39 +1180,41 @@ class HealthScoreCalculator:
         """
         Calculate health score (0-100) based on sensor data
 
+        Missing sensors count as 0.
+
         Returns:
             health_score (0-100)
         """
         health_score = 100.0
 
         # Temperature impact
-        temp = sensor_data.get("temperature", 0)
+        temp = sensor_data.get("temperature") or 0
         if temp > 80:
             health_score -= 30 * self.weights["temperature"]
         elif temp > 60:
             health_score -= 15 * self.weights["temperature"]
 
         # Vibration impact
-        vibration = sensor_data.get("vibration", 0)
+        vibration = sensor_data.get("vibration") or 0
         if vibration > 5.0:
             health_score -= 40 * self.weights["vibration"]
         elif vibration > 3.0:
             health_score -= 20 * self.weights["vibration"]
 
         # Pressure impact
-        pressure = sensor_data.get("pressure", 0)
+        pressure = sensor_data.get("pressure") or 0
         if pressure > 15 or pressure < 2:
             health_score -= 25 * self.weights["pressure"]
         elif pressure > 12 or pressure < 3:
             health_score -= 10 * self.weights["pressure"]
 
         # Power consumption impact
-        power = sensor_data.get("power_consumption", 0)
+        power = sensor_data.get("power_consumption") or 0
         if power > 50:
             health_score -= 15 * self.weights["power_consumption"]
 
         # Operating hours impact (degradation over time)
-        hours = sensor_data.get("operating_hours", 0)
+        hours = sensor_data.get("operating_hours") or 0
         if hours > 10000:
             health_score -= 20 * self.weights["operating_hours"]
         elif hours > 5000:
@@ -242,6 +1222,34 @@ class HealthScoreCalculator:
 
         return max(0.0, min(100.0, health_score))
 
+    def calculate_health_scores(self, readings: Readings) -> np.ndarray:
+        """Array version of calculate_health_score for arrays, column dicts or sensor dicts (see sensor_array)
+
+        Applies the same deductions in the same order, so every score is
+        identical to calculate_health_score's.
+        """
+        temp, vibration, pressure, power, hours = sensor_array(readings).T
+        w = self.weights
+        health_score = np.full(len(temp), 100.0)
+        health_score -= np.select([temp > 80, temp > 60], [30 * w["temperature"], 15 * w["temperature"]], 0.0)
+        health_score -= np.select([vibration > 5.0, vibration > 3.0], [40 * w["vibration"], 20 * w["vibration"]], 0.0)
+        health_score -= np.select(
+            [(pressure > 15) | (pressure < 2), (pressure > 12) | (pressure < 3)],
+            [25 * w["pressure"], 10 * w["pressure"]],
+            0.0,
+        )
+        health_score -= np.where(power > 50, 15 * w["power_consumption"], 0.0)
+        health_score -= np.select(
+            [hours > 10000, hours > 5000], [20 * w["operating_hours"], 10 * w["operating_hours"]], 0.0
+        )
+        return np.clip(health_score, 0.0, 100.0)
+
+    def batch_calculate_health_score(
+        self, sensor_data_list: List[Dict[str, float]]
+    ) -> List[float]:
+        """Calculate health scores for a batch of sensor readings"""
+        return self.calculate_health_scores(sensor_data_list).tolist()
+
     def determine_status(self, health_score: float) -> str:
         """Determine equipment status based on health score"""
         if health_score >= 80:
@@ -252,3 +1260,10 @@ class HealthScoreCalculator:
             return "critical"
         else:
             return "down"
+
+    def determine_statuses(self, health_scores: np.ndarray) -> np.ndarray:
+        """Array version of determine_status"""
+        health_scores = np.asarray(health_scores, dtype=float)
+        return np.select(
+            [health_scores >= 80, health_scores >= 60, health_scores >= 30], ["healthy", "warning", "critical"], "down"
+        )
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ml_service import PredictiveModel
+from models import ModelRegistry
+from shadow_scoring import ShadowScorer
+
+logger = logging.getLogger(__name__)
+
+
+class ModelManager:
+    """Serves the failure model marked active in ModelRegistry and swaps versions without a restart
+
+    Request handlers read ``active`` once and use that model for the whole
+    request, so a swap only changes which model later requests get and
+    in-flight requests finish on the model they started with. A new version
+    is loaded and warmed in a worker thread before the swap. The model it
+    replaces stays loaded as a warm standby, so rolling back is a reference
+    swap. Every worker polls the registry and follows the active version;
+    activate() and rollback() update the registry and swap locally at once.
+
+    The registry can also mark one candidate version ``is_shadow``. Each
+    worker keeps it loaded next to the active model, and ``shadow`` scores a
+    sample of live readings with it off the request path (see ShadowScorer).
+    Activating the candidate promotes the already-warm model.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        default_version: str = "v1.0",
+        default_model_path: Optional[str] = None,
+        engine: str = "flat",
+        explanation_cache_size: int = 100000,
+        flat_max_batch: int = 1000,
+        poll_interval: float = 30.0,
+        shadow_sample_rate: float = 0.1,
+        shadow_flush_interval: float = 60.0,
+        shadow_max_pending: int = 64,
+    ):
+        self.session_factory = session_factory
+        self.default_version = default_version
+        self.default_model_path = default_model_path
+        self.engine = engine
+        self.explanation_cache_size = explanation_cache_size
+        self.flat_max_batch = flat_max_batch
+        self.poll_interval = poll_interval
+        self._worker: Optional[asyncio.Task] = None
+        self._swap_lock = asyncio.Lock()
+
+        # Serve the configured version until the registry has been read (warmed by start())
+        started = time.perf_counter()
+        self.active: PredictiveModel = self._load(
+            default_version, default_model_path, train_if_missing=True, warm=False
+        )
+        self.standby: Optional[PredictiveModel] = None
+        self.shadow = ShadowScorer(
+            session_factory,
+            sample_rate=shadow_sample_rate,
+            flush_interval=shadow_flush_interval,
+            max_pending=shadow_max_pending,
+        )
+
+        # Metrics
+        self.loads = 1
+        self.load_failures = 0
+        self.swaps = 0
+        self.rollbacks = 0
+        self.last_load_duration = time.perf_counter() - started
+        self.last_swap_duration = 0.0
+        self.last_swap_at: Optional[datetime] = None
+
+    def _load(
+        self, version: str, model_path: Optional[str], train_if_missing: bool = False, warm: bool = True
+    ) -> PredictiveModel:
+        """Load a version; warming scores one row with and without explanation before it serves"""
+        model = PredictiveModel(
+            model_version=version,
+            engine=self.engine,
+            explanation_cache_size=self.explanation_cache_size,
+            model_path=model_path,
+            train_if_missing=train_if_missing,
+            flat_max_batch=self.flat_max_batch,
+        )
+        if warm:
+            self._warm(model)
+        return model
+
+    @staticmethod
+    def _warm(model: PredictiveModel):
+        """Score one row with and without explanation, building the explainer; cheap once it is built"""
+        row = np.zeros((1, len(model.feature_names)))
+        model.batch_predict(row)
+        model.batch_predict(row, include_explanation=True)
+
+    async def start(self):
+        """Follow the registry's active version, registering the default version if none is active"""
+        try:
+            await self.sync(register_default=True)
+        except Exception as e:
+            logger.error(f"Model registry sync failed, serving {self.active.model_version}: {str(e)}")
+        # The startup model is loaded cold; build its explainer here rather than on the first request
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._warm, self.active)
+        if self.poll_interval > 0 and (self._worker is None or self._worker.done()):
+            self._worker = asyncio.create_task(self._run())
+            logger.info("Model registry polling started")
+        await self.shadow.start()
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.shadow.stop()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Model registry sync error: {str(e)}")
+
+    async def sync(self, register_default: bool = False):
+        """Follow the registry's active and shadow versions where they differ from the loaded ones"""
+        async with self._swap_lock:
+            async with self.session_factory() as db:
+                entries = (
+                    await db.scalars(
+                        select(ModelRegistry).where(
+                            or_(ModelRegistry.is_active.is_(True), ModelRegistry.is_shadow.is_(True))
+                        )
+                    )
+                ).all()
+            entry = next((e for e in entries if e.is_active), None)
+            if entry is None:
+                if register_default:
+                    await self._register_default()
+            elif entry.model_version != self.active.model_version:
+                await self._swap_to(entry.model_version, entry.model_path)
+
+            candidate = next((e for e in entries if e.is_shadow and not e.is_active), None)
+            if candidate is None:
+                if self.shadow.candidate is not None:
+                    logger.info(f"Stopped shadow scoring {self.shadow.candidate_version}")
+                self.shadow.candidate = None
+            elif candidate.model_version != self.shadow.candidate_version:
+                try:
+                    self.shadow.candidate = await self._load_version(candidate.model_version, candidate.model_path)
+                    logger.info(f"Shadow scoring {candidate.model_version} against {self.active.model_version}")
+                except Exception as e:
+                    logger.error(f"Could not load shadow model {candidate.model_version}: {str(e)}")
+
+    async def _register_default(self):
+        async with self.session_factory() as db:
+            existing = await db.scalar(
+                select(ModelRegistry).where(ModelRegistry.model_version == self.default_version)
+            )
+            if existing is None:
+                db.add(
+                    ModelRegistry(
+                        model_version=self.default_version,
+                        model_type="RandomForestClassifier",
+                        model_path=self.active.model_path,
+                        is_active=True,
+                    )
+                )
+            else:
+                existing.is_active = True
+            try:
+                await db.commit()
+                logger.info(f"Registered {self.default_version} as the active model")
+            except IntegrityError:
+                # Another worker registered it first
+                await db.rollback()
+
+    async def _load_version(self, version: str, model_path: Optional[str]) -> PredictiveModel:
+        """The standby or shadow candidate if either is version, else version loaded in a worker thread"""
+        for model in (self.standby, self.shadow.candidate):
+            if model is not None and model.model_version == version:
+                return model
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            model = await loop.run_in_executor(None, self._load, version, model_path)
+        except Exception:
+            self.load_failures += 1
+            raise
+        self.loads += 1
+        self.last_load_duration = time.perf_counter() - started
+        return model
+
+    async def _swap_to(self, version: str, model_path: Optional[str]):
+        """Serve version; caller holds _swap_lock"""
+        started = time.perf_counter()
+        model = await self._load_version(version, model_path)
+        self.standby, self.active = self.active, model
+        if self.shadow.candidate_version == version:
+            # Promoted: nothing left to compare against
+            self.shadow.candidate = None
+        self.swaps += 1
+        self.last_swap_duration = time.perf_counter() - started
+        self.last_swap_at = datetime.utcnow()
+        logger.info(
+            f"Serving model {version} (was {self.standby.model_version}) "
+            f"after {self.last_swap_duration * 1000:.1f}ms"
+        )
+
+    async def _mark_active(self, version: str):
+        async with self.session_factory() as db:
+            await db.execute(update(ModelRegistry).values(is_active=ModelRegistry.model_version == version))
+            await db.execute(
+                update(ModelRegistry).where(ModelRegistry.model_version == version).values(is_shadow=False)
+            )
+            await db.commit()
+
+    async def activate(self, version: str):
+        """Serve a registered version and mark it active in the registry
+
+        The standby is reused when it is that version; otherwise the model is
+        loaded and warmed first, and a failed load leaves the current model
+        serving. Activating the shadow candidate promotes it and ends shadow
+        scoring.
+
+        Raises:
+            LookupError: if the version is not in the registry
+            FileNotFoundError: if the registered model file does not exist
+        """
+        async with self._swap_lock:
+            async with self.session_factory() as db:
+                entry = await db.scalar(select(ModelRegistry).where(ModelRegistry.model_version == version))
+            if entry is None:
+                raise LookupError(f"Model version {version} is not registered")
+            if version != self.active.model_version:
+                await self._swap_to(entry.model_version, entry.model_path)
+            await self._mark_active(version)
+
+    async def rollback(self):
+        """Serve the warm standby (the previously active version) again
+
+        Raises:
+            LookupError: if there is no standby model
+        """
+        async with self._swap_lock:
+            if self.standby is None:
+                raise LookupError("No previous model version is loaded")
+            version = self.standby.model_version
+            await self._swap_to(version, self.standby.model_path)
+            await self._mark_active(version)
+            self.rollbacks += 1
+
+    async def set_shadow(self, version: str):
+        """Load a registered version as the shadow candidate and mark it in the registry
+
+        Raises:
+            LookupError: if the version is not in the registry
+            ValueError: if the version is the one being served
+            FileNotFoundError: if the registered model file does not exist
+        """
+        async with self._swap_lock:
+            async with self.session_factory() as db:
+                entry = await db.scalar(select(ModelRegistry).where(ModelRegistry.model_version == version))
+            if entry is None:
+                raise LookupError(f"Model version {version} is not registered")
+            if version == self.active.model_version:
+                raise ValueError(f"Model version {version} is already active")
+            self.shadow.candidate = await self._load_version(entry.model_version, entry.model_path)
+            async with self.session_factory() as db:
+                await db.execute(update(ModelRegistry).values(is_shadow=ModelRegistry.model_version == version))
+                await db.commit()
+            logger.info(f"Shadow scoring {version} against {self.active.model_version}")
+
+    async def clear_shadow(self):
+        """Stop shadow scoring here and, through the registry, on every worker"""
+        async with self._swap_lock:
+            self.shadow.candidate = None
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(ModelRegistry).where(ModelRegistry.is_shadow.is_(True)).values(is_shadow=False)
+                )
+                await db.commit()
+
+    def get_stats(self) -> Dict:
+        return {
+            "active_version": self.active.model_version,
+            "standby_version": self.standby.model_version if self.standby is not None else None,
+            "engine": self.engine,
+            "polling": self._worker is not None and not self._worker.done(),
+            "loads": self.loads,
+            "load_failures": self.load_failures,
+            "swaps": self.swaps,
+            "rollbacks": self.rollbacks,
+            "last_load_duration_ms": self.last_load_duration * 1000,
+            # From the swap decision until the new model served requests, including any load
+            "last_swap_duration_ms": self.last_swap_duration * 1000,
+            "last_swap_at": self.last_swap_at.isoformat() if self.last_swap_at else None,
+            "explainer": self.active.get_explainer_stats(),
+            "shadow": self.shadow.get_stats(),
+        }
@@ -1,10 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, Enum, ForeignKey, JSON
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, Enum, ForeignKey, JSON, Index, false
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
 
-Base = declarative_base()
+from database import Base
 
 
 class EquipmentStatus(str, enum.Enum):
@@ -55,11 +54,83 @@ class SensorReading(Base):
     operating_hours = Column(Float)
     anomaly_score = Column(Float, default=0.0)
     raw_data = Column(JSON)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    # Partition key on MySQL (daily RANGE partitions, see partitions.py)
+    timestamp = Column(DateTime, nullable=False, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     equipment = relationship("Equipment", back_populates="sensor_readings")
 
+    __table_args__ = (
+        Index("ix_sensor_readings_equipment_timestamp", "equipment_id", "timestamp"),
+        Index("ix_sensor_readings_timestamp", "timestamp"),
+    )
+
+
+class SensorRollup(Base):
+    """Per-equipment sensor aggregates over fixed time buckets ("1m" or "1h")"""
+
+    __tablename__ = "sensor_rollups"
+
+    equipment_id = Column(String(50), ForeignKey("equipment.equipment_id"), primary_key=True)
+    resolution = Column(String(8), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    sample_count = Column(Integer, nullable=False)
+
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    temperature_mean = Column(Float)
+    temperature_std = Column(Float)
+    vibration_min = Column(Float)
+    vibration_max = Column(Float)
+    vibration_mean = Column(Float)
+    vibration_std = Column(Float)
+    pressure_min = Column(Float)
+    pressure_max = Column(Float)
+    pressure_mean = Column(Float)
+    pressure_std = Column(Float)
+    power_consumption_min = Column(Float)
+    power_consumption_max = Column(Float)
+    power_consumption_mean = Column(Float)
+    power_consumption_std = Column(Float)
+    operating_hours_min = Column(Float)
+    operating_hours_max = Column(Float)
+    operating_hours_mean = Column(Float)
+    operating_hours_std = Column(Float)
+    # Readings with each sensor, merged into coarser buckets; NULL on rows written before 0006
+    temperature_count = Column(Integer)
+    vibration_count = Column(Integer)
+    pressure_count = Column(Integer)
+    power_consumption_count = Column(Integer)
+    operating_hours_count = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_sensor_rollups_resolution_bucket", "resolution", "bucket_start"),
+    )
+
+
+class RollupWatermark(Base):
+    """Raw readings before processed_until have been rolled up at this resolution"""
+
+    __tablename__ = "rollup_watermarks"
+
+    resolution = Column(String(8), primary_key=True)
+    processed_until = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class RollupLateBucket(Base):
+    """A minute that received readings after it may already have been rolled up
+
+    marks counts the readings recorded since the rollup job last read the
+    row, so the job only clears rows that did not change meanwhile.
+    """
+
+    __tablename__ = "rollup_late_buckets"
+
+    equipment_id = Column(String(50), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    marks = Column(Integer, nullable=False, default=1)
+
 
 class Prediction(Base):
     __tablename__ = "predictions"
@@ -78,6 +149,41 @@ class Prediction(Base):
 
     equipment = relationship("Equipment", back_populates="predictions")
 
+    __table_args__ = (
+        Index("ix_predictions_equipment_timestamp", "equipment_id", "prediction_timestamp"),
+    )
+
+
+class EquipmentLatestState(Base):
+    """Current state per equipment, maintained on ingest so reads are a primary-key lookup"""
+
+    __tablename__ = "equipment_latest_state"
+
+    equipment_id = Column(String(50), ForeignKey("equipment.equipment_id"), primary_key=True)
+    status = Column(Enum(EquipmentStatus))
+    health_score = Column(Float)
+
+    # Latest sensor reading
+    temperature = Column(Float)
+    vibration = Column(Float)
+    pressure = Column(Float)
+    power_consumption = Column(Float)
+    operating_hours = Column(Float)
+    anomaly_score = Column(Float)
+    reading_timestamp = Column(DateTime)
+
+    # Latest prediction
+    prediction_id = Column(Integer)
+    failure_probability = Column(Float)
+    rul_days = Column(Integer)
+    expected_failure_date = Column(DateTime)
+    confidence_score = Column(Float)
+    feature_importance = Column(JSON)
+    model_version = Column(String(50))
+    prediction_timestamp = Column(DateTime)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 class MaintenanceEvent(Base):
     __tablename__ = "maintenance_events"
@@ -100,6 +206,11 @@ class MaintenanceEvent(Base):
 
     equipment = relationship("Equipment", back_populates="maintenance_events")
 
+    __table_args__ = (
+        Index("ix_maintenance_events_scheduled_date", "scheduled_date"),
+        Index("ix_maintenance_events_equipment_scheduled", "equipment_id", "scheduled_date"),
+    )
+
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
@@ -114,6 +225,10 @@ class AuditLog(Base):
     ip_address = Column(String(50))
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_audit_logs_equipment_timestamp", "equipment_id", "timestamp"),
+    )
+
 
 class ModelRegistry(Base):
     __tablename__ = "model_registry"
@@ -130,5 +245,52 @@ class ModelRegistry(Base):
     f1_score = Column(Float)
     model_path = Column(String(500))
     is_active = Column(Boolean, default=False)
+    # Candidate scored alongside the active version on a sample of live readings
+    is_shadow = Column(Boolean, default=False, nullable=False, server_default=false())
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ShadowComparison(Base):
+    """How a shadow candidate compared with the active model on the readings sampled in one window"""
+
+    __tablename__ = "shadow_comparisons"
+
+    id = Column(Integer, primary_key=True)
+    active_version = Column(String(50), nullable=False)
+    candidate_version = Column(String(50), nullable=False)
+    window_start = Column(DateTime, nullable=False)
+    window_end = Column(DateTime, nullable=False)
+    samples = Column(Integer, nullable=False)
+    # Readings on opposite sides of a 0.5 failure probability
+    label_flips = Column(Integer, nullable=False)
+    mean_abs_diff = Column(Float)
+    max_abs_diff = Column(Float)
+    mean_rul_abs_diff = Column(Float)
+    diff_histogram = Column(JSON)
+    active_latency_histogram = Column(JSON)
+    candidate_latency_histogram = Column(JSON)
+    candidate_errors = Column(Integer, default=0)
+    # Sampled readings skipped because the shadow scorer was saturated
+    dropped = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index("ix_shadow_comparisons_candidate_window", "candidate_version", "window_start"),
+    )
+
+
+class BackfillJob(Base):
+    """Progress of a backfill.py re-scoring run, committed with each chunk it writes"""
+
+    __tablename__ = "backfill_jobs"
+
+    job = Column(String(100), primary_key=True)
+    # Arguments the job was started with; resuming requires the same ones
+    params = Column(JSON)
+    model_version = Column(String(50))
+    # Readings with a higher id are not yet written
+    last_reading_id = Column(Integer, nullable=False, default=0)
+    rows_processed = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime)
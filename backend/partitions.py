@@ -0,0 +1,99 @@
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Tables partitioned by RANGE (TO_DAYS(timestamp)) on MySQL
+PARTITIONED_TABLES = ("sensor_readings",)
+
+# Offset between TO_DAYS() and date.toordinal()
+TO_DAYS_OFFSET = 365
+
+
+def to_days(day: date) -> int:
+    """MySQL TO_DAYS() for a date"""
+    return day.toordinal() + TO_DAYS_OFFSET
+
+
+def partition_name(day: date) -> str:
+    return f"p{day:%Y%m%d}"
+
+
+def initial_partitions_sql(first_day: date) -> str:
+    """PARTITION BY clause with one partition for all history before first_day and a catch-all"""
+    return (
+        "PARTITION BY RANGE (TO_DAYS(timestamp)) ("
+        f"PARTITION p_history VALUES LESS THAN ({to_days(first_day)}), "
+        "PARTITION pmax VALUES LESS THAN MAXVALUE)"
+    )
+
+
+async def list_partitions(db: AsyncSession, table: str) -> List[Tuple[str, str]]:
+    """(name, upper bound expression) of a table's partitions in order; empty if unpartitioned"""
+    result = await db.execute(
+        text(
+            "SELECT partition_name, partition_description FROM information_schema.partitions "
+            "WHERE table_schema = DATABASE() AND table_name = :table AND partition_name IS NOT NULL "
+            "ORDER BY partition_ordinal_position"
+        ),
+        {"table": table},
+    )
+    return [(row[0], row[1]) for row in result]
+
+
+async def ensure_future_partitions(db: AsyncSession, table: str, days_ahead: int, today: date) -> int:
+    """Split daily partitions off pmax so rows for the next days_ahead days never land in it
+
+    pmax is expected to be empty when this runs regularly, so the
+    REORGANIZE is a metadata-only operation.
+
+    Returns:
+        number of partitions created
+    """
+    partitions = await list_partitions(db, table)
+    if not partitions or partitions[-1][0] != "pmax":
+        return 0
+
+    bounds = [int(description) for name, description in partitions if name != "pmax"]
+    next_day = date.fromordinal(max(bounds) - TO_DAYS_OFFSET) if bounds else today
+    last_day = today + timedelta(days=days_ahead)
+
+    new_partitions = []
+    while next_day <= last_day:
+        upper = next_day + timedelta(days=1)
+        new_partitions.append(f"PARTITION {partition_name(next_day)} VALUES LESS THAN ({to_days(upper)})")
+        next_day = upper
+    if not new_partitions:
+        return 0
+
+    await db.execute(
+        text(
+            f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ("
+            + ", ".join(new_partitions)
+            + ", PARTITION pmax VALUES LESS THAN MAXVALUE)"
+        )
+    )
+    logger.info(f"Created {len(new_partitions)} partitions on {table}")
+    return len(new_partitions)
+
+
+async def drop_partitions_before(db: AsyncSession, table: str, cutoff: datetime) -> List[str]:
+    """Drop partitions whose rows are all older than cutoff
+
+    Returns:
+        names of the dropped partitions
+    """
+    cutoff_days = to_days(cutoff.date())
+    expired = [
+        name
+        for name, description in await list_partitions(db, table)
+        if name != "pmax" and int(description) <= cutoff_days
+    ]
+    if expired:
+        await db.execute(text(f"ALTER TABLE {table} DROP PARTITION {', '.join(expired)}"))
+        logger.info(f"Dropped expired partitions {', '.join(expired)} from {table}")
+    return expired
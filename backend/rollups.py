@@ -0,0 +1,790 @@
+import argparse
+import asyncio
+import bisect
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import Select, and_, bindparam, delete, func, insert, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+
+from database import async_advisory_lock
+from models import RollupLateBucket, RollupWatermark, SensorReading, SensorRollup
+from partitions import drop_partitions_before, ensure_future_partitions, list_partitions
+
+logger = logging.getLogger(__name__)
+
+# Bucket width in seconds per rollup resolution
+RESOLUTIONS = {"1m": 60, "1h": 3600}
+
+# Each resolution is aggregated from raw readings ("1m") or from finer rollups
+SOURCE_RESOLUTIONS = {"1h": "1m"}
+
+# Source rows are rolled up in windows this long, each written in one transaction (multiples of the bucket width)
+WINDOW_SECONDS = {"1m": 3600, "1h": 86400}
+
+SENSOR_FIELDS = ("temperature", "vibration", "pressure", "power_consumption", "operating_hours")
+STATS = ("min", "max", "mean", "std")
+# Per-sensor rollup columns merged into coarser buckets, in the order merge_rollups reads them
+MERGED_STATS = ("count",) + STATS
+
+# Upper bound on raw points returned by a history query
+MAX_RAW_POINTS = 10000
+
+EPOCH = datetime(1970, 1, 1)
+
+# Database-wide lock held by the worker running the job, so only one worker rolls up at a time
+ROLLUP_LOCK = "fleetvision_rollups"
+
+
+def floor_time(timestamp: datetime, seconds: int) -> datetime:
+    """Start of the bucket of the given width containing timestamp"""
+    elapsed = int((timestamp - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=elapsed - elapsed % seconds)
+
+
+def _naive_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _mark_statement(dialect_name: str):
+    """Insert rollup_late_buckets rows, adding to marks on conflict"""
+    table = RollupLateBucket.__table__
+    if dialect_name in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+        stmt = dialect_insert(table)
+        return stmt.on_duplicate_key_update(marks=table.c.marks + 1)
+
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=["equipment_id", "bucket_start"], set_={"marks": table.c.marks + 1}
+    )
+
+
+def _bucket_rows(
+    resolution: str,
+    names: np.ndarray,
+    codes: np.ndarray,
+    buckets: np.ndarray,
+    starts: np.ndarray,
+    sample_counts: np.ndarray,
+    counts: np.ndarray,
+    stats: Dict[str, np.ndarray],
+) -> List[dict]:
+    """sensor_rollups rows from per-group arrays; groups start at starts in (codes, buckets) order"""
+    seconds = RESOLUTIONS[resolution]
+    rollups = []
+    for group, start in enumerate(starts.tolist()):
+        rollup = {
+            "equipment_id": names[codes[start]],
+            "resolution": resolution,
+            "bucket_start": EPOCH + timedelta(seconds=int(buckets[start]) * seconds),
+            "sample_count": int(sample_counts[group]),
+        }
+        for index, field in enumerate(SENSOR_FIELDS):
+            count = int(counts[group, index])
+            rollup[f"{field}_count"] = count
+            for name in STATS:
+                rollup[f"{field}_{name}"] = float(stats[name][group, index]) if count else None
+        rollups.append(rollup)
+    return rollups
+
+
+def _groups(equipment_ids: Sequence[str], timestamps: Sequence[datetime], seconds: int):
+    """(names, codes, buckets, order, starts) grouping rows by equipment and bucket"""
+    names, codes = np.unique(np.array(equipment_ids, dtype=object), return_inverse=True)
+    buckets = np.array(timestamps, dtype="datetime64[s]").astype(np.int64) // seconds
+    order = np.lexsort((buckets, codes))
+    codes, buckets = codes[order], buckets[order]
+    starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1])])
+    return names, codes, buckets, order, starts
+
+
+def compute_rollups(rows: Sequence[tuple], resolution: str) -> List[dict]:
+    """Aggregate raw (equipment_id, timestamp, *SENSOR_FIELDS) rows into sensor_rollups rows
+
+    Missing sensor values are ignored per sensor; std is the population
+    standard deviation of the bucket.
+    """
+    if not rows:
+        return []
+    equipment_ids, timestamps, *columns = zip(*rows)
+    names, codes, buckets, order, starts = _groups(equipment_ids, timestamps, RESOLUTIONS[resolution])
+    values = np.array(columns, dtype=float).T[order]
+    sample_counts = np.diff(np.r_[starts, len(order)])
+
+    present = ~np.isnan(values)
+    counts = np.add.reduceat(present.astype(np.int64), starts, axis=0)
+    filled = np.where(present, values, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.add.reduceat(filled, starts, axis=0) / counts
+        # Two-pass variance; one-pass sum of squares loses precision on large readings like operating_hours
+        deviations = np.where(present, values - np.repeat(means, sample_counts, axis=0), 0.0)
+        stds = np.sqrt(np.add.reduceat(deviations * deviations, starts, axis=0) / counts)
+        mins = np.fmin.reduceat(values, starts, axis=0)
+        maxs = np.fmax.reduceat(values, starts, axis=0)
+
+    stats = {"min": mins, "max": maxs, "mean": means, "std": stds}
+    return _bucket_rows(resolution, names, codes, buckets, starts, sample_counts, counts, stats)
+
+
+def merge_rollups(rows: Sequence[tuple], resolution: str) -> List[dict]:
+    """Aggregate finer (equipment_id, bucket_start, sample_count, *MERGED_COLUMNS) rollups into coarser ones
+
+    Counts add up, means are count-weighted and variances add each part's
+    variance to its mean's squared distance from the merged mean, so the
+    result equals aggregating the raw readings. Rows written before
+    per-sensor counts were stored count sample_count for every sensor
+    with a mean.
+    """
+    if not rows:
+        return []
+    equipment_ids, bucket_starts, sample_counts, *columns = zip(*rows)
+    names, codes, buckets, order, starts = _groups(equipment_ids, bucket_starts, RESOLUTIONS[resolution])
+    sample_counts = np.array(sample_counts, dtype=np.int64)[order]
+    # (rows, sensors, MERGED_STATS)
+    parts = np.array(columns, dtype=float).T[order].reshape(len(order), len(SENSOR_FIELDS), len(MERGED_STATS))
+    part_counts, part_mins, part_maxs, part_means, part_stds = np.moveaxis(parts, 2, 0)
+
+    present = ~np.isnan(part_means)
+    part_counts = np.where(present, np.where(np.isnan(part_counts), sample_counts[:, None], part_counts), 0.0)
+    counts = np.add.reduceat(part_counts, starts, axis=0)
+    group_sizes = np.diff(np.r_[starts, len(order)])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.add.reduceat(np.where(present, part_counts * part_means, 0.0), starts, axis=0) / counts
+        offsets = part_means - np.repeat(means, group_sizes, axis=0)
+        squares = np.where(present, part_counts * (part_stds * part_stds + offsets * offsets), 0.0)
+        stds = np.sqrt(np.add.reduceat(squares, starts, axis=0) / counts)
+        mins = np.fmin.reduceat(part_mins, starts, axis=0)
+        maxs = np.fmax.reduceat(part_maxs, starts, axis=0)
+
+    stats = {"min": mins, "max": maxs, "mean": means, "std": stds}
+    return _bucket_rows(
+        resolution,
+        names,
+        codes,
+        buckets,
+        starts,
+        np.add.reduceat(sample_counts, starts),
+        counts.astype(np.int64),
+        stats,
+    )
+
+
+class _Source(NamedTuple):
+    """Rows a resolution is aggregated from, read in time order"""
+
+    query: Select
+    time: ColumnElement
+    # Unique together, time first; rows are paged on them
+    order: Tuple[ColumnElement, ColumnElement]
+    equipment_id: ColumnElement
+    aggregate: Callable[[Sequence[tuple], str], List[dict]]
+
+
+def _source(resolution: str) -> _Source:
+    """Raw readings for 1-minute buckets, 1-minute rollups for 1-hour ones"""
+    if resolution == "1m":
+        return _Source(
+            select(
+                SensorReading.equipment_id,
+                SensorReading.timestamp,
+                *(getattr(SensorReading, field) for field in SENSOR_FIELDS),
+            ),
+            SensorReading.timestamp,
+            (SensorReading.timestamp, SensorReading.id),
+            SensorReading.equipment_id,
+            compute_rollups,
+        )
+    return _Source(
+        select(
+            SensorRollup.equipment_id,
+            SensorRollup.bucket_start,
+            SensorRollup.sample_count,
+            *(getattr(SensorRollup, f"{field}_{stat}") for field in SENSOR_FIELDS for stat in MERGED_STATS),
+        ).where(SensorRollup.resolution == SOURCE_RESOLUTIONS[resolution]),
+        SensorRollup.bucket_start,
+        (SensorRollup.bucket_start, SensorRollup.equipment_id),
+        SensorRollup.equipment_id,
+        merge_rollups,
+    )
+
+
+async def fetch_history(
+    db: AsyncSession, equipment_id: str, start: datetime, end: datetime, resolution: str
+) -> List[dict]:
+    """Sensor history for one equipment in [start, end) as points with per-sensor stats
+
+    Raw readings are returned as single-sample points (min = max = mean).
+    """
+    if resolution == "raw":
+        result = await db.execute(
+            select(SensorReading.timestamp, *(getattr(SensorReading, field) for field in SENSOR_FIELDS))
+            .where(
+                SensorReading.equipment_id == equipment_id,
+                SensorReading.timestamp >= start,
+                SensorReading.timestamp < end,
+            )
+            .order_by(SensorReading.timestamp)
+            .limit(MAX_RAW_POINTS)
+        )
+        points = []
+        for row in result:
+            point = {"timestamp": row.timestamp, "sample_count": 1}
+            for field in SENSOR_FIELDS:
+                value = getattr(row, field)
+                point[field] = None if value is None else {"min": value, "max": value, "mean": value, "std": 0.0}
+            points.append(point)
+        return points
+
+    result = await db.execute(
+        select(SensorRollup)
+        .where(
+            SensorRollup.equipment_id == equipment_id,
+            SensorRollup.resolution == resolution,
+            SensorRollup.bucket_start >= floor_time(start, RESOLUTIONS[resolution]),
+            SensorRollup.bucket_start < end,
+        )
+        .order_by(SensorRollup.bucket_start)
+    )
+    return [
+        {
+            "timestamp": rollup.bucket_start,
+            "sample_count": rollup.sample_count,
+            **{
+                field: None
+                if getattr(rollup, f"{field}_mean") is None
+                else {name: getattr(rollup, f"{field}_{name}") for name in STATS}
+                for field in SENSOR_FIELDS
+            },
+        }
+        for rollup in result.scalars()
+    ]
+
+
+class RollupJob:
+    """Background job that rolls raw sensor readings up into 1-minute and 1-hour buckets
+
+    Buckets are written once they are closed (lateness seconds after their
+    end) and a per-resolution watermark records how far data has been
+    processed, so each run only reads new readings. Hours are merged from
+    their minutes rather than from raw readings. Readings that arrive
+    later than that are recorded at ingest by record_late(), and each run
+    re-aggregates the buckets they fall in. The same job enforces
+    retention: raw readings older than raw_retention_days are removed by
+    dropping daily partitions on MySQL (chunked deletes elsewhere), but
+    never before they have been rolled up. Every worker may run the job;
+    a database-wide lock lets one of them run at a time. When given the
+    column store (timeseries_store.ColumnStore) the job also seals its
+    closed days and drops its segments past raw_retention_days.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        interval: float = 60.0,
+        lateness: float = 120.0,
+        raw_retention_days: int = 90,
+        minute_retention_days: int = 365,
+        partition_days_ahead: int = 7,
+        retention_interval: float = 3600.0,
+        delete_chunk_size: int = 10000,
+        chunk_size: int = 50000,
+        timeseries_store=None,
+    ):
+        self.session_factory = session_factory
+        self.timeseries_store = timeseries_store
+        self.interval = interval
+        self.lateness = lateness
+        self.raw_retention_days = raw_retention_days
+        self.minute_retention_days = minute_retention_days
+        self.partition_days_ahead = partition_days_ahead
+        self.retention_interval = retention_interval
+        self.delete_chunk_size = delete_chunk_size
+        # Source rows read per query when rolling up
+        self.chunk_size = chunk_size
+        self._backlog_warned: Set[str] = set()
+        self._worker: Optional[asyncio.Task] = None
+        self._last_retention: Optional[float] = None
+        self._rolling_up = False
+        self._rolling_up_checked: Optional[float] = None
+
+        # Metrics
+        self.runs = 0
+        self.buckets_written = 0
+        self.readings_rolled_up = 0
+        self.raw_rows_deleted = 0
+        self.partitions_dropped = 0
+        self.last_run_duration = 0.0
+        self.skipped_runs = 0
+        self.late_minutes_recorded = 0
+        self.late_buckets_rewritten = 0
+        self.watermarks: Dict[str, datetime] = {}
+
+    async def start(self):
+        """Start the background loop"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+            logger.info("Rollup job started")
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        logger.info("Rollup job stopped")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Rollup job error: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, now: Optional[datetime] = None, catch_up: bool = False, wait: bool = False) -> bool:
+        """Roll up every closed bucket and late reading, then enforce retention if it is due
+
+        With catch_up the rollups start from the oldest reading when no
+        watermark exists; with wait the run waits for the worker holding
+        the lock instead of skipping.
+
+        Returns:
+            False if another worker was running the job, so this run was skipped
+        """
+        start = time.perf_counter()
+        now = now or datetime.utcnow()
+        async with self.session_factory() as db:
+            engine = db.bind
+        async with engine.connect() as connection, async_advisory_lock(connection, ROLLUP_LOCK, wait) as acquired:
+            if not acquired:
+                self.skipped_runs += 1
+                return False
+            for resolution in RESOLUTIONS:
+                await self.rollup(resolution, now, catch_up)
+            await self.reaggregate_late(now)
+            if self.timeseries_store is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.timeseries_store.seal_pending, now.date()
+                )
+            if self._last_retention is None or time.monotonic() - self._last_retention >= self.retention_interval:
+                await self.enforce_retention(now)
+                self._last_retention = time.monotonic()
+        self.runs += 1
+        self.last_run_duration = time.perf_counter() - start
+        return True
+
+    async def rollup(self, resolution: str, now: datetime, catch_up: bool = False) -> int:
+        """Write buckets of one resolution that closed since the last run
+
+        Source rows are read chunk_size at a time in time order, so memory
+        stays bounded whatever the fleet's reading rate, and aggregated off
+        the event loop. Without a watermark the job starts from the oldest
+        source row only if that is within one window, or with catch_up
+        (``python rollups.py``); API workers never work through a whole
+        history.
+
+        Returns:
+            number of buckets written
+        """
+        seconds = RESOLUTIONS[resolution]
+        source = _source(resolution)
+        closed_until = floor_time(now - timedelta(seconds=self.lateness), seconds)
+
+        async with self.session_factory() as db:
+            watermarks = dict(
+                (await db.execute(select(RollupWatermark.resolution, RollupWatermark.processed_until))).all()
+            )
+            finer = SOURCE_RESOLUTIONS.get(resolution)
+            if finer is not None:
+                # Only buckets whose finer rollups are all written
+                if finer not in watermarks:
+                    return 0
+                closed_until = min(closed_until, floor_time(watermarks[finer], seconds))
+            if resolution in watermarks:
+                window_start = watermarks[resolution]
+            else:
+                first = await db.scalar(source.query.with_only_columns(func.min(source.time)))
+                window_start = floor_time(first, seconds) if first else closed_until
+                backlog = closed_until - window_start
+                if not catch_up and backlog > timedelta(seconds=WINDOW_SECONDS[resolution]):
+                    if resolution not in self._backlog_warned:
+                        logger.warning(
+                            f"Not rolling up {backlog} of existing history at {resolution}; "
+                            f"run `python rollups.py` once to catch up"
+                        )
+                        self._backlog_warned.add(resolution)
+                    return 0
+
+        written = 0
+        while True:
+            window_end = min(window_start + timedelta(seconds=WINDOW_SECONDS[resolution]), closed_until)
+            async with self.session_factory() as db:
+                if window_end > window_start:
+                    # Idempotent: reprocessing a window replaces its buckets
+                    await db.execute(
+                        delete(SensorRollup).where(
+                            SensorRollup.resolution == resolution,
+                            SensorRollup.bucket_start >= window_start,
+                            SensorRollup.bucket_start < window_end,
+                        )
+                    )
+                    query = source.query.where(source.time >= window_start, source.time < window_end)
+                    buckets, rows = await self._aggregate(
+                        db, resolution, source, self._pages(db, query, source.order)
+                    )
+                    written += buckets
+                    if finer is None:
+                        self.readings_rolled_up += rows
+
+                    if not rows:
+                        # Skip empty stretches in one step instead of one query per window
+                        next_row = await db.scalar(
+                            source.query.where(source.time >= window_end).with_only_columns(func.min(source.time))
+                        )
+                        if next_row is None:
+                            window_end = closed_until
+                        else:
+                            window_end = max(window_end, min(floor_time(next_row, seconds), closed_until))
+
+                await db.merge(RollupWatermark(resolution=resolution, processed_until=window_end))
+                await db.commit()
+
+            window_start = window_end
+            if window_start >= closed_until:
+                break
+
+        self.buckets_written += written
+        self.watermarks[resolution] = window_start
+        return written
+
+    async def _pages(self, db: AsyncSession, query: Select, order: Tuple[ColumnElement, ColumnElement]):
+        """Rows of query in order, chunk_size at a time, paged on the (unique together) order columns
+
+        Each page is a complete query, so the caller can write between pages
+        on the same connection.
+        """
+        first, second = order
+        last = None
+        while True:
+            page = query
+            if last is not None:
+                page = page.where(or_(first > last[0], and_(first == last[0], second > last[1])))
+            rows = (
+                await db.execute(page.add_columns(first, second).order_by(first, second).limit(self.chunk_size))
+            ).all()
+            if not rows:
+                return
+            last = rows[-1][-2:]
+            yield [row[:-2] for row in rows]
+            if len(rows) < self.chunk_size:
+                return
+
+    async def _aggregate(
+        self, db: AsyncSession, resolution: str, source: _Source, pages: AsyncIterator[list]
+    ) -> Tuple[int, int]:
+        """Insert the buckets of time-ordered source rows page by page
+
+        Rows of the last row's bucket are held back until a later page (or
+        the end) completes the bucket.
+
+        Returns:
+            (buckets written, source rows read)
+        """
+        seconds = RESOLUTIONS[resolution]
+        loop = asyncio.get_running_loop()
+        held: list = []
+        written = read = 0
+        async for page in pages:
+            read += len(page)
+            rows = held + page
+            if not rows:
+                continue
+            open_from = floor_time(rows[-1][1], seconds)
+            split = bisect.bisect_left(rows, open_from, key=lambda row: row[1])
+            held = rows[split:]
+            buckets = await loop.run_in_executor(None, source.aggregate, rows[:split], resolution)
+            written += await self._insert(db, buckets)
+        buckets = await loop.run_in_executor(None, source.aggregate, held, resolution)
+        written += await self._insert(db, buckets)
+        return written, read
+
+    @staticmethod
+    async def _insert(db: AsyncSession, buckets: List[dict]) -> int:
+        if buckets:
+            await db.execute(insert(SensorRollup.__table__), buckets)
+        return len(buckets)
+
+    async def record_late(
+        self, db: AsyncSession, readings: Iterable[Tuple[str, datetime]], now: Optional[datetime] = None
+    ) -> int:
+        """Record, in the caller's transaction, the minutes of (equipment_id, timestamp) readings that may be rolled up
+
+        A reading is late when its minute closed more than lateness seconds
+        ago, so a run may already have passed it. Nothing is recorded before
+        the first rollup run, which starts from the oldest reading (see
+        rollup()).
+
+        Returns:
+            number of minutes recorded
+        """
+        now = now or datetime.utcnow()
+        seconds = RESOLUTIONS["1m"]
+        closed_until = floor_time(now - timedelta(seconds=self.lateness), seconds)
+        buckets = set()
+        for equipment_id, timestamp in readings:
+            timestamp = _naive_utc(timestamp)
+            if timestamp < closed_until:
+                buckets.add((equipment_id, floor_time(timestamp, seconds)))
+        if not buckets or not await self._has_started(db):
+            return 0
+        await db.execute(
+            _mark_statement(db.get_bind().dialect.name),
+            [{"equipment_id": equipment_id, "bucket_start": bucket, "marks": 1} for equipment_id, bucket in buckets],
+        )
+        self.late_minutes_recorded += len(buckets)
+        return len(buckets)
+
+    async def _has_started(self, db: AsyncSession) -> bool:
+        """Whether any rollup watermark exists, rechecked at most once per interval until one does"""
+        if not self._rolling_up and (
+            self._rolling_up_checked is None or time.monotonic() - self._rolling_up_checked >= self.interval
+        ):
+            self._rolling_up = bool(await db.scalar(select(func.count()).select_from(RollupWatermark)))
+            self._rolling_up_checked = time.monotonic()
+        return self._rolling_up
+
+    async def reaggregate_late(self, now: datetime) -> int:
+        """Rewrite the rolled-up buckets that late readings fall in, and clear their records
+
+        Minutes past raw retention and hours past minute retention are not
+        rewritten, since what they are aggregated from may already be gone.
+
+        Returns:
+            number of buckets rewritten
+        """
+        table = RollupLateBucket.__table__
+        clear = delete(table).where(
+            table.c.equipment_id == bindparam("b_equipment_id"),
+            table.c.bucket_start == bindparam("b_bucket_start"),
+            table.c.marks == bindparam("b_marks"),
+        )
+        raw_cutoff = now - timedelta(days=self.raw_retention_days) if self.raw_retention_days > 0 else None
+        minute_cutoff = now - timedelta(days=self.minute_retention_days) if self.minute_retention_days > 0 else None
+
+        rewritten = 0
+        while True:
+            async with self.session_factory() as db:
+                marks = (
+                    await db.execute(
+                        select(table.c.equipment_id, table.c.bucket_start, table.c.marks)
+                        .order_by(table.c.bucket_start)
+                        .limit(self.delete_chunk_size)
+                    )
+                ).all()
+                if not marks:
+                    break
+                watermarks = dict(
+                    (await db.execute(select(RollupWatermark.resolution, RollupWatermark.processed_until))).all()
+                )
+                # Minutes first, so the hours are merged from rewritten minutes
+                for resolution, seconds in RESOLUTIONS.items():
+                    watermark = watermarks.get(resolution)
+                    if watermark is None:
+                        continue
+                    cutoff = minute_cutoff
+                    if resolution == "1m" and raw_cutoff is not None:
+                        cutoff = raw_cutoff if cutoff is None else max(cutoff, raw_cutoff)
+                    buckets = set()
+                    for equipment_id, bucket_start, _ in marks:
+                        bucket = floor_time(bucket_start, seconds)
+                        # Buckets at or past the watermark are picked up by the next regular rollup
+                        if bucket < watermark and (cutoff is None or bucket >= cutoff):
+                            buckets.add((equipment_id, bucket))
+                    rewritten += await self._rewrite_buckets(db, resolution, buckets)
+                # Records marked again since they were read stay for the next run
+                await db.execute(
+                    clear,
+                    [
+                        {"b_equipment_id": equipment_id, "b_bucket_start": bucket_start, "b_marks": count}
+                        for equipment_id, bucket_start, count in marks
+                    ],
+                )
+                await db.commit()
+            if len(marks) < self.delete_chunk_size:
+                break
+
+        self.late_buckets_rewritten += rewritten
+        return rewritten
+
+    async def _rewrite_buckets(self, db: AsyncSession, resolution: str, buckets: Set[Tuple[str, datetime]]) -> int:
+        """Recompute the given (equipment_id, bucket_start) rollups from their source rows"""
+        seconds = RESOLUTIONS[resolution]
+        source = _source(resolution)
+        by_equipment: Dict[str, List[datetime]] = {}
+        for equipment_id, bucket in buckets:
+            by_equipment.setdefault(equipment_id, []).append(bucket)
+
+        written = 0
+        for equipment_id, starts in by_equipment.items():
+            starts.sort()
+            # One query per run of buckets no further apart than a rollup window
+            runs = [[starts[0]]]
+            for bucket in starts[1:]:
+                if bucket - runs[-1][-1] > timedelta(seconds=WINDOW_SECONDS[resolution]):
+                    runs.append([])
+                runs[-1].append(bucket)
+            for run in runs:
+                wanted = set(run)
+                await db.execute(
+                    delete(SensorRollup).where(
+                        and_(
+                            SensorRollup.equipment_id == equipment_id,
+                            SensorRollup.resolution == resolution,
+                            SensorRollup.bucket_start.in_(run),
+                        )
+                    )
+                )
+                query = source.query.where(
+                    source.equipment_id == equipment_id,
+                    source.time >= run[0],
+                    source.time < run[-1] + timedelta(seconds=seconds),
+                )
+                pages = (
+                    [row for row in page if floor_time(row[1], seconds) in wanted]
+                    async for page in self._pages(db, query, source.order)
+                )
+                await self._aggregate(db, resolution, source, pages)
+                written += len(run)
+        return written
+
+    async def enforce_retention(self, now: datetime):
+        """Drop raw readings and minute rollups that are past their retention period"""
+        async with self.session_factory() as db:
+            dialect_name = db.get_bind().dialect.name
+            partitioned = dialect_name == "mysql" and bool(await list_partitions(db, SensorReading.__tablename__))
+            if partitioned:
+                await ensure_future_partitions(
+                    db, SensorReading.__tablename__, self.partition_days_ahead, now.date()
+                )
+
+            if self.raw_retention_days > 0:
+                watermarks = (await db.execute(select(RollupWatermark.processed_until))).scalars().all()
+                # Raw readings are only removed once every resolution has rolled them up
+                if len(watermarks) == len(RESOLUTIONS):
+                    cutoff = min(now - timedelta(days=self.raw_retention_days), *watermarks)
+                    if partitioned:
+                        dropped = await drop_partitions_before(db, SensorReading.__tablename__, cutoff)
+                        self.partitions_dropped += len(dropped)
+                    else:
+                        self.raw_rows_deleted += await self._delete_raw_before(db, dialect_name, cutoff)
+                if self.timeseries_store is not None:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self.timeseries_store.drop_before, (now - timedelta(days=self.raw_retention_days)).date()
+                    )
+
+            if self.minute_retention_days > 0:
+                await db.execute(
+                    delete(SensorRollup).where(
+                        SensorRollup.resolution == "1m",
+                        SensorRollup.bucket_start < now - timedelta(days=self.minute_retention_days),
+                    )
+                )
+            await db.commit()
+
+    async def _delete_raw_before(self, db: AsyncSession, dialect_name: str, cutoff: datetime) -> int:
+        """Delete raw readings older than cutoff in chunks to keep transactions short"""
+        table = SensorReading.__table__
+        if dialect_name == "mysql":
+            statement = text("DELETE FROM sensor_readings WHERE timestamp < :cutoff LIMIT :limit").bindparams(
+                cutoff=cutoff, limit=self.delete_chunk_size
+            )
+        else:
+            statement = delete(table).where(
+                table.c.id.in_(select(table.c.id).where(table.c.timestamp < cutoff).limit(self.delete_chunk_size))
+            )
+
+        deleted = 0
+        while True:
+            result = await db.execute(statement)
+            await db.commit()
+            deleted += result.rowcount
+            if result.rowcount < self.delete_chunk_size:
+                return deleted
+
+    def choose_resolution(self, start: datetime, end: datetime, now: Optional[datetime] = None) -> str:
+        """Finest resolution that covers [start, end) without returning an unplottable number of points"""
+        now = now or datetime.utcnow()
+        span = end - start
+        raw_available = self.raw_retention_days <= 0 or start >= now - timedelta(days=self.raw_retention_days)
+        minutes_available = self.minute_retention_days <= 0 or start >= now - timedelta(
+            days=self.minute_retention_days
+        )
+        if span <= timedelta(hours=6) and raw_available:
+            return "raw"
+        if span <= timedelta(days=7) and minutes_available:
+            return "1m"
+        return "1h"
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self._worker is not None and not self._worker.done(),
+            "runs": self.runs,
+            "buckets_written": self.buckets_written,
+            "readings_rolled_up": self.readings_rolled_up,
+            "raw_rows_deleted": self.raw_rows_deleted,
+            "partitions_dropped": self.partitions_dropped,
+            "last_run_duration_ms": self.last_run_duration * 1000,
+            "skipped_runs": self.skipped_runs,
+            "late_minutes_recorded": self.late_minutes_recorded,
+            "late_buckets_rewritten": self.late_buckets_rewritten,
+            "watermarks": {resolution: ts.isoformat() for resolution, ts in self.watermarks.items()},
+        }
+
+
+async def catch_up(chunk_size: int):
+    """Roll up the whole history once, as the API's job does not start on one"""
+    from config import Config
+    from database import AsyncSessionLocal
+
+    job = RollupJob(
+        AsyncSessionLocal,
+        lateness=Config.ROLLUP_LATENESS_SECONDS,
+        raw_retention_days=Config.RAW_RETENTION_DAYS,
+        minute_retention_days=Config.ROLLUP_1M_RETENTION_DAYS,
+        partition_days_ahead=Config.PARTITION_DAYS_AHEAD,
+        chunk_size=chunk_size,
+    )
+    started = time.perf_counter()
+    await job.run_once(catch_up=True, wait=True)
+    logger.info(
+        f"Rolled up {job.readings_rolled_up:,} readings into {job.buckets_written:,} buckets "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up the existing sensor history")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="source rows read per query")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(catch_up(args.chunk_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,61 @@ class SensorReadingSchema(BaseModel):
         from_attributes = True
 
 
+class BulkIngestRowError(BaseModel):
+    row: int
+    error: str
+
+
+class BulkIngestResponse(BaseModel):
+    received: int
+    accepted: int
+    rejected: int
+    errors: List[BulkIngestRowError]
+    timestamp: datetime
+
+
+class SensorStats(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    std: Optional[float] = None
+
+
+class SensorHistoryPoint(BaseModel):
+    timestamp: datetime
+    sample_count: int
+    temperature: Optional[SensorStats] = None
+    vibration: Optional[SensorStats] = None
+    pressure: Optional[SensorStats] = None
+    power_consumption: Optional[SensorStats] = None
+    operating_hours: Optional[SensorStats] = None
+
+
+class SensorHistoryResponse(BaseModel):
+    equipment_id: str
+    resolution: str
+    start: datetime
+    end: datetime
+    points: List[SensorHistoryPoint]
+
+
+class ReadingSeries(BaseModel):
+    timestamps: List[int]  # epoch milliseconds
+    values: Optional[List[Optional[float]]] = None
+    min: Optional[List[Optional[float]]] = None
+    max: Optional[List[Optional[float]]] = None
+    mean: Optional[List[Optional[float]]] = None
+
+
+class EquipmentReadingsResponse(BaseModel):
+    equipment_id: str
+    start: datetime
+    end: datetime
+    resolution: str
+    method: str
+    series: Dict[str, ReadingSeries]
+
+
 class PredictionSchema(BaseModel):
     equipment_id: str
     failure_probability: float = Field(..., ge=0.0, le=1.0)
@@ -142,13 +197,36 @@ class WebhookPayload(BaseModel):
 
 class ModelRegistrySchema(BaseModel):
     model_version: str
-    model_type: str
-    auc_score: float
-    accuracy: float
-    precision: float
-    recall: float
-    f1_score: float
+    model_type: Optional[str] = None
+    training_date: Optional[datetime] = None
+    auc_score: Optional[float] = None
+    accuracy: Optional[float] = None
+    precision: Optional[float] = None
+    recall: Optional[float] = None
+    f1_score: Optional[float] = None
+    model_path: Optional[str] = None
     is_active: bool = False
+    is_shadow: bool = False
+
+    class Config:
+        from_attributes = True
+
+
+class ShadowComparisonSchema(BaseModel):
+    active_version: str
+    candidate_version: str
+    window_start: datetime
+    window_end: datetime
+    samples: int
+    label_flips: int
+    mean_abs_diff: Optional[float] = None
+    max_abs_diff: Optional[float] = None
+    mean_rul_abs_diff: Optional[float] = None
+    diff_histogram: Optional[Dict[str, List[float]]] = None
+    active_latency_histogram: Optional[Dict[str, List[float]]] = None
+    candidate_latency_histogram: Optional[Dict[str, List[float]]] = None
+    candidate_errors: Optional[int] = None
+    dropped: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models import ShadowComparison
+
+logger = logging.getLogger(__name__)
+
+# Histogram upper bounds; each histogram has one more count for values above the last bound
+LATENCY_BOUNDS_MS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 1000.0)
+DIFF_BOUNDS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5)
+
+# Failure probability at which the two models are counted as disagreeing on the label
+DECISION_THRESHOLD = 0.5
+
+
+def histogram(bounds: Sequence[float], values: np.ndarray, weight: int = 1) -> np.ndarray:
+    """Counts of values per bucket (value <= bound), plus an overflow bucket"""
+    return np.bincount(np.searchsorted(bounds, values), minlength=len(bounds) + 1) * weight
+
+
+class ComparisonWindow:
+    """Agreement and latency aggregates of one (active, candidate) pair since the last flush"""
+
+    def __init__(self, active_version: str, candidate_version: str):
+        self.active_version = active_version
+        self.candidate_version = candidate_version
+        self.window_start = datetime.utcnow()
+        self.samples = 0
+        self.label_flips = 0
+        self.abs_diff_sum = 0.0
+        self.max_abs_diff = 0.0
+        self.rul_abs_diff_sum = 0.0
+        self.candidate_errors = 0
+        self.diff_counts = np.zeros(len(DIFF_BOUNDS) + 1, dtype=np.int64)
+        self.active_latency_counts = np.zeros(len(LATENCY_BOUNDS_MS) + 1, dtype=np.int64)
+        self.candidate_latency_counts = np.zeros(len(LATENCY_BOUNDS_MS) + 1, dtype=np.int64)
+
+    def add(
+        self,
+        active_probs: np.ndarray,
+        candidate_probs: np.ndarray,
+        active_rul: np.ndarray,
+        candidate_rul: np.ndarray,
+        active_row_ms: float,
+        candidate_row_ms: float,
+    ):
+        diff = np.abs(candidate_probs - active_probs)
+        self.samples += len(diff)
+        self.label_flips += int(
+            np.count_nonzero((active_probs >= DECISION_THRESHOLD) != (candidate_probs >= DECISION_THRESHOLD))
+        )
+        self.abs_diff_sum += float(diff.sum())
+        self.max_abs_diff = max(self.max_abs_diff, float(diff.max()))
+        self.rul_abs_diff_sum += float(np.abs(candidate_rul - active_rul).sum())
+        self.diff_counts += histogram(DIFF_BOUNDS, diff)
+        # Latency per reading, amortized over the scoring call, counted once per compared reading
+        self.active_latency_counts += histogram(LATENCY_BOUNDS_MS, np.array([active_row_ms]), len(diff))
+        self.candidate_latency_counts += histogram(LATENCY_BOUNDS_MS, np.array([candidate_row_ms]), len(diff))
+
+    def to_row(self, window_end: datetime, dropped: int) -> ShadowComparison:
+        return ShadowComparison(
+            active_version=self.active_version,
+            candidate_version=self.candidate_version,
+            window_start=self.window_start,
+            window_end=window_end,
+            samples=self.samples,
+            label_flips=self.label_flips,
+            mean_abs_diff=self.abs_diff_sum / self.samples if self.samples else None,
+            max_abs_diff=self.max_abs_diff if self.samples else None,
+            mean_rul_abs_diff=self.rul_abs_diff_sum / self.samples if self.samples else None,
+            diff_histogram={"bounds": list(DIFF_BOUNDS), "counts": self.diff_counts.tolist()},
+            active_latency_histogram={"bounds_ms": list(LATENCY_BOUNDS_MS), "counts": self.active_latency_counts.tolist()},
+            candidate_latency_histogram={
+                "bounds_ms": list(LATENCY_BOUNDS_MS),
+                "counts": self.candidate_latency_counts.tolist(),
+            },
+            candidate_errors=self.candidate_errors,
+            dropped=dropped,
+        )
+
+
+class ShadowScorer:
+    """Scores a sample of live readings with a candidate model and records how it compares
+
+    offer() is called on the request path after the active model has scored a
+    batch. It only draws the sample and queues it: the candidate scores in its
+    own thread pool, off the request path, and when max_pending jobs are
+    already queued the sample is dropped rather than queued behind them.
+    sample_rate bounds the extra CPU to that fraction of the scoring work.
+    Aggregates are kept per (active, candidate) pair and written to the
+    shadow_comparisons table once per flush_interval, one row per pair.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        sample_rate: float = 0.1,
+        flush_interval: float = 60.0,
+        max_pending: int = 64,
+        workers: int = 1,
+    ):
+        self.session_factory = session_factory
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.candidate = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shadow-scoring")
+        self._lock = threading.Lock()
+        self._windows: Dict[Tuple[str, str], ComparisonWindow] = {}
+        self._pending = 0
+        self._window_dropped = 0
+        self._worker: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.samples = 0
+        self.label_flips = 0
+        self.dropped = 0
+        self.candidate_errors = 0
+        self.windows_flushed = 0
+
+    @property
+    def candidate_version(self) -> Optional[str]:
+        return self.candidate.model_version if self.candidate is not None else None
+
+    def offer(self, predictor, sensor_dicts: List[Dict[str, float]], results: List[tuple], elapsed: float):
+        """Queue a sample of a scored batch for the candidate; never blocks or raises
+
+        results are the active model's (failure_probability, rul_days, ...)
+        tuples for sensor_dicts, and elapsed the seconds that call took.
+        """
+        candidate = self.candidate
+        if candidate is None or self.sample_rate <= 0 or not sensor_dicts:
+            return
+        if self.sample_rate >= 1:
+            sampled = range(len(sensor_dicts))
+        else:
+            sampled = [i for i in range(len(sensor_dicts)) if random.random() < self.sample_rate]
+            if not sampled:
+                return
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += len(sampled)
+                self._window_dropped += len(sampled)
+                return
+            self._pending += 1
+        try:
+            self._executor.submit(
+                self._compare,
+                candidate,
+                predictor.model_version,
+                [sensor_dicts[i] for i in sampled],
+                [results[i] for i in sampled],
+                elapsed / len(sensor_dicts),
+            )
+        except RuntimeError:
+            # Executor shut down
+            with self._lock:
+                self._pending -= 1
+
+    def _compare(self, candidate, active_version: str, sensor_dicts, active_results, active_row_seconds: float):
+        try:
+            started = time.perf_counter()
+            try:
+                candidate_results = candidate.batch_predict(sensor_dicts)
+            except Exception as e:
+                logger.error(f"Shadow scoring error for {candidate.model_version}: {str(e)}")
+                with self._lock:
+                    self._window(active_version, candidate.model_version).candidate_errors += 1
+                    self.candidate_errors += 1
+                return
+            candidate_row_seconds = (time.perf_counter() - started) / len(sensor_dicts)
+
+            active_probs = np.array([result[0] for result in active_results], dtype=float)
+            candidate_probs = np.array([result[0] for result in candidate_results], dtype=float)
+            active_rul = np.array([result[1] for result in active_results], dtype=float)
+            candidate_rul = np.array([result[1] for result in candidate_results], dtype=float)
+            with self._lock:
+                window = self._window(active_version, candidate.model_version)
+                flips = window.label_flips
+                window.add(
+                    active_probs,
+                    candidate_probs,
+                    active_rul,
+                    candidate_rul,
+                    active_row_seconds * 1000,
+                    candidate_row_seconds * 1000,
+                )
+                self.samples += len(sensor_dicts)
+                self.label_flips += window.label_flips - flips
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _window(self, active_version: str, candidate_version: str) -> ComparisonWindow:
+        """Current window of a version pair; caller holds _lock"""
+        key = (active_version, candidate_version)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = ComparisonWindow(active_version, candidate_version)
+        return window
+
+    async def start(self):
+        if self.flush_interval > 0 and (self._worker is None or self._worker.done()):
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        # Let queued comparisons finish so the last window is complete
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown, True)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Shadow comparison flush error: {str(e)}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Shadow comparison flush error: {str(e)}")
+
+    async def flush(self) -> int:
+        """Write one shadow_comparisons row per version pair compared since the last flush
+
+        Returns:
+            number of rows written
+        """
+        with self._lock:
+            windows, self._windows = self._windows, {}
+            dropped, self._window_dropped = self._window_dropped, 0
+        windows = [window for window in windows.values() if window.samples or window.candidate_errors]
+        if not windows:
+            return 0
+
+        window_end = datetime.utcnow()
+        rows = [window.to_row(window_end, dropped if i == 0 else 0) for i, window in enumerate(windows)]
+        async with self.session_factory() as db:
+            db.add_all(rows)
+            await db.commit()
+        self.windows_flushed += len(rows)
+        return len(rows)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            pending = self._pending
+            windows = [
+                {
+                    "active_version": window.active_version,
+                    "candidate_version": window.candidate_version,
+                    "samples": window.samples,
+                    "label_flips": window.label_flips,
+                    "mean_abs_diff": window.abs_diff_sum / window.samples if window.samples else None,
+                    "max_abs_diff": window.max_abs_diff if window.samples else None,
+                }
+                for window in self._windows.values()
+            ]
+        return {
+            "candidate_version": self.candidate_version,
+            "sample_rate": self.sample_rate,
+            "samples": self.samples,
+            "label_flips": self.label_flips,
+            "dropped": self.dropped,
+            "candidate_errors": self.candidate_errors,
+            "pending": pending,
+            "windows_flushed": self.windows_flushed,
+            "current_windows": windows,
+        }
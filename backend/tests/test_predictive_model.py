@@ -0,0 +1,43 @@
+import math
+
+import pytest
+
+from ml_service import PredictiveModel
+
+COMPLETE = {"temperature": 72.5, "vibration": 2.1, "pressure": 8.0, "power_consumption": 31.0, "operating_hours": 4200.0}
+
+ROWS = [
+    COMPLETE,
+    {**COMPLETE, "temperature": 1.8, "vibration": -0.4},
+    {**COMPLETE, "temperature": None},
+    {**COMPLETE, "vibration": math.nan},
+    {**COMPLETE, "pressure": math.inf},
+    {name: value for name, value in COMPLETE.items() if name != "operating_hours"},
+]
+
+
+@pytest.fixture(scope="module", params=["flat", "sklearn"])
+def model(request, tmp_path_factory):
+    path = tmp_path_factory.mktemp(request.param) / "failure_predictor_test.pkl"
+    return PredictiveModel(model_version="test", engine=request.param, model_path=str(path))
+
+
+@pytest.mark.parametrize("include_explanation", [False, True])
+def test_batch_predict_matches_predict(model, include_explanation):
+    batch = model.batch_predict(ROWS, include_explanation=include_explanation)
+    assert batch == [model.predict(row, include_explanation=include_explanation) for row in ROWS]
+
+
+def test_non_finite_inputs_are_not_scored(model):
+    for row in ROWS[2:5]:
+        assert model.predict(row) == PredictiveModel.UNSCORED
+        assert model.batch_predict([row]) == [PredictiveModel.UNSCORED]
+    assert model.predict(ROWS[0]) != PredictiveModel.UNSCORED
+
+
+def test_missing_features(model):
+    assert model.missing_features(COMPLETE) == []
+    assert model.missing_features(ROWS[2]) == ["temperature"]
+    assert model.missing_features(ROWS[3]) == ["vibration"]
+    assert model.missing_features(ROWS[4]) == ["pressure"]
+    assert model.missing_features(ROWS[5]) == ["operating_hours"]
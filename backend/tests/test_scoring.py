@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from ml_service import SENSOR_FIELDS, AnomalyDetector, HealthScoreCalculator
+
+
+def make_readings(n: int = 3000, n_equipment: int = 20, seed: int = 0):
+    """(n, 5) readings in SENSOR_FIELDS order with outliers and missing sensors, plus equipment IDs"""
+    rng = np.random.default_rng(seed)
+    equipment = rng.integers(0, n_equipment, n)
+    levels = rng.uniform([40, 1, 3, 10, 0], [90, 6, 14, 60, 12000], (n_equipment, len(SENSOR_FIELDS)))
+    spread = np.array([3.0, 0.5, 1.0, 5.0, 100.0])
+    values = levels[equipment] + rng.standard_normal((n, len(SENSOR_FIELDS))) * spread
+    values[rng.random(n) < 0.02] *= 3
+    values[rng.random(values.shape) < 0.05] = np.nan
+    return values, [f"EQ-{e:03d}" for e in equipment]
+
+
+def as_dicts(values: np.ndarray, equipment_ids):
+    """Per-reading dicts as the API builds them: None for a missing sensor, or the key left out"""
+    dicts = []
+    for i, (equipment_id, row) in enumerate(zip(equipment_ids, values.tolist())):
+        reading = {"equipment_id": equipment_id}
+        for field, value in zip(SENSOR_FIELDS, row):
+            if not np.isnan(value):
+                reading[field] = value
+            elif i % 2:
+                reading[field] = None
+        dicts.append(reading)
+    return dicts
+
+
+@pytest.fixture(scope="module")
+def readings():
+    values, equipment_ids = make_readings()
+    return values, equipment_ids, as_dicts(values, equipment_ids)
+
+
+def test_health_scores_match_per_reading(readings):
+    values, _, dicts = readings
+    calculator = HealthScoreCalculator()
+    scalar = [calculator.calculate_health_score(d) for d in dicts]
+
+    health = calculator.calculate_health_scores(np.nan_to_num(values, nan=0.0))
+    assert health.tolist() == scalar
+    assert calculator.calculate_health_scores(dicts).tolist() == scalar
+    assert calculator.batch_calculate_health_score(dicts) == scalar
+    assert calculator.determine_statuses(health).tolist() == [calculator.determine_status(h) for h in scalar]
+
+
+def test_statuses_at_boundaries():
+    calculator = HealthScoreCalculator()
+    scores = [100.0, 80.0, 79.99, 60.0, 59.99, 30.0, 29.99, 0.0]
+    assert calculator.determine_statuses(scores).tolist() == [calculator.determine_status(s) for s in scores]
+
+
+def test_anomalies_match_per_reading(readings):
+    values, equipment_ids, dicts = readings
+    scalar_detector = AnomalyDetector()
+    scalar = [scalar_detector.detect_anomaly(d) for d in dicts]
+
+    scores, severities = AnomalyDetector().detect_anomalies(values, equipment_ids)
+    assert list(zip(scores.tolist(), severities.tolist())) == scalar
+    assert AnomalyDetector().batch_detect_anomaly(dicts) == scalar
+    # Past the cold start, with outliers, so both scoring paths and every severity are covered
+    assert set(severities.tolist()) == {"normal", "warning", "critical"}
+    assert scalar_detector.baseline(equipment_ids[0])["readings"] > AnomalyDetector.MIN_READINGS
+
+
+def test_anomalies_of_all_missing_readings():
+    values = np.full((3, len(SENSOR_FIELDS)), np.nan)
+    equipment_ids = ["EQ-000"] * 3
+    scalar_detector = AnomalyDetector()
+    scalar = [scalar_detector.detect_anomaly(d) for d in as_dicts(values, equipment_ids)]
+
+    scores, severities = AnomalyDetector().detect_anomalies(values, equipment_ids)
+    assert list(zip(scores.tolist(), severities.tolist())) == scalar
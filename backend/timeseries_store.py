@@ -0,0 +1,672 @@
+import logging
+import math
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+from rollups import SENSOR_FIELDS
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+DAY_MS = 86400 * 1000
+
+TIMESTAMP_DTYPE = np.dtype("<i8")  # milliseconds since the Unix epoch (UTC)
+VALUE_DTYPE = np.dtype("<f4")  # NaN marks a missing sensor value
+# Summaries are stored per sensor as (n, 4) float64 rows of min, max, sum, count
+SUMMARY_STATS = ("min", "max", "sum", "count")
+SUMMARY_DTYPE = np.dtype("<f8")
+
+# Hourly summaries are kept in one file per equipment: bucket start, then the stats of every sensor
+HOUR_SECONDS = 3600
+HOURLY_WIDTH = 1 + len(SENSOR_FIELDS) * len(SUMMARY_STATS)
+
+# Largest number of samples returned (or fed to LTTB) without aggregation
+MAX_RAW_POINTS = 100000
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_resolution(resolution: str) -> Optional[int]:
+    """Bucket width in seconds for "30s"/"5m"/"1h"/"1d"; None for "raw"/"auto"
+
+    Raises:
+        ValueError: if resolution is not recognised
+    """
+    if resolution in ("raw", "auto"):
+        return None
+    unit = DURATION_UNITS.get(resolution[-1:])
+    if unit is None or not resolution[:-1].isdigit() or int(resolution[:-1]) == 0:
+        raise ValueError(f"Unsupported resolution: {resolution}")
+    return int(resolution[:-1]) * unit
+
+
+def to_epoch_ms(timestamp: datetime) -> int:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - EPOCH) // timedelta(milliseconds=1)
+
+
+def _read_column(path: str, dtype: np.dtype, length: Optional[int] = None, mmap: bool = False) -> np.ndarray:
+    if not os.path.exists(path):
+        return np.empty(0, dtype=dtype)
+    if length is None:
+        length = os.path.getsize(path) // dtype.itemsize
+    if length == 0:
+        return np.empty(0, dtype=dtype)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode="r", shape=(length,))
+    return np.fromfile(path, dtype=dtype, count=length)
+
+
+def _to_list(array: np.ndarray) -> list:
+    """JSON-ready list with NaN as None"""
+    array = np.asarray(array, dtype=np.float64)
+    return np.where(np.isnan(array), None, array).tolist()
+
+
+def _write_column(path: str, array: np.ndarray, dtype: np.dtype):
+    with open(path, "wb") as f:
+        f.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+
+def summarize(timestamps: np.ndarray, values: Dict[str, np.ndarray], seconds: int) -> Tuple[np.ndarray, dict]:
+    """Fixed-width bucket min/max/sum/count per sensor over sorted readings
+
+    Returns:
+        (bucket start timestamps, {sensor: {"min", "max", "sum", "count"}})
+    """
+    if len(timestamps) == 0:
+        return np.empty(0, dtype=TIMESTAMP_DTYPE), {
+            field: {stat: np.empty(0, dtype=SUMMARY_DTYPE) for stat in SUMMARY_STATS} for field in values
+        }
+
+    width = seconds * 1000
+    buckets = timestamps // width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    summary = {}
+    for field, column in values.items():
+        column = np.asarray(column, dtype=np.float64)
+        present = ~np.isnan(column)
+        summary[field] = {
+            "min": np.fmin.reduceat(column, starts),
+            "max": np.fmax.reduceat(column, starts),
+            "sum": np.add.reduceat(np.where(present, column, 0.0), starts),
+            "count": np.add.reduceat(present.astype(np.int32), starts),
+        }
+    return buckets[starts] * width, summary
+
+
+def _stack(summary: dict, sensors: Sequence[str]) -> Dict[str, np.ndarray]:
+    """{sensor: {stat: column}} as {sensor: (n, 4) rows}"""
+    return {field: np.column_stack([summary[field][stat] for stat in SUMMARY_STATS]) for field in sensors}
+
+
+def _unstack(rows: Dict[str, np.ndarray]) -> dict:
+    return {field: {stat: block[:, index] for index, stat in enumerate(SUMMARY_STATS)} for field, block in rows.items()}
+
+
+def raw_as_summary(values: Dict[str, np.ndarray]) -> dict:
+    """View raw readings as one-sample buckets for minmax_downsample()"""
+    summary = {}
+    for field, column in values.items():
+        column = np.asarray(column, dtype=np.float64)
+        present = ~np.isnan(column)
+        summary[field] = {
+            "min": column,
+            "max": column,
+            "sum": np.where(present, column, 0.0),
+            "count": present.astype(np.int32),
+        }
+    return summary
+
+
+def minmax_downsample(
+    timestamps: np.ndarray, summary: dict, start_ms: int, width_ms: int
+) -> Tuple[np.ndarray, dict]:
+    """Merge bucket summaries into wider buckets aligned to start_ms
+
+    Accepts the output of summarize() (or raw readings with min = max = sum
+    and count = 1) and returns the same shape at the coarser width. Buckets
+    without any samples are dropped.
+    """
+    if len(timestamps) == 0:
+        return timestamps, summary
+    # Minute summaries that begin just before start_ms still only hold readings after it
+    buckets = np.maximum((timestamps - start_ms) // width_ms, 0)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    merged = {
+        field: {
+            "min": np.fmin.reduceat(stats["min"], starts),
+            "max": np.fmax.reduceat(stats["max"], starts),
+            "sum": np.add.reduceat(stats["sum"], starts),
+            "count": np.add.reduceat(stats["count"], starts),
+        }
+        for field, stats in summary.items()
+    }
+    return start_ms + buckets[starts] * width_ms, merged
+
+
+def lttb(timestamps: np.ndarray, values: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Largest-Triangle-Three-Buckets downsampling of one series (NaNs are skipped)"""
+    present = ~np.isnan(values)
+    x = timestamps[present].astype(np.float64)
+    y = values[present].astype(np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x.astype(TIMESTAMP_DTYPE), y
+
+    # Bucket edges over the interior points; first and last points are always kept
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous]) - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(np.argmax(area))
+        selected[i + 1] = previous
+    return x[selected].astype(TIMESTAMP_DTYPE), y[selected]
+
+
+class ColumnStore:
+    """Append-only columnar store of sensor readings on memory-mapped files
+
+    Readings are laid out as one directory per equipment and UTC day, with
+    one flat file per column (int64 epoch milliseconds, float32 per sensor).
+    New readings are appended to the day's log files. Once a day is over it
+    is sealed: rows are sorted into sealed/ together with a per-minute
+    min/max/sum/count summary, so long ranges are answered from the summary
+    without touching raw samples. Late readings for a sealed day go to the
+    log again and are merged on the next seal.
+    """
+
+    def __init__(self, root: str, summary_seconds: int = 60):
+        self.root = root
+        self.summary_seconds = summary_seconds
+        # Summary levels, finest first: per-segment files at summary_seconds and, when finer
+        # than an hour, one hourly file per equipment so year-long reads touch a single file
+        self.levels = (summary_seconds, HOUR_SECONDS) if summary_seconds < HOUR_SECONDS else (summary_seconds,)
+        self._lock = threading.RLock()
+
+        # Metrics
+        self.rows_appended = 0
+        self.segments_sealed = 0
+        self.segments_dropped = 0
+        self.queries = 0
+
+    def _equipment_dir(self, equipment_id: str) -> str:
+        return os.path.join(self.root, quote(equipment_id, safe=""))
+
+    def _segment_dir(self, equipment_id: str, day: date) -> str:
+        return os.path.join(self._equipment_dir(equipment_id), f"{day:%Y%m%d}")
+
+    @contextmanager
+    def _lock_dir(self, directory: str):
+        """Exclusive lock on a segment or equipment directory, across threads and processes"""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, open(os.path.join(directory, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, readings: Iterable[dict]) -> int:
+        """Append readings (dicts with equipment_id, timestamp and sensor fields)
+
+        Returns:
+            number of readings written
+        """
+        groups: Dict[Tuple[str, date], List[dict]] = {}
+        for reading in readings:
+            day = (EPOCH + timedelta(milliseconds=to_epoch_ms(reading["timestamp"]))).date()
+            groups.setdefault((reading["equipment_id"], day), []).append(reading)
+
+        for (equipment_id, day), rows in groups.items():
+            self.append_columns(
+                equipment_id,
+                day,
+                np.array([to_epoch_ms(row["timestamp"]) for row in rows], dtype=TIMESTAMP_DTYPE),
+                {
+                    field: np.array([np.nan if row.get(field) is None else row[field] for row in rows], dtype=VALUE_DTYPE)
+                    for field in SENSOR_FIELDS
+                },
+            )
+        return sum(len(rows) for rows in groups.values())
+
+    def append_columns(self, equipment_id: str, day: date, timestamps: np.ndarray, values: Dict[str, np.ndarray]):
+        """Append column arrays for one equipment and UTC day (missing sensors are stored as NaN)"""
+        segment = self._segment_dir(equipment_id, day)
+        log_dir = os.path.join(segment, "log")
+        with self._lock_dir(segment):
+            os.makedirs(log_dir, exist_ok=True)
+            # Timestamp is written last: readers size the log by it
+            for field in SENSOR_FIELDS:
+                column = values.get(field)
+                if column is None:
+                    column = np.full(len(timestamps), np.nan)
+                with open(os.path.join(log_dir, field), "ab") as f:
+                    f.write(np.ascontiguousarray(column, dtype=VALUE_DTYPE).tobytes())
+            with open(os.path.join(log_dir, "timestamp"), "ab") as f:
+                f.write(np.ascontiguousarray(timestamps, dtype=TIMESTAMP_DTYPE).tobytes())
+        self.rows_appended += len(timestamps)
+
+    def _read_log(self, segment: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        log_dir = os.path.join(segment, "log")
+        timestamps = _read_column(os.path.join(log_dir, "timestamp"), TIMESTAMP_DTYPE)
+        if len(timestamps):
+            # A concurrent append may have written some columns but not all of them yet
+            length = min(
+                len(timestamps),
+                *(os.path.getsize(os.path.join(log_dir, field)) // VALUE_DTYPE.itemsize for field in SENSOR_FIELDS),
+            )
+            timestamps = timestamps[:length]
+        values = {
+            field: _read_column(os.path.join(log_dir, field), VALUE_DTYPE, len(timestamps)) for field in SENSOR_FIELDS
+        }
+        return timestamps, values
+
+    def _read_sealed(
+        self, segment: str, sensors: Sequence[str] = SENSOR_FIELDS
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Sealed raw columns, memory-mapped"""
+        sealed_dir = os.path.join(segment, "sealed", "raw")
+        timestamps = _read_column(os.path.join(sealed_dir, "timestamp"), TIMESTAMP_DTYPE, mmap=True)
+        values = {
+            field: _read_column(os.path.join(sealed_dir, field), VALUE_DTYPE, len(timestamps), mmap=True)
+            for field in sensors
+        }
+        return timestamps, values
+
+    def _read_sealed_summary(self, segment: str, sensors: Sequence[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        # Summary files are small (at most 1440 rows a day), so plain reads beat mapping them
+        sealed_dir = os.path.join(segment, "sealed", f"summary_{self.summary_seconds}s")
+        timestamps = _read_column(os.path.join(sealed_dir, "timestamp"), TIMESTAMP_DTYPE)
+        rows = {
+            field: _read_column(os.path.join(sealed_dir, field), SUMMARY_DTYPE, len(timestamps) * 4).reshape(-1, 4)
+            for field in sensors
+        }
+        return timestamps, rows
+
+    def _hourly_path(self, equipment_id: str) -> str:
+        return os.path.join(self._equipment_dir(equipment_id), f"summary_{HOUR_SECONDS}s")
+
+    def _read_hourly(self, equipment_id: str) -> np.ndarray:
+        return _read_column(self._hourly_path(equipment_id), SUMMARY_DTYPE).reshape(-1, HOURLY_WIDTH)
+
+    def _update_hourly(self, equipment_id: str, day: date, timestamps: np.ndarray, values: Dict[str, np.ndarray]):
+        """Replace one day's rows in the equipment's hourly summary file"""
+        bucket_ts, summary = summarize(timestamps, values, HOUR_SECONDS)
+        day_rows = np.column_stack(
+            [bucket_ts.astype(SUMMARY_DTYPE)]
+            + [summary[field][stat] for field in SENSOR_FIELDS for stat in SUMMARY_STATS]
+        )
+        day_start = to_epoch_ms(datetime.combine(day, datetime.min.time()))
+        with self._lock_dir(self._equipment_dir(equipment_id)):
+            rows = self._read_hourly(equipment_id)
+            rows = rows[(rows[:, 0] < day_start) | (rows[:, 0] >= day_start + DAY_MS)]
+            rows = np.concatenate([rows, day_rows])
+            rows = rows[np.argsort(rows[:, 0], kind="stable")]
+            path = self._hourly_path(equipment_id)
+            _write_column(path + ".tmp", rows, SUMMARY_DTYPE)
+            os.replace(path + ".tmp", path)
+
+    def _is_sealed(self, segment: str) -> bool:
+        return os.path.exists(os.path.join(segment, "sealed", "raw", "timestamp"))
+
+    def _has_log(self, segment: str) -> bool:
+        path = os.path.join(segment, "log", "timestamp")
+        return os.path.exists(path) and os.path.getsize(path) > 0
+
+    def seal(self, equipment_id: str, day: date):
+        """Sort a day's readings into sealed/ and write its summary levels"""
+        segment = self._segment_dir(equipment_id, day)
+        with self._lock_dir(segment):
+            if not self._has_log(segment):
+                return  # sealed by another reader while waiting for the lock
+            timestamps, values = self._read_log(segment)
+            if self._is_sealed(segment):
+                sealed_ts, sealed_values = self._read_sealed(segment)
+                timestamps = np.concatenate([np.asarray(sealed_ts), timestamps])
+                values = {field: np.concatenate([np.asarray(sealed_values[field]), values[field]]) for field in values}
+            order = np.argsort(timestamps, kind="stable")
+            timestamps = timestamps[order]
+            values = {field: column[order] for field, column in values.items()}
+
+            staging = os.path.join(segment, "sealed.tmp")
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(os.path.join(staging, "raw"))
+            _write_column(os.path.join(staging, "raw", "timestamp"), timestamps, TIMESTAMP_DTYPE)
+            for field, column in values.items():
+                _write_column(os.path.join(staging, "raw", field), column, VALUE_DTYPE)
+            level_dir = os.path.join(staging, f"summary_{self.summary_seconds}s")
+            os.makedirs(level_dir)
+            bucket_ts, summary = summarize(timestamps, values, self.summary_seconds)
+            _write_column(os.path.join(level_dir, "timestamp"), bucket_ts, TIMESTAMP_DTYPE)
+            for field, rows in _stack(summary, SENSOR_FIELDS).items():
+                _write_column(os.path.join(level_dir, field), rows, SUMMARY_DTYPE)
+
+            sealed = os.path.join(segment, "sealed")
+            retired = os.path.join(segment, "sealed.old")
+            if os.path.exists(sealed):
+                os.replace(sealed, retired)
+            os.replace(staging, sealed)
+            shutil.rmtree(retired, ignore_errors=True)
+            for name in ("timestamp", *SENSOR_FIELDS):
+                path = os.path.join(segment, "log", name)
+                if os.path.exists(path):
+                    os.truncate(path, 0)
+            if HOUR_SECONDS in self.levels[1:]:
+                self._update_hourly(equipment_id, day, timestamps, values)
+        self.segments_sealed += 1
+
+    def _segments(self, equipment_id: str, start_ms: int, end_ms: int) -> List[Tuple[date, str]]:
+        """(day, directory) of the equipment's segments overlapping [start_ms, end_ms), in order"""
+        first = f"{(EPOCH + timedelta(milliseconds=start_ms)).date():%Y%m%d}"
+        last = f"{(EPOCH + timedelta(milliseconds=end_ms - 1)).date():%Y%m%d}"
+        equipment_dir = self._equipment_dir(equipment_id)
+        if not os.path.isdir(equipment_dir):
+            return []
+        # Segment names are YYYYMMDD, so string order is date order
+        names = sorted(
+            name for name in os.listdir(equipment_dir) if len(name) == 8 and name.isdigit() and first <= name <= last
+        )
+        return [
+            (date(int(name[:4]), int(name[4:6]), int(name[6:])), os.path.join(equipment_dir, name)) for name in names
+        ]
+
+    def seal_pending(self, today: Optional[date] = None) -> int:
+        """Seal every closed day that has unsealed readings
+
+        Returns:
+            number of segments sealed
+        """
+        today = today or datetime.utcnow().date()
+        sealed = 0
+        if not os.path.isdir(self.root):
+            return sealed
+        for equipment_dir in os.listdir(self.root):
+            equipment_id = unquote(equipment_dir)
+            for day, segment in self._segments(equipment_id, 0, to_epoch_ms(datetime.combine(today, datetime.min.time()))):
+                if self._has_log(segment):
+                    self.seal(equipment_id, day)
+                    sealed += 1
+        return sealed
+
+    def drop_before(self, day: date) -> int:
+        """Remove every equipment's day segments older than day
+
+        Hourly summaries are kept, so long ranges can still be plotted
+        after the raw samples are gone.
+
+        Returns:
+            number of segments removed
+        """
+        dropped = 0
+        if not os.path.isdir(self.root):
+            return dropped
+        for equipment_dir in os.listdir(self.root):
+            equipment_id = unquote(equipment_dir)
+            for _, segment in self._segments(equipment_id, 0, to_epoch_ms(datetime.combine(day, datetime.min.time()))):
+                with self._lock_dir(segment):
+                    shutil.rmtree(segment)
+                dropped += 1
+        self.segments_dropped += dropped
+        return dropped
+
+    def _prepare(self, equipment_id: str, day: date, segment: str, today: date):
+        # seal_pending runs periodically from the rollup job; this only covers days it has not reached yet
+        if day < today and self._has_log(segment):
+            self.seal(equipment_id, day)
+
+    def count(self, equipment_id: str, start_ms: int, end_ms: int, today: Optional[date] = None) -> int:
+        """Number of raw readings in [start_ms, end_ms), used to pick a read level"""
+        today = today or datetime.utcnow().date()
+        total = 0
+        for day, segment in self._segments(equipment_id, start_ms, end_ms):
+            self._prepare(equipment_id, day, segment, today)
+            day_start = to_epoch_ms(datetime.combine(day, datetime.min.time()))
+            if start_ms <= day_start and day_start + DAY_MS <= end_ms:
+                # Whole day in range: sizes are enough
+                for part in ("sealed/raw", "log"):
+                    path = os.path.join(segment, part, "timestamp")
+                    if os.path.exists(path):
+                        total += os.path.getsize(path) // TIMESTAMP_DTYPE.itemsize
+                continue
+            timestamps, _ = self._read_sealed(segment, ())
+            total += int(np.searchsorted(timestamps, end_ms) - np.searchsorted(timestamps, start_ms))
+            log_ts, _ = self._read_log(segment)
+            total += int(np.count_nonzero((log_ts >= start_ms) & (log_ts < end_ms)))
+        return total
+
+    def _read_segment_raw(
+        self, segment: str, start_ms: int, end_ms: int, sensors: Sequence[str]
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        timestamps, values = self._read_sealed(segment, sensors)
+        lo, hi = np.searchsorted(timestamps, start_ms), np.searchsorted(timestamps, end_ms)
+        log_ts, log_values = self._read_log(segment)
+        if not len(log_ts):
+            return timestamps[lo:hi], {field: values[field][lo:hi] for field in sensors}
+
+        mask = (log_ts >= start_ms) & (log_ts < end_ms)
+        timestamps = np.concatenate([timestamps[lo:hi], log_ts[mask]])
+        order = np.argsort(timestamps, kind="stable")
+        return timestamps[order], {
+            field: np.concatenate([values[field][lo:hi], log_values[field][mask]])[order] for field in sensors
+        }
+
+    def read_raw(
+        self, equipment_id: str, start_ms: int, end_ms: int, sensors: Sequence[str], today: Optional[date] = None
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Sorted raw readings in [start_ms, end_ms)"""
+        self.queries += 1
+        today = today or datetime.utcnow().date()
+        ts_parts, value_parts = [], {field: [] for field in sensors}
+        for day, segment in self._segments(equipment_id, start_ms, end_ms):
+            self._prepare(equipment_id, day, segment, today)
+            timestamps, values = self._read_segment_raw(segment, start_ms, end_ms, sensors)
+            ts_parts.append(timestamps)
+            for field in sensors:
+                value_parts[field].append(values[field])
+
+        if not ts_parts:
+            return np.empty(0, dtype=TIMESTAMP_DTYPE), {field: np.empty(0, dtype=VALUE_DTYPE) for field in sensors}
+        return np.concatenate(ts_parts), {field: np.concatenate(parts) for field, parts in value_parts.items()}
+
+    def read_summary(
+        self,
+        equipment_id: str,
+        start_ms: int,
+        end_ms: int,
+        sensors: Sequence[str],
+        level: Optional[int] = None,
+        today: Optional[date] = None,
+    ) -> Tuple[np.ndarray, dict]:
+        """Bucket summaries at one of self.levels in [start_ms, end_ms); open days are summarized on the fly"""
+        self.queries += 1
+        level = level or self.summary_seconds
+        today = today or datetime.utcnow().date()
+        segments = self._segments(equipment_id, start_ms, end_ms)
+        for day, segment in segments:
+            self._prepare(equipment_id, day, segment, today)
+        open_segments = [(day, segment) for day, segment in segments if self._has_log(segment)]
+
+        ts_parts, row_parts = [], {field: [] for field in sensors}
+        if level == self.summary_seconds:
+            for day, segment in segments:
+                if (day, segment) in open_segments:
+                    continue
+                timestamps, rows = self._read_sealed_summary(segment, sensors)
+                lo, hi = np.searchsorted(timestamps, start_ms), np.searchsorted(timestamps, end_ms)
+                ts_parts.append(timestamps[lo:hi])
+                for field in sensors:
+                    row_parts[field].append(rows[field][lo:hi])
+        else:
+            rows = self._read_hourly(equipment_id)
+            rows = rows[np.searchsorted(rows[:, 0], start_ms) : np.searchsorted(rows[:, 0], end_ms)]
+            for day, _ in open_segments:
+                day_start = to_epoch_ms(datetime.combine(day, datetime.min.time()))
+                rows = rows[(rows[:, 0] < day_start) | (rows[:, 0] >= day_start + DAY_MS)]
+            ts_parts.append(rows[:, 0].astype(TIMESTAMP_DTYPE))
+            for field in sensors:
+                offset = 1 + SENSOR_FIELDS.index(field) * len(SUMMARY_STATS)
+                row_parts[field].append(rows[:, offset : offset + len(SUMMARY_STATS)])
+
+        for day, segment in open_segments:
+            timestamps, values = self._read_segment_raw(segment, start_ms, end_ms, sensors)
+            timestamps, summary = summarize(timestamps, values, level)
+            ts_parts.append(timestamps)
+            for field, block in _stack(summary, sensors).items():
+                row_parts[field].append(block)
+
+        if not ts_parts:
+            return summarize(np.empty(0, dtype=TIMESTAMP_DTYPE), {field: None for field in sensors}, level)
+        timestamps = np.concatenate(ts_parts)
+        rows = {field: np.concatenate(parts) for field, parts in row_parts.items()}
+        if open_segments:
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, rows = timestamps[order], {field: block[order] for field, block in rows.items()}
+        return timestamps, _unstack(rows)
+
+    def query(
+        self,
+        equipment_id: str,
+        start: datetime,
+        end: datetime,
+        sensors: Sequence[str],
+        resolution: str = "auto",
+        points: int = 2000,
+        method: str = "minmax",
+    ) -> dict:
+        """Plot-ready series for [start, end)
+
+        resolution "auto" picks a bucket width giving about `points`
+        buckets. "minmax" returns min/max/mean per bucket (from the
+        per-minute summaries when buckets are at least a minute wide);
+        "lttb" returns the visually most significant samples, computed over
+        minute means when the range holds too many raw samples.
+
+        Returns:
+            {"resolution": "raw" or "<seconds>s", "series": {sensor: {...}}}
+
+        Raises:
+            ValueError: for raw requests over more than MAX_RAW_POINTS samples
+        """
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+        width = parse_resolution(resolution)
+
+        if resolution == "raw":
+            if self.count(equipment_id, start_ms, end_ms) > MAX_RAW_POINTS:
+                raise ValueError(f"More than {MAX_RAW_POINTS} raw readings in range, use a coarser resolution")
+            timestamps, values = self.read_raw(equipment_id, start_ms, end_ms, sensors)
+            return {
+                "resolution": "raw",
+                "series": {
+                    field: {"timestamps": timestamps.tolist(), "values": _to_list(values[field])} for field in sensors
+                },
+            }
+
+        if width is None:
+            width = max(1, math.ceil((end_ms - start_ms) / 1000 / points))
+
+        if method == "lttb":
+            n_out = max(3, math.ceil((end_ms - start_ms) / 1000 / width))
+            if self.count(equipment_id, start_ms, end_ms) <= MAX_RAW_POINTS:
+                timestamps, values = self.read_raw(equipment_id, start_ms, end_ms, sensors)
+            else:
+                # Finest summary level that keeps the LTTB input bounded
+                span_seconds = (end_ms - start_ms) / 1000
+                level = next(
+                    (level for level in self.levels if span_seconds / level <= MAX_RAW_POINTS), self.levels[-1]
+                )
+                timestamps, summary = self.read_summary(equipment_id, start_ms, end_ms, sensors, level)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    values = {field: summary[field]["sum"] / summary[field]["count"] for field in sensors}
+            series = {}
+            for field in sensors:
+                selected_ts, selected = lttb(timestamps, np.asarray(values[field], dtype=np.float64), n_out)
+                series[field] = {"timestamps": selected_ts.tolist(), "values": _to_list(selected)}
+            return {"resolution": f"{width}s", "series": series}
+
+        if width >= self.summary_seconds:
+            level = max(level for level in self.levels if level <= width)
+            width = math.ceil(width / level) * level
+            timestamps, summary = self.read_summary(equipment_id, start_ms, end_ms, sensors, level)
+        else:
+            timestamps, values = self.read_raw(equipment_id, start_ms, end_ms, sensors)
+            summary = raw_as_summary(values)
+        timestamps, merged = minmax_downsample(timestamps, summary, start_ms, width * 1000)
+
+        series = {}
+        for field in sensors:
+            stats = merged[field]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = stats["sum"] / stats["count"]
+            series[field] = {
+                "timestamps": timestamps.tolist(),
+                "min": _to_list(stats["min"]),
+                "max": _to_list(stats["max"]),
+                "mean": _to_list(mean),
+            }
+        return {"resolution": f"{width}s", "series": series}
+
+    def get_stats(self) -> dict:
+        return {
+            "root": self.root,
+            "rows_appended": self.rows_appended,
+            "segments_sealed": self.segments_sealed,
+            "segments_dropped": self.segments_dropped,
+            "queries": self.queries,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sqlalchemy import select
+
+    from config import Config
+    from database import SessionLocal
+    from models import SensorReading
+
+    parser = argparse.ArgumentParser(description="Load sensor_readings into the column store")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only readings at or after this time")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    store = ColumnStore(Config.TIMESERIES_STORE_PATH, Config.TIMESERIES_SUMMARY_SECONDS)
+    columns = (SensorReading.id, SensorReading.equipment_id, SensorReading.timestamp) + tuple(
+        getattr(SensorReading, field) for field in SENSOR_FIELDS
+    )
+    last_id = 0
+    with SessionLocal() as db:
+        while True:
+            query = select(*columns).where(SensorReading.id > last_id).order_by(SensorReading.id).limit(args.chunk_size)
+            if args.since:
+                query = query.where(SensorReading.timestamp >= args.since)
+            rows = db.execute(query).all()
+            if not rows:
+                break
+            store.append(row._mapping for row in rows)
+            last_id = rows[-1].id
+            print(f"\rloaded {store.rows_appended:,} readings", end="", flush=True)
+    print(f"\nsealed {store.seal_pending()} segments")
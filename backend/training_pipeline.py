@@ -0,0 +1,393 @@
+"""
+Train the failure model on stored sensor readings and register it in model_registry
+
+A reading is labeled as a failure when a maintenance event (not cancelled,
+optionally restricted to some maintenance types) is scheduled for its
+equipment within --horizon-days after it. Readings in the last
+--horizon-days of history are left out because their outcome is not known
+yet. Features are the raw sensor values (rollups.SENSOR_FIELDS); with
+--temporal-features they are followed by feature_store.MODEL_FEATURES,
+computed by replaying the readings through a FeatureStore in id order,
+which is the order ingest applied them online. --window and --alpha
+default to FEATURE_WINDOW and FEATURE_EWMA_ALPHA and must match the API's
+settings. The forest records its feature names, which PredictiveModel
+uses to pick its inputs.
+
+Readings are streamed in id order, --chunk-size rows at a time, and at most
+--max-rows of them are kept: a uniform random sample chosen by giving every
+reading a seeded random priority and keeping the lowest, so memory does not
+grow with the table. The sample is cross-validated with --folds stratified
+folds that keep each equipment's readings in a single fold (neighbouring
+readings of one machine are near duplicates, so splitting them would leak
+between training and test folds), run --n-jobs at a time, then a final
+forest is fit on all of it. The
+pickle and its flat artifact are written next to MODEL_PATH and a
+model_registry row (inactive) records the metrics and a hash of the exact
+training set, so the same data, arguments and seed reproduce the model.
+
+Run from the backend directory:
+    python training_pipeline.py --version v2.0 --n-jobs 4
+Then roll it out with POST /models/v2.0/shadow or POST /models/v2.0/activate.
+"""
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedGroupKFold, cross_validate
+from sqlalchemy import func, select
+
+from feature_store import MODEL_FEATURES, FeatureStore
+from ml_service import FlatForest, PredictiveModel
+from models import Equipment, MaintenanceEvent, MaintenanceStatus, ModelRegistry, SensorReading
+from rollups import SENSOR_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Cross-validation scorers, keyed by the model_registry column they fill
+SCORING = {
+    "auc_score": "roc_auc",
+    "accuracy": "accuracy",
+    "precision": "precision",
+    "recall": "recall",
+    "f1_score": "f1",
+}
+
+# Spacing of equipment in the composite (equipment, time) keys used for labeling
+EQUIPMENT_KEY_STRIDE = 1 << 40
+
+
+def to_seconds(timestamps: Sequence[datetime]) -> np.ndarray:
+    """Seconds since the epoch of naive UTC datetimes"""
+    return np.array(timestamps, dtype="datetime64[s]").astype(np.int64)
+
+
+class FailureLabeler:
+    """Labels readings by whether their equipment has a maintenance event within the horizon after them
+
+    Event times are held as one sorted array of (equipment code, seconds)
+    keys, so a chunk of readings is labeled with a single searchsorted.
+    """
+
+    def __init__(self, events: Sequence[Tuple[str, datetime]], horizon: timedelta):
+        self.horizon_seconds = int(horizon.total_seconds())
+        self.codes: Dict[str, int] = {}
+        for equipment_id, _ in events:
+            self.codes.setdefault(equipment_id, len(self.codes))
+        codes = np.array([self.codes[equipment_id] for equipment_id, _ in events], dtype=np.int64)
+        self.event_keys = np.sort(codes * EQUIPMENT_KEY_STRIDE + to_seconds([when for _, when in events]))
+
+    def label(self, equipment_ids: Sequence[str], seconds: np.ndarray) -> np.ndarray:
+        codes = np.array([self.codes.get(equipment_id, -1) for equipment_id in equipment_ids], dtype=np.int64)
+        keys = codes * EQUIPMENT_KEY_STRIDE + seconds
+        following = np.searchsorted(self.event_keys, keys, side="right")
+        has_next = following < len(self.event_keys)
+        gap = np.full(len(keys), np.iinfo(np.int64).max)
+        gap[has_next] = self.event_keys[following[has_next]] - keys[has_next]
+        # Gaps within the horizon only occur between keys of the same equipment
+        return ((codes >= 0) & (gap <= self.horizon_seconds)).astype(np.int8)
+
+
+class ReservoirSample:
+    """Uniform sample of at most max_rows rows from a stream, fixed by the seed
+
+    Every row gets a random priority and the max_rows lowest are kept. Once
+    the sample is full, rows above the current cutoff are rejected without
+    being copied.
+    """
+
+    def __init__(self, max_rows: int, n_features: int, seed: int):
+        self.max_rows = max_rows
+        self.rng = np.random.default_rng(seed)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.equipment_ids = np.empty(0, dtype=object)
+        self.features = np.empty((0, n_features), dtype=np.float64)
+        self.labels = np.empty(0, dtype=np.int8)
+        self.priorities = np.empty(0, dtype=np.float64)
+        self.seen = 0
+
+    def add(self, ids: np.ndarray, equipment_ids: np.ndarray, features: np.ndarray, labels: np.ndarray):
+        priorities = self.rng.random(len(ids))
+        self.seen += len(ids)
+        if len(self.priorities) >= self.max_rows:
+            keep = priorities < self.priorities.max()
+            ids, equipment_ids = ids[keep], equipment_ids[keep]
+            features, labels, priorities = features[keep], labels[keep], priorities[keep]
+            if not len(ids):
+                return
+        self.ids = np.concatenate([self.ids, ids])
+        self.equipment_ids = np.concatenate([self.equipment_ids, equipment_ids])
+        self.features = np.concatenate([self.features, features])
+        self.labels = np.concatenate([self.labels, labels])
+        self.priorities = np.concatenate([self.priorities, priorities])
+        if len(self.priorities) > self.max_rows:
+            kept = np.argpartition(self.priorities, self.max_rows - 1)[: self.max_rows]
+            self.ids, self.equipment_ids, self.features = self.ids[kept], self.equipment_ids[kept], self.features[kept]
+            self.labels, self.priorities = self.labels[kept], self.priorities[kept]
+
+    def dataset(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(ids, equipment_ids, features, labels) of the sample in reading id order"""
+        order = np.argsort(self.ids, kind="stable")
+        return self.ids[order], self.equipment_ids[order], self.features[order], self.labels[order]
+
+
+def load_labeler(db, horizon: timedelta, maintenance_types: Optional[Sequence[str]] = None) -> FailureLabeler:
+    query = select(MaintenanceEvent.equipment_id, MaintenanceEvent.scheduled_date).where(
+        MaintenanceEvent.scheduled_date.is_not(None),
+        MaintenanceEvent.status != MaintenanceStatus.CANCELLED,
+    )
+    if maintenance_types:
+        query = query.where(MaintenanceEvent.maintenance_type.in_(maintenance_types))
+    return FailureLabeler(db.execute(query).all(), horizon)
+
+
+def stream_labeled_readings(
+    db,
+    labeler: FailureLabeler,
+    until: datetime,
+    chunk_size: int = 50000,
+    feature_store: Optional[FeatureStore] = None,
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """Yield (ids, equipment_ids, features, labels) per chunk of readings before until, skipping incomplete readings
+
+    With a feature_store every reading is added to it and its MODEL_FEATURES
+    follow the sensor values.
+    """
+    columns = (SensorReading.id, SensorReading.equipment_id, SensorReading.timestamp) + tuple(
+        getattr(SensorReading, field) for field in SENSOR_FIELDS
+    )
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(*columns)
+            .where(SensorReading.id > last_id, SensorReading.timestamp < until)
+            .order_by(SensorReading.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        ids, equipment_ids, timestamps, *values = zip(*rows)
+        features = np.array(values, dtype=np.float64).T
+        if feature_store is not None:
+            rolling = feature_store.update(equipment_ids, timestamps, [row._mapping for row in rows])
+            missing = [np.nan] * len(MODEL_FEATURES)
+            features = np.hstack(
+                [features, np.array([[f[name] for name in MODEL_FEATURES] if f else missing for f in rolling])]
+            )
+        complete = np.isfinite(features).all(axis=1)
+        labels = labeler.label(equipment_ids, to_seconds(timestamps))
+        yield (
+            np.array(ids, dtype=np.int64)[complete],
+            np.array(equipment_ids, dtype=object)[complete],
+            features[complete],
+            labels[complete],
+        )
+
+
+def dataset_hash(features: np.ndarray, labels: np.ndarray, **params) -> str:
+    """SHA-256 of the training matrix, labels and the arguments that selected them"""
+    digest = hashlib.sha256()
+    for key in sorted(params):
+        digest.update(f"{key}={params[key]};".encode())
+    digest.update(np.ascontiguousarray(features, dtype="<f8").tobytes())
+    digest.update(np.ascontiguousarray(labels, dtype="i1").tobytes())
+    return digest.hexdigest()
+
+
+def cross_validate_forest(
+    features: np.ndarray,
+    labels: np.ndarray,
+    equipment_ids: np.ndarray,
+    n_estimators: int,
+    max_depth: Optional[int],
+    folds: int,
+    n_jobs: int,
+    seed: int,
+) -> Dict[str, float]:
+    """Mean scores per model_registry metric column over stratified equipment-grouped folds, run in n_jobs processes"""
+    forest = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=seed)
+    cv = StratifiedGroupKFold(n_splits=folds, shuffle=True, random_state=seed)
+    scores = cross_validate(
+        forest, features, labels, groups=equipment_ids, cv=cv, scoring=list(SCORING.values()), n_jobs=n_jobs
+    )
+    return {column: float(np.mean(scores[f"test_{name}"])) for column, name in SCORING.items()}
+
+
+def save_model(forest: RandomForestClassifier, model_path: str):
+    """Pickle the forest atomically and export the flat artifact workers memory-map"""
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+    staging = f"{model_path}.tmp-{os.getpid()}"
+    joblib.dump(forest, staging)
+    os.replace(staging, model_path)
+
+    flat = FlatForest.from_sklearn(forest)
+    deviation = flat.max_deviation(forest)
+    if deviation > PredictiveModel.PARITY_TOLERANCE:
+        # Workers fall back to the pickle for this version
+        logger.error(f"Flat model deviates from sklearn by {deviation:.3g}; not exporting the artifact")
+        return
+    flat.save(os.path.splitext(model_path)[0])
+
+
+def train(
+    db,
+    version: str,
+    model_path: str,
+    horizon_days: float = 30.0,
+    maintenance_types: Optional[Sequence[str]] = None,
+    max_rows: int = 2000000,
+    chunk_size: int = 50000,
+    n_estimators: int = 100,
+    max_depth: Optional[int] = None,
+    folds: int = 5,
+    n_jobs: int = -1,
+    seed: int = 42,
+    temporal_features: bool = False,
+    window: int = 64,
+    alpha: float = 0.2,
+) -> ModelRegistry:
+    """Train on the stored readings, save the model and register it (inactive)
+
+    Returns:
+        the new model_registry row
+
+    Raises:
+        ValueError: if the version is already registered or there is not
+            enough labeled data for cross-validation
+    """
+    if db.scalar(select(ModelRegistry.id).where(ModelRegistry.model_version == version)) is not None:
+        raise ValueError(f"Model version {version} is already registered")
+
+    started = time.perf_counter()
+    horizon = timedelta(days=horizon_days)
+    labeler = load_labeler(db, horizon, maintenance_types)
+    latest = db.scalar(select(func.max(SensorReading.timestamp)))
+    if latest is None:
+        raise ValueError("No sensor readings to train on")
+    until = latest - horizon
+
+    feature_names = list(SENSOR_FIELDS)
+    feature_store = None
+    if temporal_features:
+        feature_names += MODEL_FEATURES
+        n_equipment = db.scalar(select(func.count(Equipment.id))) or 1
+        feature_store = FeatureStore(window=window, alpha=alpha, max_equipment=n_equipment)
+
+    sample = ReservoirSample(max_rows, len(feature_names), seed)
+    readings = stream_labeled_readings(db, labeler, until, chunk_size, feature_store)
+    for ids, equipment_ids, features, labels in readings:
+        sample.add(ids, equipment_ids, features, labels)
+        logger.info(f"Streamed {sample.seen:,} labeled readings")
+    _, equipment_ids, features, labels = sample.dataset()
+
+    # Every fold needs failing readings, and folds hold whole equipment
+    counts = np.bincount(labels, minlength=2)
+    failing_equipment = len(np.unique(equipment_ids[labels == 1]))
+    healthy_equipment = len(np.unique(equipment_ids[labels == 0]))
+    if min(failing_equipment, healthy_equipment) < folds:
+        raise ValueError(
+            f"Need readings of each class from at least {folds} equipment for {folds}-fold CV, "
+            f"got {healthy_equipment} with healthy and {failing_equipment} with failing readings"
+        )
+    logger.info(
+        f"Training on {len(labels):,} of {sample.seen:,} readings ({counts[1]:,} failing) "
+        f"after {time.perf_counter() - started:.1f}s"
+    )
+
+    metrics = cross_validate_forest(features, labels, equipment_ids, n_estimators, max_depth, folds, n_jobs, seed)
+    logger.info(f"{folds}-fold CV: " + ", ".join(f"{name}={value:.4f}" for name, value in metrics.items()))
+
+    forest = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=seed, n_jobs=n_jobs)
+    forest.fit(features, labels)
+    forest.feature_names = feature_names
+    save_model(forest, model_path)
+
+    entry = ModelRegistry(
+        model_version=version,
+        model_type="RandomForestClassifier",
+        training_date=datetime.utcnow(),
+        dataset_hash=dataset_hash(
+            features,
+            labels,
+            until=until.isoformat(),
+            horizon_days=horizon_days,
+            maintenance_types=",".join(sorted(maintenance_types or [])),
+            max_rows=max_rows,
+            seed=seed,
+            max_depth=max_depth,
+            feature_names=",".join(feature_names),
+            window=window if temporal_features else None,
+            alpha=alpha if temporal_features else None,
+        ),
+        model_path=model_path,
+        is_active=False,
+        **metrics,
+    )
+    db.add(entry)
+    db.commit()
+    logger.info(f"Registered {version} ({model_path}) after {time.perf_counter() - started:.1f}s")
+    return entry
+
+
+def main():
+    import argparse
+
+    from config import Config
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Train the failure model on stored readings and register it")
+    parser.add_argument("--version", required=True, help="model_registry version to create, e.g. v2.0")
+    parser.add_argument("--model-path", help="pickle path (default: next to MODEL_PATH)")
+    parser.add_argument("--horizon-days", type=float, default=30.0)
+    parser.add_argument("--maintenance-types", help="comma-separated maintenance types that count as failures")
+    parser.add_argument("--max-rows", type=int, default=2000000)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, help="tree depth limit; shallower forests explain faster")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--temporal-features", action="store_true", help="add rolling features (feature_store.py)")
+    parser.add_argument("--window", type=int, default=Config.FEATURE_WINDOW)
+    parser.add_argument("--alpha", type=float, default=Config.FEATURE_EWMA_ALPHA)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    model_path = args.model_path or os.path.join(
+        os.path.dirname(Config.MODEL_PATH), f"failure_predictor_{args.version}.pkl"
+    )
+    with SessionLocal() as db:
+        try:
+            entry = train(
+                db,
+                args.version,
+                model_path,
+                horizon_days=args.horizon_days,
+                maintenance_types=args.maintenance_types.split(",") if args.maintenance_types else None,
+                max_rows=args.max_rows,
+                chunk_size=args.chunk_size,
+                n_estimators=args.trees,
+                max_depth=args.max_depth,
+                folds=args.folds,
+                n_jobs=args.n_jobs,
+                seed=args.seed,
+                temporal_features=args.temporal_features,
+                window=args.window,
+                alpha=args.alpha,
+            )
+        except ValueError as e:
+            parser.exit(1, f"{str(e)}\n")
+        print(
+            f"{entry.model_version}: auc={entry.auc_score:.4f} precision={entry.precision:.4f} "
+            f"recall={entry.recall:.4f} f1={entry.f1_score:.4f} dataset={entry.dataset_hash[:12]}"
+        )
+
+
+if __name__ == "__main__":
+    main()
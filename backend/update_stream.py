@@ -0,0 +1,327 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from connection_manager import ALL_EQUIPMENT, ConnectionManager
+
+try:
+    import msgpack
+except ImportError:  # Optional: clients can still use JSON
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Equipment state carried by the stream, taken from sensor_update messages
+STREAM_FIELDS = (
+    "health_score",
+    "status",
+    "failure_probability",
+    "rul_days",
+    "anomaly_score",
+    "temperature",
+    "vibration",
+    "pressure",
+    "power_consumption",
+    "timestamp",
+)
+
+ENCODINGS = ("json", "msgpack")
+
+SENSORS = ("temperature", "vibration", "pressure", "power_consumption")
+
+_MISSING = object()
+
+
+def sensor_update(
+    equipment_id: str,
+    sensor_data: dict,
+    health_score: float,
+    status: str,
+    failure_probability: float,
+    rul_days: int,
+    timestamp: datetime,
+) -> dict:
+    """The real-time message for a scored reading"""
+    update = {
+        "type": "sensor_update",
+        "equipment_id": equipment_id,
+        "health_score": float(health_score),
+        "status": str(status),
+        "failure_probability": float(failure_probability),
+        "rul_days": int(rul_days),
+        "anomaly_score": sensor_data.get("anomaly_score"),
+        "timestamp": timestamp.isoformat(),
+    }
+    update.update((field, sensor_data.get(field)) for field in SENSORS)
+    return update
+
+
+def latest_state_update(state: dict) -> dict:
+    """sensor_update-shaped dict from an equipment_latest_state row, without unset fields"""
+    update = {
+        field: state.get(field) for field in STREAM_FIELDS if field not in ("status", "timestamp")
+    }
+    status = state.get("status")
+    update["status"] = getattr(status, "value", status)
+    timestamp = state.get("prediction_timestamp") or state.get("reading_timestamp")
+    update["timestamp"] = timestamp.isoformat() if timestamp is not None else None
+    update = {field: value for field, value in update.items() if value is not None}
+    update["equipment_id"] = state["equipment_id"]
+    return update
+
+
+class _StreamClient:
+    """A stream socket; pending maps equipment ID -> the version the client already has (0 for none)"""
+
+    __slots__ = ("websocket", "topics", "pending", "ready", "writer", "encoding", "snapshot")
+
+    def __init__(self, websocket: WebSocket, encoding: str):
+        self.websocket = websocket
+        self.topics = set()
+        self.pending: "OrderedDict[str, int]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.encoding = encoding
+        self.snapshot = False
+
+
+class UpdateStream(ConnectionManager):
+    """Latest state per equipment, pushed to subscribers as one delta frame per tick
+
+    Updates are folded into a pending state per equipment as they arrive,
+    so any number of readings between ticks cost one change. Every
+    ``tick`` seconds the changed fields are applied and the equipment's
+    version becomes the tick number. Each field remembers the version it
+    last changed in. A subscriber is sent, for each equipment that changed,
+    only the fields newer than the version it already has, all in one frame
+    per tick. A client that falls behind keeps the version it had, and its
+    next frame holds every field changed since then. Each client is sent at
+    most one frame per tick and at most one entry per equipment, whatever
+    the reading rate. Subscribing sends a snapshot frame with the full state
+    of the equipment subscribed to. Floats are rounded to ``decimals``, so
+    changes smaller than that are not sent. Entries are encoded once per
+    (equipment, version the client has, encoding) and shared by every
+    client in that position.
+
+    Frames are {"type": "snapshot" | "delta", "tick": n, "equipment":
+    {equipment_id: {field: value, ..., "version": v}}} as JSON text or
+    MessagePack binary.
+    """
+
+    def __init__(self, tick: float = 1.0, decimals: int = 3, send_timeout: float = 10.0):
+        super().__init__(send_timeout=send_timeout)
+        self.tick_interval = tick
+        self.decimals = decimals
+        self.tick = 0
+        self._state: Dict[str, dict] = {}
+        self._versions: Dict[str, int] = {}
+        self._field_versions: Dict[str, Dict[str, int]] = {}
+        self._changed: Dict[str, dict] = {}
+        self._entries: Dict[Tuple[str, int, str], object] = {}
+        self._packer = msgpack.Packer() if msgpack is not None else None
+        self._worker: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.snapshots = 0
+        self.bytes_sent = 0
+        self.encoded = 0
+
+    async def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                self.advance()
+            except Exception as e:
+                logger.error(f"Update stream tick failed: {str(e)}")
+
+    async def connect(self, websocket: WebSocket, topics: Iterable[str] = (), encoding: str = "json"):
+        await websocket.accept()
+        self.register(websocket, topics, encoding)
+
+    def register(self, websocket: WebSocket, topics: Iterable[str] = (), encoding: str = "json"):
+        """Start streaming to an accepted socket, beginning with a snapshot of topics
+
+        Raises:
+            ValueError: if the encoding is unknown or msgpack is not installed
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {', '.join(ENCODINGS)}")
+        if encoding == "msgpack" and msgpack is None:
+            raise ValueError("msgpack package not installed")
+        client = _StreamClient(websocket, encoding)
+        self._clients[websocket] = client
+        self.subscribe(websocket, topics)
+        client.writer = asyncio.create_task(self._write(client))
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        """Subscribe and queue a snapshot of the topics' current state"""
+        topics = list(topics)
+        super().subscribe(websocket, topics)
+        client = self._clients.get(websocket)
+        if client is None:
+            return
+        for topic in topics:
+            equipment_ids = self._state.keys() if topic == ALL_EQUIPMENT else [topic] if topic in self._state else []
+            for equipment_id in equipment_ids:
+                client.pending[equipment_id] = 0
+        client.snapshot = True
+        client.ready.set()
+
+    async def broadcast(self, data: dict):
+        self.published += 1
+        self._fold(data)
+
+    def publish(self, topic: Optional[str], text: str, data: Optional[dict] = None):
+        """Fold an update into the pending state, decoding text only when data is not given"""
+        self.published += 1
+        self._fold(data if data is not None else json.loads(text))
+
+    def _fold(self, data: dict):
+        equipment_id = data.get("equipment_id")
+        if data.get("type") != "sensor_update" or equipment_id is None:
+            return
+        changes = self._changed.get(equipment_id)
+        if changes is None:
+            changes = self._changed[equipment_id] = {}
+        else:
+            self.coalesced += 1
+        for field in STREAM_FIELDS:
+            value = data.get(field, _MISSING)
+            if value is not _MISSING:
+                changes[field] = round(value, self.decimals) if type(value) is float else value
+
+    def seed(self, states: List[dict]):
+        """Start from equipment_latest_state rows, so the first snapshots hold the whole fleet"""
+        for state in states:
+            self._fold({"type": "sensor_update", **latest_state_update(state)})
+        self.advance()
+
+    def advance(self):
+        """Apply the changes folded since the last tick and queue them for subscribers"""
+        self.tick += 1
+        self._entries.clear()
+        changed, self._changed = self._changed, {}
+        everyone = self._subscribers.get(ALL_EQUIPMENT)
+        for equipment_id, changes in changed.items():
+            state = self._state.get(equipment_id)
+            if state is None:
+                state = self._state[equipment_id] = {}
+                self._field_versions[equipment_id] = {}
+            field_versions = self._field_versions[equipment_id]
+            fields = [field for field, value in changes.items() if state.get(field, _MISSING) != value]
+            if not fields:
+                continue
+            for field in fields:
+                state[field] = changes[field]
+                field_versions[field] = self.tick
+            previous = self._versions.get(equipment_id, 0)
+            self._versions[equipment_id] = self.tick
+            for subscribers in (self._subscribers.get(equipment_id), everyone):
+                if subscribers:
+                    for client in subscribers:
+                        # A client with this equipment still pending keeps the older version it has
+                        if equipment_id not in client.pending:
+                            client.pending[equipment_id] = previous
+                            client.ready.set()
+
+    def _entry(self, equipment_id: str, base: int, encoding: str):
+        """Encoded `equipment_id: {fields newer than base, version}` map entry"""
+        key = (equipment_id, base, encoding)
+        entry = self._entries.get(key)
+        if entry is None:
+            state = self._state[equipment_id]
+            fields = {
+                field: state[field]
+                for field, version in self._field_versions[equipment_id].items()
+                if version > base
+            }
+            fields["version"] = self._versions[equipment_id]
+            if encoding == "msgpack":
+                entry = self._packer.pack(equipment_id) + self._packer.pack(fields)
+            else:
+                entry = json.dumps(equipment_id) + ":" + json.dumps(fields, default=str, separators=(",", ":"))
+            self._entries[key] = entry
+            self.encoded += 1
+        return entry
+
+    def _frame(self, kind: str, pending: "OrderedDict[str, int]", encoding: str):
+        entries = [self._entry(equipment_id, base, encoding) for equipment_id, base in pending.items()]
+        if encoding == "msgpack":
+            packer = self._packer
+            return b"".join(
+                [
+                    packer.pack_map_header(3),
+                    packer.pack("type"),
+                    packer.pack(kind),
+                    packer.pack("tick"),
+                    packer.pack(self.tick),
+                    packer.pack("equipment"),
+                    packer.pack_map_header(len(entries)),
+                ]
+                + entries
+            )
+        return f'{{"type":"{kind}","tick":{self.tick},"equipment":{{{",".join(entries)}}}}}'
+
+    async def _write(self, client: _StreamClient):
+        websocket = client.websocket
+        send = websocket.send_bytes if client.encoding == "msgpack" else websocket.send_text
+        try:
+            while True:
+                if not client.pending and not client.snapshot:
+                    client.ready.clear()
+                    await client.ready.wait()
+                    continue
+                pending, client.pending = client.pending, OrderedDict()
+                kind = "snapshot" if client.snapshot else "delta"
+                client.snapshot = False
+                frame = self._frame(kind, pending, client.encoding)
+                async with asyncio.timeout(self.send_timeout):
+                    await send(frame)
+                self.sent += 1
+                self.snapshots += kind == "snapshot"
+                self.bytes_sent += len(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.send_failures += 1
+            logger.info(f"Dropping stream client after failed send: {type(e).__name__} {str(e)}")
+            self.disconnect(websocket)
+            try:
+                async with asyncio.timeout(self.send_timeout):
+                    await websocket.close(code=1011)
+            except Exception:
+                pass
+
+    def get_stats(self) -> Dict:
+        return {
+            "clients": len(self._clients),
+            "equipment": len(self._state),
+            "tick": self.tick,
+            "tick_seconds": self.tick_interval,
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "frames": self.sent,
+            "snapshots": self.snapshots,
+            "bytes_sent": self.bytes_sent,
+            "encoded_entries": self.encoded,
+            "send_failures": self.send_failures,
+            "msgpack": msgpack is not None,
+        }